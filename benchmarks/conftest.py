@@ -0,0 +1,138 @@
+""" Fixtures of the benchmarks
+
+Run with "pytest --benchmark benchmarks/". Each benchmark measures the
+best wall time of a few runs and the queries of the last one, and fails
+when it is slower than its entry in baseline.json by more than
+--benchmark-threshold, or runs more queries. "--benchmark-save" stores
+the measurements as the new baseline instead. Times depend on the
+machine: save the baseline on the one comparing against it.
+"""
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from journal import seeding
+from journal.emotions import emotion_registry
+
+# countchars is a standalone script, see count_char_task/benchmark.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "count_char_task"))
+
+User = get_user_model()
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+REPEAT = 5
+# Differences below this many seconds are noise
+MIN_DIFFERENCE = 0.002
+
+# Name -> (users, entries per user)
+SIZES = {
+    "small": (10, 10),
+    "medium": (50, 100),
+    "large": (100, 1000),
+}
+
+
+@dataclass
+class Dataset:
+    size: str
+    user: object
+    admin: object
+
+
+@pytest.fixture(scope="module", params=list(SIZES))
+def dataset(request, django_db_setup, django_db_blocker):
+    """ Seeded users and entries, rolled back after the module."""
+    users, entries = SIZES[request.param]
+    with django_db_blocker.unblock():
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        try:
+            start = len(connection.run_on_commit)
+            seeding.seed_journal(users=users, entries=entries, seed=0)
+            user = User.objects.get(username=seeding.user_rows(1)[0]["username"])
+            admin = User.objects.create_superuser("benchmark-admin", "admin@example.com", "benchmark")
+            # The benchmarks see the seed as committed: without its on_commit
+            # callbacks the emotion registry would wait for the commit
+            for _, callback in connection.run_on_commit[start:]:
+                callback()
+            del connection.run_on_commit[start:]
+            yield Dataset(request.param, user, admin)
+        finally:
+            transaction.set_rollback(True)
+            atomic.__exit__(None, None, None)
+            # Drops the rolled back emotions
+            emotion_registry.changed()
+
+
+class Benchmarks:
+
+    def __init__(self, config):
+        self.save = config.getoption("--benchmark-save")
+        self.threshold = config.getoption("--benchmark-threshold")
+        self.baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        self.results = {}
+
+    def measure(self, name, func, setup=None, repeat=REPEAT):
+        """ Runs func repeat times, after setup() each, and records the best
+        time and the queries of the last run. Fails on a regression against
+        the baseline. Returns the result of the last run.
+        """
+        best = None
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                result = func()
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        measured = {"seconds": round(best, 6), "queries": len(queries)}
+        self.results[name] = measured
+        baseline = self.baseline.get(name)
+        if self.save or baseline is None:
+            return result
+        assert measured["queries"] <= baseline["queries"], (
+            "%s ran %d queries, %d in the baseline" % (name, measured["queries"], baseline["queries"])
+        )
+        limit = baseline["seconds"] * (1 + self.threshold)
+        assert best <= limit or best - baseline["seconds"] < MIN_DIFFERENCE, (
+            "%s took %.4fs, the baseline is %.4fs" % (name, best, baseline["seconds"])
+        )
+        return result
+
+    def write(self):
+        BASELINE.write_text(json.dumps({**self.baseline, **self.results}, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture(scope="session")
+def benchmarks(request):
+    benchmarks = Benchmarks(request.config)
+    request.config._benchmarks = benchmarks
+    yield benchmarks
+    if benchmarks.save and benchmarks.results:
+        benchmarks.write()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    benchmarks = getattr(config, "_benchmarks", None)
+    if benchmarks is None or not benchmarks.results:
+        return
+    terminalreporter.section("benchmarks")
+    for name, measured in sorted(benchmarks.results.items()):
+        baseline = benchmarks.baseline.get(name)
+        change = (
+            "%+6.0f%%" % ((measured["seconds"] / baseline["seconds"] - 1) * 100)
+            if baseline and baseline["seconds"] else "   new"
+        )
+        terminalreporter.write_line(
+            "%-40s %9.2fms %s %4d queries" % (name, measured["seconds"] * 1000, change, measured["queries"])
+        )
+    if benchmarks.save:
+        terminalreporter.write_line("Baseline saved to %s" % BASELINE)
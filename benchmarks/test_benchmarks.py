@@ -0,0 +1,72 @@
+import pytest
+from countchars import chars_by_count
+from django.conf import settings
+from django.core.cache import caches
+from django.test import Client
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from journal.models import Entry
+from users.authentication import CachedTokenAuthentication, token_cache
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.django_db]
+
+
+def _name(benchmark, dataset):
+    return "%s[%s]" % (benchmark, dataset.size)
+
+
+def _clear_journal_cache():
+    # Measure the views, not the cached responses
+    caches[settings.JOURNAL_CACHE].clear()
+
+
+def test_my_entries(benchmarks, dataset):
+    entries = benchmarks.measure(
+        _name("my_entries.page", dataset),
+        lambda: list(Entry.objects.my_entries(dataset.user).prefetch_related("emotions")[:20]),
+    )
+    assert entries
+    benchmarks.measure(
+        _name("my_entries.all", dataset), lambda: list(Entry.objects.my_entries(dataset.user)),
+    )
+
+
+def test_entry_admin_changelist(benchmarks, dataset):
+    client = Client()
+    client.force_login(dataset.admin)
+    response = benchmarks.measure(_name("admin.entry_changelist", dataset), lambda: client.get("/journal/entry/"))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/api/entries/", "/api/users/"])
+def test_api_list(benchmarks, dataset, path):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token %s" % dataset.user.auth_token.key)
+    name = "api%s" % path.rstrip("/").replace("/api", "").replace("/", ".")
+    response = benchmarks.measure(_name(name, dataset), lambda: client.get(path), setup=_clear_journal_cache)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_token_authentication(benchmarks, dataset, cached):
+    key = dataset.user.auth_token.key
+    factory = APIRequestFactory()
+    authentication = CachedTokenAuthentication() if cached else TokenAuthentication()
+
+    def authenticate():
+        # 100 requests of the user
+        for _ in range(100):
+            result = authentication.authenticate(Request(factory.get("/", HTTP_AUTHORIZATION="Token %s" % key)))
+        return result
+
+    name = "token_auth.%s" % ("cached" if cached else "uncached")
+    user, _ = benchmarks.measure(_name(name, dataset), authenticate, setup=token_cache.clear)
+    assert user.pk == dataset.user.pk
+
+
+def test_chars_by_count(benchmarks, dataset):
+    text = "".join(Entry.objects.filter(user=dataset.user).values_list("text", flat=True))
+    counts = benchmarks.measure(_name("chars_by_count", dataset), lambda: chars_by_count(text))
+    assert sum(count for _, count in counts) == len(text)
@@ -1,15 +1,86 @@
+import shutil
+import tempfile
+
 import pytest
+from django.core.cache import caches
 from django.core.management import call_command
+from journal.emotions import emotion_registry
+from users.authentication import token_cache
+from users.signals import group_changed
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from rest_framework.test import APIClient
 from users.tests.factories import UserFactory
 
 User = get_user_model()
 
-# @pytest.fixture(scope='session')
-# def django_db_setup(django_db_setup, django_db_blocker):
-#     with django_db_blocker.unblock():
-#         call_command('loaddata', 'diary/fixtures/dummy_data.json')
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark", "benchmarks (benchmarks/)")
+    group.addoption("--benchmark", action="store_true", help="Run the benchmarks, skipped otherwise.")
+    group.addoption(
+        "--benchmark-save", action="store_true",
+        help="Store the measurements as the new baseline instead of comparing them.",
+    )
+    group.addoption(
+        "--benchmark-threshold", type=float, default=0.5,
+        help="Fail a benchmark slower than its baseline by more than this fraction (default 0.5).",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_configure():
+    from django.conf import settings
+
+    # A second database for the shard tests, unused unless ENTRY_SHARDS lists it
+    settings.DATABASES["shard1"] = {**settings.DATABASES["default"], "NAME": "shard1"}
+    # Shared caches of the test run only, not the ones of a running site
+    for alias in ("shared", "tokens"):
+        settings.CACHES[alias] = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(prefix="diary-test-cache-"),
+        }
+
+
+def pytest_unconfigure():
+    from django.conf import settings
+
+    for alias in ("shared", "tokens"):
+        shutil.rmtree(settings.CACHES[alias]["LOCATION"], ignore_errors=True)
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    # users.signals.user_created expects the 'Normal User' group
+    with django_db_blocker.unblock():
+        Group.objects.get_or_create(name='Normal User')
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Cached results are keyed by primary keys, which the test database reuses
+    for cache in caches.all():
+        cache.clear()
+    emotion_registry.check()
+    token_cache.clear()
+    # The group ids of rolled back tests
+    group_changed(Group)
+
 
 @pytest.fixture
 def user() -> User:
-    return UserFactory()
\ No newline at end of file
+    return UserFactory()
+
+
+@pytest.fixture
+def api_client(user):
+    """ REST framework client authenticated as user."""
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
\ No newline at end of file
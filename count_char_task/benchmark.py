@@ -0,0 +1,80 @@
+"""
+Benchmark of the chars_by_count() backends.
+
+Times every backend on ASCII, umlaut-heavy German and emoji-heavy texts
+of several sizes and checks that all of them return identical results.
+
+$> python count_char_task/benchmark.py
+$> python count_char_task/benchmark.py --sizes 1K 1M 100M --repeat 3 --top-k 10
+"""
+import argparse
+import random
+import sys
+import time
+
+from countchars import BACKENDS, chars_by_count, numpy
+
+ALPHABETS = {
+	"ascii": "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,;:!?\n",
+	"umlauts": "aäbcdeefghiijklmnoöprsßstuüvwzAÄÖÜEINST      .,\n",
+	"emoji": "abcdef 🙂😀😢😡🥰🤔👍🎉🌧️☀️❤️💔\n",
+}
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(value):
+	if value[-1].upper() in UNITS:
+		return int(value[:-1]) * UNITS[value[-1].upper()]
+	return int(value)
+
+
+def make_text(kind, size, seed=0):
+	""" Builds a text of `size` characters by repeating a random block."""
+	alphabet = ALPHABETS[kind]
+	rng = random.Random(seed)
+	weights = [rng.randint(1, 50) for _ in alphabet]
+	block = "".join(rng.choices(alphabet, weights, k=min(size, 1 << 16)))
+	return (block * (size // len(block) + 1))[:size]
+
+
+def best_time(func, repeat):
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = func()
+		timings.append(time.perf_counter() - start)
+	return min(timings), result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", nargs="+", default=["1K", "1M", "100M"])
+	parser.add_argument("--texts", nargs="+", default=list(ALPHABETS), choices=list(ALPHABETS))
+	parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--top-k", type=int, default=None)
+	args = parser.parse_args(argv)
+
+	backends = [b for b in args.backends if b != "numpy" or numpy is not None]
+	print("%-8s %8s %-8s %12s %10s" % ("text", "size", "backend", "seconds", "speedup"))
+	mismatches = 0
+	for kind in args.texts:
+		for size in map(parse_size, args.sizes):
+			text = make_text(kind, size)
+			results, reference = {}, None
+			for backend in backends:
+				seconds, results[backend] = best_time(
+					lambda: chars_by_count(text, backend=backend, top_k=args.top_k), args.repeat
+				)
+				reference = reference or seconds
+				print("%-8s %8s %-8s %12.6f %9.1fx" % (kind, size, backend, seconds, reference / seconds))
+			expected = results[backends[0]]
+			for backend, result in results.items():
+				if result != expected:
+					mismatches += 1
+					print("MISMATCH: %s differs from %s on %s/%s" % (backend, backends[0], kind, size))
+	return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -8,22 +8,196 @@ https://teams.microsoft.com/l/meetup-join/19%3ameeting_ZTE2YmI4MjMtZjIwMi00NTNjL
 https://teams.microsoft.com/l/meetup-join/19:meeting_NWRhNWY1ZDgtMWQzZC00ODgxLWI4YjMtOGFkZDYwMTc5ZWIx@thread.v2
 """
 
-def chars_by_count(text):
+import codecs
+import heapq
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+	import numpy
+except ImportError:  # optional, only needed for the "numpy" backend
+	numpy = None
+
+
+# Characters read per chunk from files and per shard sent to a worker
+CHUNK_SIZE = 1 << 20
+SHARD_SIZE = 8 << 20
+# Below this length encoding the text for numpy costs more than it saves
+NUMPY_MIN_LENGTH = 1 << 16
+
+
+def chars_by_count(text, backend="auto", top_k=None):
 	""" Returns a list of tuples that are sorted descendingly 
 	by count of characters.
+
+	backend: "python" (reference loop), "counter" (collections.Counter),
+	"numpy" (np.bincount over the UTF-32 code points) or "auto".
+	top_k: only return the top_k most frequent characters, selected
+	without sorting all of them.
+
+	All backends give identical results: characters with equal counts
+	keep the order of their first occurrence in the text.
 	"""
-	result = {}
 	# check empty/invalid input
 	if not text or type(text) != str:
 		return None
+	backend = _resolve_backend(backend, len(text))
+	if backend == "numpy":
+		return _numpy_sorted_counts(text, top_k)
+	return _sorted_counts(BACKENDS[backend](text), top_k)
+
+def chars_by_count_stream(source, processes=None, chunk_size=CHUNK_SIZE, shard_size=SHARD_SIZE, backend="auto", top_k=None):
+	""" Like chars_by_count(), but for inputs that do not fit in memory.
+
+	source: a str, a text or binary (UTF-8) file object, an iterable of
+	str chunks, or a queryset of journal entries (their text is counted).
+	processes: if > 1, shards of about shard_size characters are counted
+	in a pool of that many processes and the partial counts merged.
+
+	The result is identical to chars_by_count() over the concatenated text,
+	including the order of characters with equal counts.
+	"""
+	count = BACKENDS[_resolve_backend(backend, min(chunk_size, shard_size))]
+	chunks = _iter_chunks(source, chunk_size)
+	if processes and processes > 1:
+		result = _count_parallel(_iter_shards(chunks, shard_size), processes, count)
+	else:
+		result = {}
+		for chunk in chunks:
+			_merge(result, count(chunk))
+	if not result:
+		return None
+	return _sorted_counts(result, top_k)
+
+def _resolve_backend(backend, length):
+	if backend == "auto":
+		return "numpy" if numpy is not None and length >= NUMPY_MIN_LENGTH else "counter"
+	if backend not in BACKENDS:
+		raise ValueError("Unknown backend %r, choose from %s" % (backend, ", ".join(BACKENDS)))
+	if backend == "numpy" and numpy is None:
+		raise ImportError("The numpy backend requires numpy to be installed")
+	return backend
+
+def _count_chars(text):
+	""" Counts the characters of text, in order of first occurrence."""
+	result = {}
 	for c in text:
 		if c in result:
 			result[c] += 1
 		else:
 			result[c] = 1
+	return result
+
+def _count_counter(text):
+	""" Same as _count_chars, counted in C by collections.Counter."""
+	return Counter(text)
+
+def _code_points(text):
+	return numpy.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+
+def _numpy_counts(text):
+	""" Returns (codes, counts, first): the distinct code points, their
+	counts and the index of their first occurrence. bincount counts in
+	O(n) without sorting, str.find then locates only the few distinct
+	characters, each search stopping at its first occurrence.
+	"""
+	counts = numpy.bincount(_code_points(text))
+	codes = numpy.flatnonzero(counts)
+	first = numpy.array([text.find(chr(code)) for code in codes.tolist()], dtype=numpy.int64)
+	return codes, counts[codes], first
+
+def _count_numpy(text):
+	""" Same as _count_chars, counted by numpy.bincount over the code points."""
+	codes, counts, first = _numpy_counts(text)
+	order = numpy.argsort(first)
+	return dict(zip(map(chr, codes[order].tolist()), counts[order].tolist()))
+
+def _numpy_sorted_counts(text, top_k=None):
+	""" Counts and orders in numpy: by count descending, then by first
+	occurrence. With top_k, only the characters at least as frequent as
+	the top_k-th one are sorted.
+	"""
+	codes, counts, first = _numpy_counts(text)
+	if top_k is not None and top_k < len(codes):
+		if top_k <= 0:
+			return ()
+		threshold = numpy.partition(counts, len(counts) - top_k)[len(counts) - top_k]
+		candidates = numpy.flatnonzero(counts >= threshold)
+		# lexsort sorts by the last key first
+		order = candidates[numpy.lexsort((first[candidates], -counts[candidates]))][:top_k]
+	else:
+		order = numpy.lexsort((first, -counts))
+	return tuple(zip(map(chr, codes[order].tolist()), counts[order].tolist()))
+
+def _sorted_counts(result, top_k=None):
 	# transform dict to sorted list of tuple
+	if top_k is not None and top_k < len(result):
+		# nlargest is stable like sorted(), ties keep the first occurrence order
+		return tuple( heapq.nlargest(max(top_k, 0), result.items(), key=lambda item: item[1]) )
 	return tuple( sorted( result.items(), key=lambda item: item[1], reverse=True) )
 
+BACKENDS = {
+	"python": _count_chars,
+	"counter": _count_counter,
+	"numpy": _count_numpy,
+}
+
+def _merge(result, partial):
+	""" Adds the partial counts to result. Merging partials in input order
+	keeps the first occurrence order of the whole text.
+	"""
+	for c, count in partial.items():
+		result[c] = result.get(c, 0) + count
+	return result
+
+def _iter_chunks(source, chunk_size):
+	""" Yields the str chunks of any supported source."""
+	if isinstance(source, str):
+		yield source
+		return
+	if hasattr(source, "model") and hasattr(source, "values_list"):
+		# A queryset of entries: stream only the texts from the database
+		source = source.values_list("text", flat=True).iterator(chunk_size=2000)
+	elif hasattr(source, "read"):
+		read = source.read
+		source = iter(lambda: read(chunk_size), read(0))
+	decoder = codecs.getincrementaldecoder("utf-8")()
+	for chunk in source:
+		if isinstance(chunk, bytes):
+			chunk = decoder.decode(chunk)
+		if chunk:
+			yield chunk
+	tail = decoder.decode(b"", final=True)
+	if tail:
+		yield tail
+
+def _iter_shards(chunks, shard_size):
+	""" Groups chunks into strings of about shard_size characters."""
+	shard, size = [], 0
+	for chunk in chunks:
+		shard.append(chunk)
+		size += len(chunk)
+		if size >= shard_size:
+			yield "".join(shard)
+			shard, size = [], 0
+	if shard:
+		yield "".join(shard)
+
+def _count_parallel(shards, processes, count=_count_chars):
+	""" Counts the shards in a process pool, keeping at most two shards per
+	process in flight so memory stays bounded, and merges in input order.
+	"""
+	result = {}
+	pending = []
+	with ProcessPoolExecutor(max_workers=processes) as executor:
+		for shard in shards:
+			pending.append(executor.submit(count, shard))
+			if len(pending) >= 2 * processes:
+				_merge(result, pending.pop(0).result())
+		for future in pending:
+			_merge(result, future.result())
+	return result
+
 if __name__ == "__main__":
 	text = ''' 
 	Der Potsdamer Postkutscher putzt den Potsdamer Postkutschkasten 
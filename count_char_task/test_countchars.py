@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+from countchars import BACKENDS, chars_by_count, chars_by_count_stream, numpy
+
+TEXT = """
+	Der Potsdamer Postkutscher putzt den Potsdamer Postkutschkasten.
+	Fünf Ärzte grüßen 🙂🙂 und gehen.
+	""" * 50
+
+
+def test_chars_by_count():
+    result = chars_by_count("abbccc")
+    assert result == (("c", 3), ("b", 2), ("a", 1))
+    assert chars_by_count("") is None
+    assert chars_by_count(42) is None
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_backends_are_identical(backend):
+    if backend == "numpy" and numpy is None:
+        pytest.skip("numpy is not installed")
+    expected = chars_by_count(TEXT, backend="python")
+    assert chars_by_count(TEXT, backend=backend) == expected
+    for top_k in (0, 1, 5, len(expected) + 1):
+        assert chars_by_count(TEXT, backend=backend, top_k=top_k) == expected[:top_k]
+    # top_k cutting through equal counts keeps the first occurrences
+    assert chars_by_count("cabbac", backend=backend, top_k=2) == (("c", 2), ("a", 2))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        chars_by_count("abc", backend="fortran")
+
+
+@pytest.mark.parametrize("source", [
+    lambda: TEXT,
+    lambda: io.StringIO(TEXT),
+    lambda: io.BytesIO(TEXT.encode("utf-8")),
+    lambda: (TEXT[i:i + 7] for i in range(0, len(TEXT), 7)),
+])
+def test_stream_matches_in_memory(source):
+    assert chars_by_count_stream(source(), chunk_size=5) == chars_by_count(TEXT)
+
+
+def test_stream_parallel_matches_in_memory():
+    chunks = (TEXT[i:i + 100] for i in range(0, len(TEXT), 100))
+    assert chars_by_count_stream(chunks, processes=2, shard_size=500) == chars_by_count(TEXT)
+
+
+def test_stream_empty():
+    assert chars_by_count_stream(io.StringIO("")) is None
+    assert chars_by_count_stream([]) is None
+
+
+@pytest.mark.django_db
+def test_stream_entry_queryset(user):
+    from journal.models import Entry
+    from journal.tests.factories import EntryFactory
+
+    EntryFactory(user=user, text="Über")
+    EntryFactory(user=user, text="über alles")
+    assert chars_by_count_stream(Entry.objects.my_entries(user)) == chars_by_count(
+        "".join(Entry.objects.my_entries(user).values_list("text", flat=True))
+    )
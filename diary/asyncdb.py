@@ -0,0 +1,58 @@
+"""
+Bounded thread pool for the database access of async views.
+
+Django's ORM is synchronous. Async views hand their queries to run(), which
+executes them on a pool of settings.ASYNC_DB_THREADS threads, so a request
+waiting on the database does not hold the event loop and no more than that
+many connections are open. Independent queries can run together:
+
+    entries, stats = await asyncio.gather(run(list, queryset), run(get_stats, user))
+
+Each thread keeps its own connections: the pool bounds their number, so
+unlike a request a call does not close them with CONN_MAX_AGE = 0. They
+are closed when broken, or older than a CONN_MAX_AGE other than 0.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASYNC_DB_THREADS", 8), thread_name_prefix="asyncdb"
+        )
+    return _executor
+
+
+def _release_connections():
+    for connection in connections.all():
+        if connection.settings_dict["CONN_MAX_AGE"] != 0:
+            connection.close_if_unusable_or_obsolete()
+        elif connection.errors_occurred:
+            if connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _release_connections()
+
+
+async def run(func, *args, **kwargs):
+    """ Returns func(*args, **kwargs), called on the database thread pool."""
+    # The context carries the request state of the database routers
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _call, func, args, kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor(), call)
@@ -0,0 +1,17 @@
+"""
+Cache aliases shared by the processes of the site.
+
+Invalidation stamps and cached responses must be seen by every worker
+process. A local memory cache is per process: a worker never sees what
+another one stored or invalidated, so users of shared state check
+is_shared() and fall back to not caching.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias):
+    """ Whether the cache alias is seen by all processes. A dummy cache
+    counts as shared, it never returns anything stale.
+    """
+    return not isinstance(caches[alias], LocMemCache)
@@ -0,0 +1,159 @@
+"""
+Conditional GET for REST framework viewsets.
+
+ConditionalGetMixin adds an ETag and a Last-Modified header to the list
+and retrieve responses. Both come from the (pk, updated_at) rows of the
+requested page or object and, for page number pagination, the total
+count. Nothing is serialized to compute them:
+- a request with If-None-Match or If-Modified-Since fetches the rows in
+  one narrow query first, and gets 304 Not Modified when they match,
+  before the full query runs,
+- any other request takes them from the objects the view loaded anyway.
+
+Lists are validated by their ETag only: their Last-Modified does not
+move when a row is deleted, so If-Modified-Since alone never matches.
+"""
+import hashlib
+
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.pagination import PageNumberPagination
+
+CONDITIONAL_HEADERS = ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE")
+
+
+class ConditionalGetMixin:
+    """ ETag and Last-Modified for list and retrieve, see the module
+    documentation.
+
+    updated_field: the timestamp every change of a row moves
+    validate_last_modified: whether If-Modified-Since is honoured for
+    single objects; False when they depend on more than their row
+    validator_extra(request): more values the responses depend on
+    """
+    updated_field = "updated_at"
+    validate_last_modified = True
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_object(self):
+        obj = super().get_object()
+        self.served_rows = [(obj.pk, getattr(obj, self.updated_field))]
+        return obj
+
+    def validator_extra(self, request):
+        return ()
+
+    def validator_rows(self, request, **kwargs):
+        """ Returns the rows validating the response, None to answer
+        without validators (an invalid page, a missing object).
+        """
+        if self.action == "retrieve":
+            return self.retrieve_rows(request, **kwargs)
+        return self.list_rows(request)
+
+    def loaded_rows(self, request):
+        """ Returns the validator_rows() of the objects the view loaded,
+        None if it loaded none (a cached response).
+        """
+        rows = getattr(self, "served_rows", None)
+        if rows is not None or self.action != "list":
+            return rows
+        paginator = self.paginator
+        page = getattr(paginator, "page", None)
+        if paginator is None or page is None:
+            return None
+        if hasattr(paginator, "page_queryset"):
+            return [*self.rows_of(page), paginator.has_next]
+        if isinstance(paginator, PageNumberPagination):
+            return [page.paginator.count, *self.rows_of(page.object_list)]
+        return None
+
+    def rows_of(self, objects):
+        return [(obj.pk, getattr(obj, self.updated_field)) for obj in objects]
+
+    def version_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        return queryset.prefetch_related(None).values_list("pk", self.updated_field)
+
+    def list_rows(self, request):
+        rows = self.version_queryset()
+        paginator = self.paginator
+        if paginator is None:
+            return list(rows)
+        if hasattr(paginator, "page_queryset"):
+            # Keyset pagination, see EntryCursorPagination
+            page_size = paginator.get_page_size(request)
+            rows = list(paginator.page_queryset(rows, request)[:page_size + 1])
+            return [*rows[:page_size], len(rows) > page_size]
+        if not isinstance(paginator, PageNumberPagination) or not paginator.get_page_size(request):
+            return None
+        pages = paginator.django_paginator_class(rows, paginator.get_page_size(request))
+        number = request.query_params.get(paginator.page_query_param, 1)
+        if number in paginator.last_page_strings:
+            number = pages.num_pages
+        try:
+            page = pages.page(number)
+        except InvalidPage:
+            return None
+        return [pages.count, *page.object_list]
+
+    def retrieve_rows(self, request, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        rows = list(self.version_queryset().filter(**{self.lookup_field: kwargs[lookup]}))
+        return rows or None
+
+    def validators(self, request, rows):
+        """ Returns a response carrying the ETag and Last-Modified of rows,
+        and the Last-Modified timestamp.
+        """
+        validator = (
+            request.user.pk, request.accepted_renderer.format, request.build_absolute_uri(),
+            rows, self.validator_extra(request),
+        )
+        headers = HttpResponse()
+        headers["ETag"] = '"%s"' % hashlib.md5(repr(validator).encode("utf-8")).hexdigest()
+        updated = [row[1] for row in rows if isinstance(row, tuple) and row[1] is not None]
+        # Whole seconds, as in the header
+        last_modified = int(max(updated).timestamp()) if updated else None
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        return headers, last_modified
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        rows = None
+        if any(header in request.META for header in CONDITIONAL_HEADERS):
+            rows = self.validator_rows(request, **kwargs)
+            if rows is not None:
+                headers, last_modified = self.validators(request, rows)
+                validate_last_modified = self.validate_last_modified and self.action == "retrieve"
+                response = get_conditional_response(
+                    request, etag=headers["ETag"], response=headers,
+                    last_modified=last_modified if validate_last_modified else None,
+                )
+                if response is not headers:
+                    return response
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        if rows is None:
+            rows = self.loaded_rows(request)
+            if rows is None:
+                rows = self.validator_rows(request, **kwargs)
+            else:
+                self.rows_loaded(request, rows)
+        if rows is not None:
+            headers, _ = self.validators(request, rows)
+            for header in ("ETag", "Last-Modified"):
+                if header in headers:
+                    response[header] = headers[header]
+        return response
+
+    def rows_loaded(self, request, rows):
+        """ Called with the validator rows taken from a response."""
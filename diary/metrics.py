@@ -0,0 +1,37 @@
+""" Process-local counters for operational metrics
+
+Cheap enough to be incremented on every request. Each worker process
+keeps its own counters, the scraper sums them up. Exposed by
+MetricsView under /api/metrics/.
+"""
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, value=1):
+	with _lock:
+		_counters[name] += value
+
+
+def get(name):
+	return _counters[name]
+
+
+def snapshot(prefix=""):
+	""" Returns the counters whose name starts with prefix, sorted."""
+	with _lock:
+		return {name: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
+
+
+def ratio(hits, misses):
+	""" Hit rate of two counters, None before the first lookup."""
+	total = get(hits) + get(misses)
+	return get(hits) / total if total else None
+
+
+def reset():
+	with _lock:
+		_counters.clear()
@@ -0,0 +1,10 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsSuperUser(BasePermission):
+    """ Superusers only. IsAdminUser does not do, every user is staff
+    to access the admin (see users.signals).
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
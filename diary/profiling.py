@@ -0,0 +1,209 @@
+"""
+Opt-in cProfile profiling of single requests.
+
+ProfilingMiddleware runs the view, and the rendering of its response,
+under cProfile when:
+- the request asks for it with the PROFILING_HEADER header or the
+  PROFILING_PARAMETER query parameter and comes from a superuser
+  (users.signals makes every user staff), checked before the view runs:
+  the session user, else the user of the API token,
+- or it is picked by PROFILING_SAMPLE_RATE (0.0 - 1.0, default off).
+
+The profile is written to PROFILING_DIR as a pstats file named after
+the time, the URL name and the duration, and its name is returned in the
+X-Profile header. Only the newest PROFILING_MAX_FILES files younger
+than PROFILING_MAX_AGE seconds are kept. "manage.py profile_summary"
+lists the hottest functions over the collected profiles.
+
+Sync views are profiled in the thread that runs them, under WSGI and
+ASGI alike. Async views are profiled on the event loop thread, one at
+a time: the profile shows the other coroutines that ran meanwhile, not
+the queries handed to the diary.asyncdb threads.
+"""
+import cProfile
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+from diary import metrics
+from diary.timing import url_name
+from users.authentication import CachedTokenAuthentication
+
+SUFFIX = ".prof"
+
+# One profiler at a time on the event loop thread
+_async_lock = threading.Lock()
+
+
+def directory():
+    return Path(getattr(settings, "PROFILING_DIR", Path(tempfile.gettempdir()) / "diary-profiles"))
+
+
+def requested(request):
+    header = getattr(settings, "PROFILING_HEADER", "X-Profile")
+    parameter = getattr(settings, "PROFILING_PARAMETER", "profile")
+    return bool(request.headers.get(header) or request.GET.get(parameter))
+
+
+def sampled():
+    rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def superuser(request):
+    """ Whether the request comes from a superuser, by its session or its
+    token. Queries the database: sync only.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_superuser
+    # The REST framework only authenticates in the view
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(Request(request))
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_superuser
+
+
+def file_name_part(name):
+    return re.sub(r"[^\w.-]+", "_", name)
+
+
+def file_url_name(path):
+    """ Returns the URL name part of the name of a profile file."""
+    match = re.match(r"[^-]+-(.+)-\d+ms%s$" % re.escape(SUFFIX), Path(path).name)
+    return match.group(1) if match else None
+
+
+def save(profiler, request, seconds):
+    """ Writes the profile and applies the retention limits. Returns the
+    file name.
+    """
+    path = directory()
+    path.mkdir(parents=True, exist_ok=True)
+    name = "%s-%s-%dms%s" % (
+        datetime.now().strftime("%Y%m%dT%H%M%S.%f"),
+        file_name_part(url_name(request)),
+        seconds * 1000,
+        SUFFIX,
+    )
+    profiler.dump_stats(path / name)
+    metrics.incr("profiling.profiles")
+    prune()
+    return name
+
+
+def prune():
+    """ Deletes the profiles beyond PROFILING_MAX_FILES or older than
+    PROFILING_MAX_AGE seconds.
+    """
+    max_files = getattr(settings, "PROFILING_MAX_FILES", 200)
+    max_age = getattr(settings, "PROFILING_MAX_AGE", 7 * 24 * 60 * 60)
+    files = sorted(directory().glob("*" + SUFFIX), key=lambda file: file.stat().st_mtime, reverse=True)
+    oldest = time.time() - max_age
+    for number, file in enumerate(files):
+        if number >= max_files or file.stat().st_mtime < oldest:
+            file.unlink(missing_ok=True)
+
+
+def profiles():
+    """ Returns the paths of the collected profiles, newest first."""
+    return sorted(directory().glob("*" + SUFFIX), reverse=True)
+
+
+class ProfilingMiddleware:
+    """ Profiles requests, see the module documentation.
+
+    It calls profiled views itself, from process_view: put it last in
+    settings.MIDDLEWARE, so the process_view hooks of the others (CSRF)
+    run before. Their process_exception hooks do not see the exceptions
+    of profiled views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def wanted(self, request):
+        """ Returns "sampled", "requested" or None."""
+        if sampled():
+            return "sampled"
+        if requested(request) and superuser(request):
+            return "requested"
+        return None
+
+    async def awanted(self, request):
+        if sampled():
+            return "sampled"
+        if requested(request) and await sync_to_async(superuser)(request):
+            return "requested"
+        return None
+
+    def finish(self, request, response, profiler, seconds):
+        response["X-Profile"] = save(profiler, request, seconds)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.wanted(request) is None:
+            return None
+        return self.profile(request, view_func, view_args, view_kwargs)
+
+    def profile(self, request, view_func, view_args, view_kwargs):
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.run_view, view_func, request, view_args, view_kwargs)
+        return self.finish(request, response, profiler, time.perf_counter() - start)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if await self.awanted(request) is None:
+            return None
+        if not iscoroutinefunction(view_func):
+            # Where Django would run the view, profiled in that thread
+            return await sync_to_async(self.profile, thread_sensitive=True)(
+                request, view_func, view_args, view_kwargs
+            )
+        if not _async_lock.acquire(blocking=False):
+            return None
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await view_func(request, *view_args, **view_kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _async_lock.release()
+        seconds = time.perf_counter() - start
+        return await sync_to_async(self.finish)(request, response, profiler, seconds)
+
+    @staticmethod
+    def run_view(view_func, request, view_args, view_kwargs):
+        response = view_func(request, *view_args, **view_kwargs)
+        # REST framework responses render after the middleware, include it
+        if callable(getattr(response, "render", None)):
+            response.render()
+        return response
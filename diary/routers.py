@@ -0,0 +1,160 @@
+"""
+Database router sending reads of the journal and users apps to replicas.
+
+settings.DATABASE_REPLICAS lists the replica aliases, reads pick one at
+random. Writes and everything outside ROUTED_APPS stay on "default".
+
+Replicas lag behind. Reads go to "default" instead:
+- inside a transaction on "default",
+- for the rest of a request after it wrote,
+- for REPLICA_PIN_SECONDS after a request of the same user wrote, so users
+  read their own writes (ReplicaRouterMiddleware). The pin is stored in
+  the cache alias REPLICA_PIN_CACHE, shared by the worker processes: the
+  next request may be served by another one,
+- inside read_primary(), for data that fills a cache: a lagging replica
+  would store stale data under the current cache version.
+"""
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+ROUTED_APPS = {"journal", "users"}
+PIN_KEY = "db:pinned:%s"
+
+_request_state = contextvars.ContextVar("replica_router_state", default=None)
+_primary = contextvars.ContextVar("replica_router_primary", default=False)
+
+
+class RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        # user id -> pinned to "default"
+        self.pinned = {}
+
+
+def _user_id(request):
+    # Only a user authentication already loaded, resolving one reads the database
+    user = getattr(request, "user", None)
+    if type(user) is SimpleLazyObject:
+        user = user._wrapped
+        if user is empty:
+            return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def pin_cache():
+    return caches[getattr(settings, "REPLICA_PIN_CACHE", "shared")]
+
+
+def pin_user(user_id):
+    """ Reads of the user go to "default" for REPLICA_PIN_SECONDS."""
+    pin_cache().set(PIN_KEY % user_id, 1, getattr(settings, "REPLICA_PIN_SECONDS", 5))
+
+
+@contextlib.contextmanager
+def read_primary():
+    """ Sends the reads inside to "default"."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class ReplicaRouter:
+
+    def _pinned(self):
+        state = _request_state.get()
+        if state is None:
+            return False
+        if state.wrote:
+            return True
+        user_id = _user_id(state.request)
+        if user_id is None:
+            return False
+        if user_id not in state.pinned:
+            state.pinned[user_id] = pin_cache().get(PIN_KEY % user_id) is not None
+        return state.pinned[user_id]
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        if not replicas or model._meta.app_label not in ROUTED_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or _primary.get() or self._pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label in ROUTED_APPS:
+            state.wrote = True
+        # Without a router Django writes to "default", or to the database of
+        # the instance hint: not to the replica an instance was read from.
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in getattr(settings, "DATABASE_REPLICAS", ()):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *getattr(settings, "DATABASE_REPLICAS", ())}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of "default"
+        if db in getattr(settings, "DATABASE_REPLICAS", ()):
+            return False
+        return None
+
+
+class ReplicaRouterMiddleware:
+    """ Tracks the writes of a request for ReplicaRouter and pins the user
+    to "default" after them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.finish(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.finish(request, state)
+        return response
+
+    def finish(self, request, state):
+        if state.wrote:
+            user_id = _user_id(request)
+            if user_id is not None:
+                pin_user(user_id)
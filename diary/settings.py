@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +55,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'diary.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +63,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'journal.middleware.EmotionRegistryMiddleware',
+    'diary.routers.ReplicaRouterMiddleware',
+    # Last, it runs the profiled views itself
+    'diary.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'diary.urls'
@@ -93,6 +100,153 @@ DATABASES = {
     }
 }
 
+# Production profile for SQLite behind several worker processes, enabled
+# with the environment variable DIARY_DB_PROFILE=production. WAL lets readers
+# run next to the one writer, synchronous=NORMAL syncs on checkpoints only
+# (safe with WAL), busy_timeout waits for the write lock instead of failing,
+# cache_size (negative: KiB) and mmap_size keep hot pages in memory.
+# Connections are kept open for CONN_MAX_AGE seconds. See diary.sqlite3.
+SQLITE_PRODUCTION = {
+    'ENGINE': 'diary.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 20000,
+            'cache_size': -64000,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+
+if os.environ.get('DIARY_DB_PROFILE') == 'production':
+    DATABASES['default'] = SQLITE_PRODUCTION
+
+# Read replicas of "default", see diary.routers. Reads of the journal and
+# users apps go to them, a user's reads return to "default" for
+# REPLICA_PIN_SECONDS after each of their writes, pinned in the cache alias
+# REPLICA_PIN_CACHE that all worker processes share. For a local stand-in set
+# DIARY_DB_REPLICA to a second SQLite file and copy "default" into it with
+# "manage.py sync_replica" (once, or with --interval to keep it in sync).
+DATABASE_ROUTERS = ['journal.shards.ShardRouter', 'diary.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_CACHE = "shared"
+
+if os.environ.get('DIARY_DB_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': Path(os.environ['DIARY_DB_REPLICA']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+# Databases holding the journal entries, per user, see journal.shards.
+# Empty keeps all entries on "default". New users are pinned to a shard;
+# after adding one, move users to it with "manage.py rebalance_shards".
+# For local shards set
+# DIARY_DB_SHARDS to comma separated SQLite files, migrate each of them
+# ("manage.py migrate --database shard1") and run "manage.py init_shards".
+ENTRY_SHARDS = []
+
+if os.environ.get('DIARY_DB_SHARDS'):
+    ENTRY_SHARDS = ['default']
+    for number, name in enumerate(os.environ['DIARY_DB_SHARDS'].split(','), start=1):
+        DATABASES['shard%d' % number] = {**DATABASES['default'], 'NAME': Path(name)}
+        ENTRY_SHARDS.append('shard%d' % number)
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# "default" is local memory, per process. "shared" holds what all worker
+# processes must agree on, by default a file based cache in a temporary
+# directory; for Redis (django-redis) set DIARY_SHARED_CACHE_BACKEND to
+# "django_redis.cache.RedisCache" and DIARY_SHARED_CACHE_LOCATION to
+# "redis://127.0.0.1:6379/1". "tokens" holds the token invalidation stamp
+# apart, so clearing the journal cache does not drop the cached tokens; with
+# Redis, point DIARY_TOKEN_CACHE_LOCATION at another database. See
+# diary.caching.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "diary",
+    },
+    "shared": {
+        "BACKEND": os.environ.get(
+            "DIARY_SHARED_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.environ.get(
+            "DIARY_SHARED_CACHE_LOCATION", str(Path(tempfile.gettempdir()) / "diary-cache"),
+        ),
+    },
+    "tokens": {
+        "BACKEND": os.environ.get(
+            "DIARY_SHARED_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.environ.get(
+            "DIARY_TOKEN_CACHE_LOCATION", str(Path(tempfile.gettempdir()) / "diary-tokens"),
+        ),
+    },
+}
+
+# Cache alias and timeout (seconds) of the versioned journal cache, see
+# journal.cache. With a local memory alias every worker would serve what it
+# cached after another worker invalidated it, so responses are not cached
+# then. Its hit and miss counters (diary.metrics) are per worker process.
+JOURNAL_CACHE = "shared"
+JOURNAL_CACHE_TIMEOUT = 60 * 60
+
+# Threads running the database queries of the async views, see diary.asyncdb
+ASYNC_DB_THREADS = 8
+
+# Delta sync of offline clients, see journal.sync: entries per delta,
+# client changes per request and days the tombstones of deleted entries
+# are kept ("manage.py prune_sync_tombstones")
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_CHANGES = 500
+SYNC_TOMBSTONE_DAYS = 90
+
+# Operations per request of /api/entries/batch/, see journal.batch
+ENTRY_BATCH_MAX = 500
+
+# Request timing, see diary.timing: Server-Timing header, requests logged
+# as slow (seconds, per URL name) and timings kept per URL name. The header
+# shows the database timings to any client, turn it on for development only.
+SERVER_TIMING_HEADER = os.environ.get("DIARY_SERVER_TIMING") == "1"
+SLOW_REQUEST_SECONDS = 1.0
+SLOW_REQUEST_THRESHOLDS = {
+    "admin:journal_entry_changelist": 2.0,
+}
+REQUEST_TIMING_WINDOW = 1000
+
+# Request profiling, see diary.profiling: superusers profile a request with
+# the header or query parameter, PROFILING_SAMPLE_RATE profiles a fraction of
+# all requests. The newest PROFILING_MAX_FILES profiles younger than
+# PROFILING_MAX_AGE (seconds) are kept in PROFILING_DIR.
+PROFILING_HEADER = "X-Profile"
+PROFILING_PARAMETER = "profile"
+PROFILING_SAMPLE_RATE = float(os.environ.get("DIARY_PROFILING_SAMPLE_RATE", 0.0))
+PROFILING_DIR = Path(os.environ.get("DIARY_PROFILING_DIR", Path(tempfile.gettempdir()) / "diary-profiles"))
+PROFILING_MAX_FILES = 200
+PROFILING_MAX_AGE = 7 * 24 * 60 * 60
+
+# Cache alias of the invalidation stamp, size and time to live (seconds) of
+# the per-process token cache, see users.authentication. Tokens are not
+# cached with a local memory alias, which would hide revocations from the
+# other processes.
+TOKEN_AUTH_CACHE = "tokens"
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 60
+
+# Cache alias of the normal user group id, see users.signals
+USERS_CACHE = "shared"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -147,7 +301,7 @@ REST_FRAMEWORK = {
     # or allow read-only access for unauthenticated users.
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
@@ -0,0 +1,40 @@
+"""
+SQLite backend with per-connection pragmas and an explicit transaction mode.
+
+ENGINE "diary.sqlite3" takes two extra OPTIONS besides the sqlite3.connect()
+arguments:
+
+pragmas: {name: value} run as "PRAGMA name = value" on each new connection,
+    e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"}.
+transaction_mode: "DEFERRED", "IMMEDIATE" or "EXCLUSIVE" for the BEGIN of
+    atomic blocks. A deferred transaction that reads first and writes later
+    fails at once with "database is locked" when another connection writes
+    meanwhile, the busy timeout does not apply to it. IMMEDIATE takes the
+    write lock at BEGIN and waits for it instead.
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop("pragmas", {})
+        self.transaction_mode = params.pop("transaction_mode", None)
+        if self.transaction_mode is not None and self.transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ValueError("transaction_mode must be one of %s." % ", ".join(TRANSACTION_MODES))
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute("PRAGMA %s = %s" % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute("BEGIN %s" % self.transaction_mode.upper())
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,251 @@
+"""
+Per-request timing of the SQL, the view and the response rendering.
+
+RequestTimingMiddleware measures each request:
+- total: the request through the rest of the middleware chain,
+- view: the view, from process_view until it returned,
+- render: rendering a template response (REST framework responses); the
+  serializers run in the view,
+- db: the number and time of the queries, on every database connection
+  and in the threads of diary.asyncdb, and the slowest one.
+
+It adds them as a Server-Timing header if settings.SERVER_TIMING_HEADER
+is on (off by default: the database timings are not for every client),
+logs a line per request to the "diary.timing" logger, at INFO or, above
+the slow request threshold of its URL name, at WARNING, and keeps the
+latest REQUEST_TIMING_WINDOW total times of each URL name, whose
+percentiles MetricsView shows under /api/metrics/.
+
+Thresholds: settings.SLOW_REQUEST_SECONDS, SLOW_REQUEST_THRESHOLDS maps
+URL names ("api:user-list", "admin:journal_entry_changelist") to their own.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from diary import metrics
+
+logger = logging.getLogger("diary.timing")
+
+PERCENTILES = (50, 95, 99)
+UNRESOLVED = "<unresolved>"
+# Characters of the slowest statement in the log line
+SQL_LOG_LENGTH = 300
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """ Measurements of one request, shared with the threads it queries from."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view_end = None
+        self.render_end = None
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, seconds):
+        with self._lock:
+            self.queries += 1
+            self.sql_seconds += seconds
+            if seconds >= self.slowest_seconds:
+                self.slowest_seconds, self.slowest_sql = seconds, sql
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - start)
+
+
+def install(connection):
+    """ Times the queries of connection while a request is measured."""
+    # Outermost: connection.execute_wrapper() blocks pop the last wrapper
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install(connection)
+
+
+class RequestTimings:
+    """ Latest total times per URL name, in a bounded window each."""
+
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, "REQUEST_TIMING_WINDOW", 1000)
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def percentiles(self, name):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        result = {"count": len(samples)}
+        for percent in PERCENTILES:
+            result["p%d" % percent] = samples[min(len(samples) - 1, len(samples) * percent // 100)]
+        return result
+
+    def snapshot(self):
+        """ Returns URL name -> count and percentiles (seconds), sorted."""
+        with self._lock:
+            names = sorted(self._samples)
+        return {name: self.percentiles(name) for name in names}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+request_timings = RequestTimings()
+
+
+def url_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None and match.view_name else UNRESOLVED
+
+
+def slow_threshold(name):
+    thresholds = getattr(settings, "SLOW_REQUEST_THRESHOLDS", {})
+    return thresholds.get(name, getattr(settings, "SLOW_REQUEST_SECONDS", 1.0))
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _quote(value):
+    return repr(value) if isinstance(value, str) and " " in value else value
+
+
+class RequestTimingMiddleware:
+    """ Measures requests, see the module documentation. Put it first in
+    settings.MIDDLEWARE to include the time of the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Async hooks, sync ones would be run in a thread
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = self.start()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def start(self):
+        # Connections opened before this module was loaded
+        for connection in connections.all():
+            install(connection)
+        return RequestTiming()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        if timing is not None:
+            timing.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timing = _current.get()
+        if timing is not None:
+            timing.view_end = time.perf_counter()
+
+            def rendered(response):
+                timing.render_end = time.perf_counter()
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return RequestTimingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_template_response(self, request, response):
+        return RequestTimingMiddleware.process_template_response(self, request, response)
+
+    def finish(self, request, response, timing):
+        end = time.perf_counter()
+        total = end - timing.start
+        name = url_name(request)
+        request_timings.add(name, total)
+        durations = {
+            metric: _milliseconds(seconds)
+            for metric, seconds in (
+                ("total", total),
+                ("view", (timing.view_end or end) - timing.view_start if timing.view_start else None),
+                ("render", (timing.render_end or end) - timing.view_end if timing.view_end else None),
+                ("db", timing.sql_seconds),
+                ("db-slowest", timing.slowest_seconds),
+            )
+            if seconds is not None
+        }
+        if getattr(settings, "SERVER_TIMING_HEADER", False):
+            response["Server-Timing"] = ", ".join(
+                "%s;dur=%s" % (metric, duration) + (';desc="%d queries"' % timing.queries if metric == "db" else "")
+                for metric, duration in durations.items()
+            )
+        slow = total >= slow_threshold(name)
+        if slow:
+            metrics.incr("requests.slow")
+        level = logging.WARNING if slow else logging.INFO
+        if logger.isEnabledFor(level):
+            fields = {
+                "url_name": name,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": timing.queries,
+                **{"%s_ms" % metric.replace("-", "_"): duration for metric, duration in durations.items()},
+            }
+            if slow and timing.slowest_sql:
+                fields["slowest_sql"] = timing.slowest_sql[:SQL_LOG_LENGTH]
+            logger.log(
+                level, "%s %s", "slow request" if slow else "request",
+                " ".join("%s=%s" % (key, _quote(value)) for key, value in fields.items()),
+                extra={"timing": fields},
+            )
+        return response
@@ -5,12 +5,21 @@ from django.urls import include, path
 from django.conf import settings
 from rest_framework.authtoken.views import obtain_auth_token
 
+from diary.views import MetricsView
+from journal.api import async_views
+from journal.api.views import SyncView
+
 urlpatterns = [
-    # Django Admin, use {% url 'admin:index' %}
-    path(settings.ADMIN_URL, admin.site.urls),
     #
     # DRF
     #
+    # Counters of the worker process, for scraping (superusers only)
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
+    # Async entry endpoints, for the ASGI application (diary.asgi)
+    path("api/async/entries/", async_views.entry_list, name="async-entry-list"),
+    path("api/async/entries/<int:pk>/", async_views.entry_detail, name="async-entry-detail"),
+    # Delta sync for offline clients, see journal.sync
+    path("api/sync/", SyncView.as_view(), name="sync"),
     # API Base Url
     # See api_router for the routing of the viewsets
     path("api/", include("diary.api_router")),
@@ -18,4 +27,7 @@ urlpatterns = [
     # POST username and password to this endpoint to get the authentication token.
     # The token is used for subsequent requests from the client.
     path("api-auth-token/", obtain_auth_token),
+    # Django Admin, use {% url 'admin:index' %}
+    # Last, as the admin catch-all view would shadow the routes above
+    path(settings.ADMIN_URL, admin.site.urls),
 ]
\ No newline at end of file
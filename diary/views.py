@@ -0,0 +1,25 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from diary import metrics
+from diary.permissions import IsSuperUser
+from diary.timing import request_timings
+
+
+class MetricsView(APIView):
+    """ Operational counters of the worker process that served the request.
+
+    url: /api/metrics/
+    """
+    permission_classes = [IsSuperUser]
+
+    def get(self, request):
+        return Response({
+            "counters": metrics.snapshot(),
+            "ratios": {
+                "journal.cache.hit_rate": metrics.ratio("journal.cache.hits", "journal.cache.misses"),
+                "users.token_cache.hit_rate": metrics.ratio("users.token_cache.hits", "users.token_cache.misses"),
+            },
+            # Seconds per URL name, over the latest requests
+            "timings": request_timings.snapshot(),
+        })
@@ -1,10 +1,18 @@
 from datetime import date
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
-from journal.models import Emotion, Entry
+from journal import exporter, search, shards
+from journal.emotions import emotion_registry
+from journal.expressions import GroupConcat
+from journal.models import Emotion, Entry, UserJournalStats
 
 User = get_user_model()
 
@@ -47,6 +55,32 @@ class EmotionAdmin(admin.ModelAdmin):
 
 
 
+class EmotionListFilter(admin.SimpleListFilter):
+	""" Filter by emotion, with the choices from the emotion registry
+	instead of a query on every changelist.
+	"""
+	title = _("Emotions")
+	parameter_name = "emotions__id__exact"
+
+	def lookups(self, request, model_admin):
+		return [(emotion_registry.id_for(name), name) for name in emotion_registry.names()]
+
+	def queryset(self, request, queryset):
+		if self.value():
+			return queryset.filter(emotions__id__exact=self.value())
+		return queryset
+
+
+class ShardedChangeList(ChangeList):
+	""" Lists the entries of all shards, merged in the changelist order."""
+
+	def get_results(self, request):
+		if shards.enabled():
+			self.queryset = shards.FanOut(self.queryset)
+			self.root_queryset = shards.FanOut(self.root_queryset)
+		super().get_results(request)
+
+
 class EntryAdminForm(forms.ModelForm):
 	class Meta:
 		model = Entry
@@ -72,15 +106,16 @@ class EntryAdmin(admin.ModelAdmin):
 		"_get_emotion_list",
 	)
 	list_display_links = ("occasion",)
-	list_filter = ("emotions",)
+	list_filter = (EmotionListFilter,)
 	readonly_fields = [
         "id",
 		"user",
         "created_at",
         "updated_at",
     ]
-	search_fields = ["user", "text"]
+	search_fields = ["user__username", "text"]
 	autocomplete_fields = ["user", "emotions"]
+	actions = ["export_ndjson", "export_csv", "export_markdown"]
 	form = EntryAdminForm
 	fieldsets = (
         (
@@ -110,18 +145,146 @@ class EntryAdmin(admin.ModelAdmin):
 		obj.user = request.user
 		obj.save()
 
+	# Separates the aggregated emotion names, must not occur in a name
+	EMOTION_SEPARATOR = "\x1f"
+
 	def get_queryset(self, request):
 		""" Shows all objects to superuser. To all others only
 		their own entries
 		"""
 		if request.user.is_superuser:
-			queryset = super(EntryAdmin, self).get_queryset(request)
+			queryset = super(EntryAdmin, self).get_queryset(request).select_related("user")
 		else:
+			# The user of each entry is set by my_entries, unjoined
 			queryset = Entry.objects.my_entries(user=request.user)
-		return queryset
+		return self._with_emotion_names(queryset)
+
+	def get_changelist(self, request, **kwargs):
+		return ShardedChangeList
+
+	def get_object(self, request, object_id, from_field=None):
+		""" Looks the entry up on the shard that allocated its id."""
+		if not shards.enabled() or from_field is not None:
+			return super(EntryAdmin, self).get_object(request, object_id, from_field)
+		try:
+			alias = shards.shard_of_pk(object_id)
+		except ValueError:
+			return None
+		queryset = self.get_queryset(request).using(alias).select_related(None)
+		return queryset.filter(pk=object_id).first()
+
+	def get_actions(self, request):
+		actions = super(EntryAdmin, self).get_actions(request)
+		if shards.enabled():
+			actions = {
+				name: (self._on_shard(func), name, description)
+				for name, (func, name, description) in actions.items()
+			}
+		return actions
+
+	def _on_shard(self, func):
+		""" Runs an action on the shard of the selected entries. An action
+		takes a single queryset, so the selection must not span shards.
+		"""
+		def action(modeladmin, request, queryset):
+			selected = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+			aliases = {shards.shard_of_pk(pk) for pk in selected}
+			if request.POST.get("select_across") == "1" or len(aliases) != 1:
+				self.message_user(
+					request, _("Select entries of a single shard for this action."), messages.ERROR
+				)
+				return None
+			return func(modeladmin, request, queryset.using(aliases.pop()).select_related(None))
+		return action
+
+	def get_search_results(self, request, queryset, search_term):
+		""" Searches the text through the full-text index instead of a
+		LIKE scan over every entry. Usernames match by prefix.
+		"""
+		if not search_term or not search.is_available(queryset.db):
+			return super(EntryAdmin, self).get_search_results(request, queryset, search_term)
+		if shards.enabled():
+			# The users are not on the shards, match them on "default"
+			user_ids = User.objects.filter(username__istartswith=search_term).values_list("pk", flat=True)
+			condition = Q(user_id__in=list(user_ids))
+		else:
+			condition = Q(user__username__istartswith=search_term)
+		matching = search.matching_ids_sql(search_term)
+		if matching is not None:
+			condition |= Q(pk__in=RawSQL(*matching))
+		return queryset.filter(condition), False
+
+	def _with_emotion_names(self, queryset):
+		""" Annotates the emotion names of each entry, aggregated in a
+		correlated subquery so the changelist stays a single query and
+		the list_filter join through the M2M does not affect it.
+		Falls back to a prefetch on databases without GROUP_CONCAT.
+		"""
+		if not GroupConcat.supports(connections[queryset.db]):
+			return queryset.prefetch_related("emotions")
+		Through = Entry.emotions.through
+		names = (
+			Through.objects.filter(entry=OuterRef("pk"))
+			.values("entry")
+			.annotate(names=GroupConcat("emotion__name", self.EMOTION_SEPARATOR))
+			.values("names")
+		)
+		return queryset.annotate(emotion_names=Subquery(names))
+
+	def _export(self, queryset, format):
+		""" Streams the selected entries, in constant memory."""
+		# The changelist annotations and joins are not needed for the export
+		entries = Entry.objects.using(queryset.db).filter(pk__in=queryset.values("pk"))
+		return exporter.streaming_export_response(entries.order_by("user_id", "-occasion", "id"), format)
+
+	@admin.action(description=_("Export selected entries as NDJSON"))
+	def export_ndjson(self, request, queryset):
+		return self._export(queryset, "ndjson")
+
+	@admin.action(description=_("Export selected entries as CSV"))
+	def export_csv(self, request, queryset):
+		return self._export(queryset, "csv")
+
+	@admin.action(description=_("Export selected entries as Markdown"))
+	def export_markdown(self, request, queryset):
+		return self._export(queryset, "markdown")
 
 	def _get_emotion_list(self, obj):
 		"""Aggregate emotions for listing in display"""
+		if hasattr(obj, "emotion_names"):
+			names = obj.emotion_names.split(self.EMOTION_SEPARATOR) if obj.emotion_names else []
+			return ", ".join(sorted(names))
 		return ", ".join([e.name for e in obj.emotions.all()])
 	_get_emotion_list.allow_tags = True
 	_get_emotion_list.short_description = _('List of Emotions')
+
+
+
+@admin.register(UserJournalStats)
+class UserJournalStatsAdmin(admin.ModelAdmin):
+	""" Admin for the Writing Statistics, maintained by journal.stats
+	"""
+	list_display = (
+		"user",
+		"entry_count",
+		"word_count",
+		"last_occasion",
+		"streak",
+	)
+	list_select_related = ("user",)
+	search_fields = ["user__username"]
+	readonly_fields = [
+		"user",
+		"entry_count",
+		"char_count",
+		"word_count",
+		"char_counts",
+		"first_occasion",
+		"last_occasion",
+		"streak",
+		"created_at",
+		"updated_at",
+	]
+
+	def has_add_permission(self, request):
+		return False
@@ -0,0 +1,57 @@
+""" Emotion trends: how often each emotion occurs per day, week or month
+
+A trend is a single GROUP BY over the Entry.emotions through table joined
+to the entries of one user, bucketed by the entry occasion. Results are
+cached per (user, range, bucket) in the versioned journal cache, which the
+Entry and m2m_changed signals invalidate (see journal.cache).
+"""
+from collections import OrderedDict
+
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from journal import cache
+from journal.models import Entry
+
+BUCKETS = OrderedDict([
+	("day", TruncDay),
+	("week", TruncWeek),
+	("month", TruncMonth),
+	("year", TruncYear),
+])
+
+
+def emotion_trends(user, start=None, end=None, bucket="week", emotions=None, using="default"):
+	""" Returns the emotion counts of user's entries per bucket, as a list
+	of {"period": date, "counts": {emotion name: count}} in date order.
+
+	start, end: optional dates limiting the occasions (inclusive)
+	bucket: one of BUCKETS
+	emotions: optional emotion names to limit the trend to
+	"""
+	if bucket not in BUCKETS:
+		raise ValueError("Unknown bucket %r, choose from %s" % (bucket, ", ".join(BUCKETS)))
+	emotions = sorted(set(emotions)) if emotions else None
+	key = cache.user_key("trends", user.pk, start, end, bucket, *(emotions or ()))
+	return cache.get_or_set(key, lambda: _query_trends(user, start, end, bucket, emotions, using))
+
+
+def _query_trends(user, start, end, bucket, emotions, using):
+	Through = Entry.emotions.through
+	links = Through.objects.using(using).filter(entry__user=user)
+	if emotions:
+		links = links.filter(emotion__name__in=emotions)
+	if start is not None:
+		links = links.filter(entry__occasion__gte=start)
+	if end is not None:
+		links = links.filter(entry__occasion__lte=end)
+	rows = (
+		links.annotate(period=BUCKETS[bucket]("entry__occasion"))
+		.values("period", "emotion__name")
+		.annotate(count=Count("pk"))
+		.order_by("period", "emotion__name")
+	)
+	series = OrderedDict()
+	for row in rows:
+		series.setdefault(row["period"], OrderedDict())[row["emotion__name"]] = row["count"]
+	return [{"period": period, "counts": counts} for period, counts in series.items()]
@@ -0,0 +1,175 @@
+""" Async entry endpoints for the ASGI application
+
+The entry list, detail and create endpoints of EntryViewSet as async
+views under /api/async/entries/. They authenticate with the REST framework
+authentication classes and serialize with the same serializers, but every
+database access runs on the thread pool of diary.asyncdb: a request
+waiting on the database holds no worker thread, and the independent
+lookups of the list (entries, emotions, stats) run together. Responses
+are cached in the journal cache of the user, like those of EntryViewSet.
+"""
+import asyncio
+import functools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from diary import asyncdb, routers
+from journal import cache, shards, stats
+from journal.emotions import emotion_registry
+from journal.models import Entry
+
+from .pagination import EntryCursorPagination
+from .serializers import EntrySerializer, UserJournalStatsSerializer
+
+CACHE_NAMESPACE = "async-entries"
+
+
+def _response(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder, safe=False)
+
+
+def _authenticators():
+    return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+
+def _authenticate(request, authenticators):
+    """ Returns the REST framework request of an authenticated user.
+    Raises NotAuthenticated or AuthenticationFailed, PermissionDenied
+    without CSRF token on session authentication.
+    """
+    drf_request = Request(request, authenticators=authenticators)
+    if not drf_request.user or not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return drf_request
+
+
+def _error_response(exc, authenticators):
+    """ The response of APIView.handle_exception(): failed authentication
+    is a 401 with the WWW-Authenticate header of the first authenticator,
+    a 403 if it has none (SessionAuthentication).
+    """
+    headers = {}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = authenticators[0].authenticate_header(None) if authenticators else None
+        if header:
+            headers["WWW-Authenticate"] = header
+        else:
+            exc.status_code = 403
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = _response(data, status=exc.status_code)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def api_view(view):
+    """ Authenticates the request on the pool and turns API exceptions into
+    JSON error responses, like the REST framework views.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authenticators = _authenticators()
+        try:
+            drf_request = await asyncdb.run(_authenticate, request, authenticators)
+            return await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _error_response(exc, authenticators)
+    # CSRF is checked by SessionAuthentication, token clients have no cookie.
+    # Not csrf_exempt(), which returns a sync function.
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+@api_view
+async def entry_list(request):
+    """ GET: a page of the request user's entries, with the user's writing
+    statistics and all emotion names. POST: creates an entry.
+
+    url: /api/async/entries/
+    """
+    if request.method == "POST":
+        return await _create(request)
+    if request.method != "GET":
+        raise exceptions.MethodNotAllowed(request.method)
+    key, data = await asyncdb.run(_lookup, request)
+    if data is None:
+        paginator = EntryCursorPagination()
+        with routers.read_primary():
+            results, user_stats, emotions = await asyncio.gather(
+                asyncdb.run(_page, paginator, request),
+                asyncdb.run(_stats, request.user),
+                asyncdb.run(emotion_registry.names),
+            )
+        data = {
+            "next": paginator.get_next_link(),
+            "results": results,
+            "stats": user_stats,
+            "emotions": emotions,
+        }
+        await asyncdb.run(cache.store, key, data)
+    return _response(data)
+
+
+def _lookup(request):
+    """ Returns the key of the request in the user's journal cache, like
+    UserCacheMixin, and the data cached under it or None.
+    """
+    key = cache.user_key(CACHE_NAMESPACE, request.user.pk, request.build_absolute_uri())
+    return key, cache.lookup(key)
+
+
+def _entries(request):
+    return Entry.objects.my_entries(user=request.user).prefetch_related("emotions")
+
+
+def _page(paginator, request):
+    # Serializing reads related objects, it runs on the pool as well
+    page = paginator.paginate_queryset(_entries(request), request)
+    return EntrySerializer(page, many=True, context={"request": request}).data
+
+
+def _stats(user):
+    return UserJournalStatsSerializer(stats.get_stats(user, using=shards.shard_for(user))).data
+
+
+def _save(request, data):
+    serializer = EntrySerializer(data=data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+    serializer.save(user=request.user)
+    return serializer.data
+
+
+async def _create(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError as error:
+        raise exceptions.ParseError("JSON parse error - %s" % error)
+    return _response(await asyncdb.run(_save, request, data), status=201)
+
+
+@api_view
+async def entry_detail(request, pk):
+    """ GET: one entry of the request user.
+
+    url: /api/async/entries/<pk>/
+    """
+    if request.method != "GET":
+        raise exceptions.MethodNotAllowed(request.method)
+    key, data = await asyncdb.run(_lookup, request)
+    if data is None:
+        with routers.read_primary():
+            data = await asyncdb.run(_detail, request, pk)
+        await asyncdb.run(cache.store, key, data)
+    return _response(data)
+
+
+def _detail(request, pk):
+    entry = _entries(request).filter(pk=pk).first()
+    if entry is None:
+        raise exceptions.NotFound()
+    return EntrySerializer(entry, context={"request": request}).data
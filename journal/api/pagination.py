@@ -0,0 +1,90 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class EntryCursorPagination(BasePagination):
+    """ Keyset pagination over ("-occasion", "id").
+
+    The cursor is the (occasion, id) of the last entry of the previous page,
+    so every page is a single index range scan without OFFSET or COUNT(*).
+    Expects an EntryQuerySet, e.g. from Entry.objects.my_entries(user).
+    """
+    ordering = ("-occasion", "id")
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        # Fetch one row more to know whether a next page exists
+        entries = list(self.page_queryset(queryset, request)[: self.page_size + 1])
+        self.has_next = len(entries) > self.page_size
+        self.page = entries[: self.page_size]
+        return self.page
+
+    def page_queryset(self, queryset, request):
+        """ Returns queryset ordered and filtered to the entries from the
+        cursor of request on, unsliced.
+        """
+        queryset = queryset.order_by(*self.ordering)
+        after = self.decode_cursor(request)
+        if after is not None:
+            queryset = queryset.after(*after)
+        return queryset
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            occasion, pk = b64decode(encoded.encode("ascii")).decode("ascii").split("|")
+            return date.fromisoformat(occasion), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, entry):
+        position = "%s|%s" % (entry.occasion.isoformat(), entry.pk)
+        return b64encode(position.encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
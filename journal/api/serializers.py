@@ -0,0 +1,115 @@
+from django.utils.encoding import smart_str
+from rest_framework import serializers
+
+from journal import batch, stats
+from journal.emotions import emotion_registry
+from journal.models import Emotion, Entry, UserJournalStats
+
+
+class EmotionSerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = Emotion
+        fields = ["url", "id", "name"]
+
+        extra_kwargs = {
+            "url": {"view_name": "api:emotion-detail"}
+        }
+
+
+class EmotionNameField(serializers.SlugRelatedField):
+    """ An emotion by name, resolved through the emotion registry instead
+    of a query per name.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("queryset", Emotion.objects.all())
+        super().__init__(slug_field="name", **kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return emotion_registry.get(smart_str(data))
+        except Emotion.DoesNotExist:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_str(data))
+
+
+class EntrySerializer(serializers.HyperlinkedModelSerializer):
+    # The user is the one my_entries() attached, the emotions are read from
+    # the prefetch of EntryViewSet.get_queryset: a page costs a fixed number
+    # of queries.
+    user = serializers.ReadOnlyField(source="user.username")
+    emotions = EmotionNameField(many=True, required=False)
+
+    class Meta:
+        model = Entry
+        fields = ["url", "id", "user", "occasion", "text", "emotions", "created_at", "updated_at"]
+
+        extra_kwargs = {
+            "url": {"view_name": "api:entry-detail"},
+            "occasion": {"required": False},
+        }
+
+
+class SyncChangeSerializer(serializers.Serializer):
+    """ A client change for /api/sync/: a new entry without id, the new
+    state of an entry, or its deletion. updated_at is when the client made
+    it, client_id is returned with its result.
+    """
+    id = serializers.IntegerField(required=False, allow_null=True)
+    client_id = serializers.CharField(required=False, max_length=255)
+    updated_at = serializers.DateTimeField()
+    occasion = serializers.DateField(required=False, allow_null=True)
+    text = serializers.CharField(required=False, max_length=5000)
+    emotions = EmotionNameField(many=True, required=False)
+    deleted = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data.get("id") is None and not data["deleted"] and not data.get("text"):
+            raise serializers.ValidationError({"text": "A new entry needs a text."})
+        return data
+
+
+class EntryBatchSerializer(serializers.Serializer):
+    """ An operation of /api/entries/batch/: create an entry, or update or
+    delete the entry id. client_id is returned with its result.
+    """
+    action = serializers.ChoiceField(choices=batch.ACTIONS)
+    id = serializers.IntegerField(required=False)
+    client_id = serializers.CharField(required=False, max_length=255)
+    occasion = serializers.DateField(required=False)
+    text = serializers.CharField(required=False, max_length=5000)
+    emotions = EmotionNameField(many=True, required=False)
+
+    def validate(self, data):
+        if data["action"] == batch.CREATE:
+            if not data.get("text"):
+                raise serializers.ValidationError({"text": "A new entry needs a text."})
+        elif data.get("id") is None:
+            raise serializers.ValidationError({"id": "Which entry to %s." % data["action"]})
+        return data
+
+
+class EntrySearchSerializer(EntrySerializer):
+    snippet = serializers.ReadOnlyField()
+    rank = serializers.ReadOnlyField()
+
+    class Meta(EntrySerializer.Meta):
+        fields = EntrySerializer.Meta.fields + ["snippet", "rank"]
+
+
+class UserJournalStatsSerializer(serializers.ModelSerializer):
+    user = serializers.ReadOnlyField(source="user.username")
+    current_streak = serializers.SerializerMethodField()
+    top_chars = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserJournalStats
+        fields = [
+            "user", "entry_count", "char_count", "word_count", "first_occasion",
+            "last_occasion", "streak", "current_streak", "top_chars", "updated_at",
+        ]
+
+    def get_current_streak(self, obj):
+        return stats.current_streak(obj)
+
+    def get_top_chars(self, obj):
+        return stats.top_chars(obj)
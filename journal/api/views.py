@@ -0,0 +1,334 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from django.utils.translation import gettext as _
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+
+from diary import routers
+from diary.conditional import ConditionalGetMixin
+from journal import analytics, batch, cache, exporter, importer, search, shards, stats, sync
+from journal.models import Emotion, Entry
+
+from .pagination import EntryCursorPagination
+from .serializers import (
+    EmotionSerializer,
+    EntryBatchSerializer,
+    EntrySearchSerializer,
+    EntrySerializer,
+    SyncChangeSerializer,
+    UserJournalStatsSerializer,
+)
+
+
+class EmotionViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    serializer_class = EmotionSerializer
+    queryset = Emotion.objects.all()
+
+    @action(detail=False)
+    def trends(self, request):
+        """ Emotion frequency of the request user's entries per period.
+        GET ?bucket=day|week|month|year&start=<date>&end=<date>&emotion=<name>...
+        """
+        params = request.query_params
+        bucket = params.get("bucket", "week")
+        if bucket not in analytics.BUCKETS:
+            raise ValidationError({"bucket": "Choose from %s." % ", ".join(analytics.BUCKETS)})
+        dates = {}
+        for name in ("start", "end"):
+            try:
+                dates[name] = parse_date(params[name]) if params.get(name) else None
+            except ValueError:
+                dates[name] = None
+            if params.get(name) and dates[name] is None:
+                raise ValidationError({name: "Enter a valid date, YYYY-MM-DD."})
+        series = analytics.emotion_trends(
+            request.user, bucket=bucket, emotions=params.getlist("emotion"),
+            using=shards.shard_for(request.user), **dates
+        )
+        return Response({"bucket": bucket, **dates, "series": series})
+
+
+class UserCacheMixin:
+    """ Caches the list and detail responses in the versioned journal cache
+    of the request user, which the journal signals invalidate on any change
+    of the user's entries (see journal.cache).
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        # Responses contain absolute URLs, the host is part of the key
+        key = cache.user_key(
+            self.cache_namespace, request.user.pk, request.build_absolute_uri(),
+            request.accepted_renderer.format,
+        )
+        data = cache.lookup(key)
+        if data is not None:
+            return Response(data)
+        with routers.read_primary():
+            response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.store(key, response.data)
+        return response
+
+
+class EntryViewSet(ConditionalGetMixin, UserCacheMixin, ModelViewSet):
+    """ Entries of the request user, newest first.
+
+    The list runs a constant number of queries regardless of the page size:
+    my_entries() sets the user of every entry without a join and the
+    emotions of the whole page are prefetched. All queries go to the shard
+    of the user (journal.shards).
+
+    Conditional requests are validated by the (id, updated_at) rows of the
+    page and the journal cache version of the user, which also moves with
+    the username shown in the entries. The rows are cached under that
+    version, a request answered from the cache runs no query.
+    """
+    serializer_class = EntrySerializer
+    queryset = Entry.objects.all()
+    pagination_class = EntryCursorPagination
+    cache_namespace = "entries"
+    validator_namespace = "entries-validator"
+    # Renaming the user does not move updated_at of the entries
+    validate_last_modified = False
+    search_limit = 20
+    max_search_limit = 100
+    max_import_errors = 100
+
+    def get_queryset(self):
+        return Entry.objects.my_entries(user=self.request.user).prefetch_related("emotions")
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def validator_key(self, request):
+        return cache.user_key(
+            self.validator_namespace, request.user.pk, request.build_absolute_uri(), self.action,
+        )
+
+    def validator_rows(self, request, **kwargs):
+        key = self.validator_key(request)
+        rows = cache.get_cache().get(key) if cache.enabled() else None
+        if rows is None:
+            with routers.read_primary():
+                rows = super().validator_rows(request, **kwargs)
+            if rows is not None:
+                cache.store(key, rows)
+        return rows
+
+    def rows_loaded(self, request, rows):
+        cache.store(self.validator_key(request), rows)
+
+    def validator_extra(self, request):
+        # The versions in the key, moved by every change of the journal
+        return self.validator_key(request)
+
+    @action(detail=False)
+    def search(self, request):
+        """ Full-text search over the request user's entries, best match
+        first, with a highlighted snippet. GET ?q=<words>&limit=<n>
+        """
+        try:
+            limit = min(int(request.query_params.get("limit", self.search_limit)), self.max_search_limit)
+        except ValueError:
+            limit = self.search_limit
+        entries = search.search_entries(
+            request.user, request.query_params.get("q", ""), limit=max(limit, 1),
+            using=shards.shard_for(request.user),
+        )
+        serializer = EntrySearchSerializer(entries, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def stats(self, request):
+        """ Writing statistics of the request user, a single row lookup."""
+        serializer = UserJournalStatsSerializer(
+            stats.get_stats(request.user, using=shards.shard_for(request.user))
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["post"], parser_classes=[MultiPartParser], url_path="import")
+    def import_entries(self, request):
+        """ Imports entries for the request user from an uploaded JSONL or
+        CSV `file`. The format is guessed from the file name or given as
+        `format`. Invalid rows are skipped and reported.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a JSONL or CSV file."})
+        format = request.data.get("format") or importer.guess_format(upload.name)
+        if format not in importer.FORMATS:
+            raise ValidationError({"format": "Choose from %s." % ", ".join(importer.FORMATS)})
+        create_emotions = request.data.get("create_emotions") in ("1", "true", "True")
+        result = importer.import_entries(
+            request.user, upload, format=format, create_emotions=create_emotions,
+            using=shards.shard_for(request.user),
+        )
+        return Response({
+            "created": result.created,
+            "error_count": len(result.errors),
+            "errors": [
+                {"line": line, "error": error} for line, error in result.errors[: self.max_import_errors]
+            ],
+            "seconds": result.seconds,
+            "rows_per_second": result.rows_per_second,
+        }, status=201 if result.created else 200)
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch_write(self, request):
+        """ Creates, updates and deletes many entries of the request user in
+        one transaction with a fixed number of queries (journal.batch). POST
+        a list of {"action": "create"|"update"|"delete", "id", "occasion",
+        "text", "emotions", "client_id"}. Nothing is written unless all of
+        them are valid.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({"detail": "Expected a list of operations."})
+        max_size = getattr(settings, "ENTRY_BATCH_MAX", 500)
+        if len(request.data) > max_size:
+            raise ValidationError({"detail": "At most %d operations per request." % max_size})
+        serializer = EntryBatchSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+        ids = [item["id"] for item in items if item["action"] != batch.CREATE]
+        using = shards.shard_for(request.user)
+        # Loaded and checked in the transaction of the writes, like
+        # sync.apply_changes(): a concurrent delete cannot slip in between
+        with transaction.atomic(using=using):
+            stored = Entry.objects.my_entries(request.user).using(using).select_for_update().in_bulk(ids)
+            errors, seen = [], set()
+            for item in items:
+                pk = item.get("id") if item["action"] != batch.CREATE else None
+                if pk is not None and pk not in stored:
+                    errors.append({"id": ["Entry %s not found." % pk]})
+                elif pk is not None and pk in seen:
+                    errors.append({"id": ["Entry %s is changed more than once." % pk]})
+                else:
+                    errors.append({})
+                seen.add(pk)
+            if any(errors):
+                raise ValidationError(errors)
+            operations = []
+            for item in items:
+                emotions = [emotion.pk for emotion in item["emotions"]] if "emotions" in item else None
+                fields = {name: item[name] for name in batch.FIELDS if name in item}
+                if item["action"] == batch.CREATE:
+                    operations.append(batch.Operation(batch.CREATE, Entry(**fields), emotions=emotions))
+                else:
+                    operations.append(batch.Operation(item["action"], stored[item["id"]], fields, emotions))
+            batch.write_entries(request.user, operations, using=using)
+        context = self.get_serializer_context()
+        return Response({
+            "results": [
+                {
+                    "client_id": item.get("client_id"),
+                    "action": item["action"],
+                    "id": item.get("id") if op.action == batch.DELETE else op.entry.pk,
+                    "entry": EntrySerializer(op.entry, context=context).data if op.action != batch.DELETE else None,
+                }
+                for item, op in zip(items, operations)
+            ],
+        })
+
+    @action(detail=False)
+    def export(self, request):
+        """ Streams all entries of the request user as a download in
+        constant memory. GET ?fmt=ndjson|csv|markdown
+        """
+        format = request.query_params.get("fmt", "ndjson")
+        if format not in exporter.FORMATS:
+            raise ValidationError({"fmt": "Choose from %s." % ", ".join(exporter.FORMATS)})
+        return exporter.streaming_export_response(
+            Entry.objects.my_entries(user=request.user),
+            format,
+            filename="journal-%s" % request.user.username,
+            title=_("Journal of %s") % request.user,
+        )
+
+
+class SyncView(APIView):
+    """ Delta sync of the request user's journal for offline clients, see
+    journal.sync.
+
+    GET ?cursor=<cursor>&limit=<n>: the entries changed and the ids of the
+    entries deleted since the cursor of the previous sync (all entries
+    without one), and the next cursor. Fetch again while has_more is set.
+    POST {"cursor": <cursor>, "changes": [<change>, ...]}: applies the
+    client changes in one transaction, last write wins, and returns their
+    results with the delta since the cursor.
+
+    url: /api/sync/
+    """
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            limit = min(int(params.get("limit", sync.page_size())), sync.page_size())
+        except ValueError:
+            limit = sync.page_size()
+        return Response(self.delta(request, params.get("cursor"), max(limit, 1)))
+
+    def post(self, request):
+        changes = request.data.get("changes", []) if isinstance(request.data, dict) else None
+        if not isinstance(changes, list):
+            raise ValidationError({"changes": "Expected a list of changes."})
+        max_changes = getattr(settings, "SYNC_MAX_CHANGES", 500)
+        if len(changes) > max_changes:
+            raise ValidationError({"changes": "At most %d changes per request." % max_changes})
+        serializer = SyncChangeSerializer(data=changes, many=True)
+        serializer.is_valid(raise_exception=True)
+        cursor = request.data.get("cursor")
+        self.decode_cursor(cursor)
+        results = sync.apply_changes(
+            request.user,
+            [
+                sync.Change(**{name: value for name, value in change.items() if name != "client_id"})
+                for change in serializer.validated_data
+            ],
+        )
+        context = self.get_serializer_context()
+        return Response({
+            "results": [
+                {
+                    "client_id": change.get("client_id"),
+                    "id": entry.pk if entry is not None else change.get("id"),
+                    "status": status,
+                    # The server version of conflicts, the stored one otherwise
+                    "entry": EntrySerializer(entry, context=context).data if entry is not None else None,
+                }
+                for change, (status, entry) in zip(serializer.validated_data, results)
+            ],
+            **self.delta(request, cursor),
+        })
+
+    def get_serializer_context(self):
+        return {"request": self.request, "format": self.format_kwarg, "view": self}
+
+    def decode_cursor(self, cursor):
+        if cursor is not None and not isinstance(cursor, str):
+            raise ValidationError({"cursor": "Expected a string."})
+        try:
+            return sync.decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError({"cursor": "Invalid cursor."})
+
+    def delta(self, request, cursor, limit=None):
+        delta = sync.changes_since(request.user, self.decode_cursor(cursor), limit=limit)
+        return {
+            "cursor": sync.encode_cursor(delta.cursor),
+            "has_more": delta.has_more,
+            "reset": delta.reset,
+            "entries": EntrySerializer(delta.entries, many=True, context=self.get_serializer_context()).data,
+            "deleted": [{"id": pk, "deleted_at": deleted_at} for pk, deleted_at in delta.deleted],
+        }
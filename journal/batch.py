@@ -0,0 +1,101 @@
+""" Batch writes of a user's entries
+
+write_entries() applies many creates, updates and deletes in one
+transaction with a fixed number of queries, whatever their number: one
+bulk insert, one bulk update and one delete for the entries, one delete
+and one insert for their emotion links. These bypass the per-entry
+signals, entries_bulk_written updates the search index, the statistics
+(incrementally, from the snapshots of the changed entries), the journal
+cache and the sync tombstones instead.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from journal import shards, stats
+from journal.models import Entry
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+ACTIONS = (CREATE, UPDATE, DELETE)
+
+# Fields an update may change
+FIELDS = ("occasion", "text")
+
+
+@dataclass
+class Operation:
+	""" A write of write_entries().
+
+	action: CREATE, UPDATE or DELETE
+	entry: the new, unsaved entry to create, or the stored one to change
+	changes: field -> new value of an update
+	emotions: ids of the emotions of the entry, None keeps the stored ones
+	changed_at: when the author made the change, None for now
+	"""
+	action: str
+	entry: Entry
+	changes: dict = field(default_factory=dict)
+	emotions: list = None
+	changed_at: object = None
+
+
+def write_entries(user, operations, using=None):
+	""" Applies operations on the entries of user in one transaction, each
+	entry at most once. Stored entries must be the user's, as loaded by
+	Entry.objects.my_entries(user) with select_for_update() in a transaction
+	around the call (see sync.apply_changes()). Returns the created and
+	updated entries, with their emotions prefetched.
+	"""
+	from journal.signals import entries_bulk_written
+
+	using = using or shards.shard_for(user)
+	created = [op.entry for op in operations if op.action == CREATE]
+	updated = [op.entry for op in operations if op.action == UPDATE]
+	deleted = [op.entry.pk for op in operations if op.action == DELETE]
+	snapshots = [(None, None)] * len(operations)
+	now = timezone.now()
+	for index, op in enumerate(operations):
+		old = stats.snapshot(op.entry) if op.action != CREATE else None
+		if op.action == CREATE:
+			op.entry.user = user
+			op.entry.changed_at = op.changed_at or now
+			op.entry.apply_defaults()
+		elif op.action == UPDATE:
+			for name, value in op.changes.items():
+				setattr(op.entry, name, value)
+			op.entry.apply_defaults()
+			# bulk_update does not apply auto_now
+			op.entry.updated_at = now
+			op.entry.changed_at = op.changed_at or now
+		snapshots[index] = (old, stats.snapshot(op.entry) if op.action != DELETE else None)
+	Through = Entry.emotions.through
+	with transaction.atomic(using=using):
+		if created:
+			Entry.objects.using(using).bulk_create_with_pks(created)
+		if updated:
+			Entry.objects.using(using).bulk_update(updated, [*FIELDS, "updated_at", "changed_at"])
+		unlinked = [op.entry.pk for op in operations if op.action == UPDATE and op.emotions is not None] + deleted
+		if unlinked:
+			Through.objects.using(using).filter(entry_id__in=unlinked).delete()
+		if deleted:
+			Entry.objects.using(using).filter(pk__in=deleted).delete_rows()
+		Through.objects.using(using).bulk_create([
+			Through(entry_id=op.entry.pk, emotion_id=pk)
+			for op in operations if op.action != DELETE and op.emotions
+			for pk in dict.fromkeys(op.emotions)
+		])
+		entries_bulk_written.send(
+			sender=Entry, user_ids=[user.pk], entries=created + updated, deleted=deleted,
+			snapshots=snapshots, using=using,
+		)
+	written = created + updated
+	for entry in written:
+		# Stale since the links changed
+		getattr(entry, "_prefetched_objects_cache", {}).pop("emotions", None)
+	prefetch_related_objects(written, "emotions")
+	return written
+
@@ -0,0 +1,116 @@
+""" Versioned per-user cache for journal data
+
+Cached values are keyed by a per-user version and a global version. The
+journal signals bump the version of a user whenever one of their entries
+or its emotions change, and the global version when an emotion changes.
+Bumping makes every key of the old version unreachable, nothing is ever
+deleted by pattern and nothing stale is ever read. Unreachable keys
+expire with the cache timeout.
+
+The backend is the cache alias settings.JOURNAL_CACHE ("shared"), any
+Django cache backend the worker processes share works: file based, Redis.
+Invalidation on local memory would only reach one process, nothing is
+cached there (diary.caching). Values to cache are read from "default"
+(diary.routers.read_primary), a lagging replica would store stale data
+under the new version.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from diary import caching, metrics, routers
+
+CACHE_ALIAS = getattr(settings, "JOURNAL_CACHE", "default")
+CACHE_TIMEOUT = getattr(settings, "JOURNAL_CACHE_TIMEOUT", 60 * 60)
+
+GLOBAL_VERSION_KEY = "journal:version"
+USER_VERSION_KEY = "journal:version:%s"
+
+
+def get_cache():
+	return caches[CACHE_ALIAS]
+
+
+def enabled():
+	""" Whether values are cached, see the module documentation."""
+	return caching.is_shared(CACHE_ALIAS)
+
+
+def version(key):
+	""" Returns the current version stamp stored under key."""
+	# Starts at the current time in ms, so a version evicted from the cache
+	# comes back higher than any version cached values were stored under.
+	cache = get_cache()
+	cache.add(key, int(time.time() * 1000), None)
+	return cache.get(key)
+
+
+def _incr(key):
+	try:
+		get_cache().incr(key)
+	except ValueError:
+		version(key)
+
+
+def bump(key, using=None):
+	""" Moves the version stamp stored under key forward."""
+	_incr(key)
+	# Inside a transaction, readers may cache the still committed old data
+	# under the new version until the commit: bump again after it.
+	if connections[using or DEFAULT_DB_ALIAS].in_atomic_block:
+		transaction.on_commit(lambda: _incr(key), using=using)
+
+
+def bump_user(user_id, using=None):
+	""" Invalidates everything cached for the user."""
+	bump(USER_VERSION_KEY % user_id, using)
+
+
+def bump_all(using=None):
+	""" Invalidates everything cached for all users."""
+	bump(GLOBAL_VERSION_KEY, using)
+
+
+def user_key(namespace, user_id, *parts):
+	""" Returns the cache key of parts in namespace for the current
+	versions of the user.
+	"""
+	versions = get_cache().get_many([GLOBAL_VERSION_KEY, USER_VERSION_KEY % user_id])
+	if len(versions) < 2:
+		versions = {
+			GLOBAL_VERSION_KEY: version(GLOBAL_VERSION_KEY),
+			USER_VERSION_KEY % user_id: version(USER_VERSION_KEY % user_id),
+		}
+	digest = hashlib.md5("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+	return "journal:%s:%s:%s:%s:%s" % (
+		namespace, user_id, versions[GLOBAL_VERSION_KEY], versions[USER_VERSION_KEY % user_id], digest,
+	)
+
+
+def lookup(key):
+	""" Returns the value cached under key or None. Counts hits and misses
+	in diary.metrics, unless caching is disabled.
+	"""
+	if not enabled():
+		return None
+	value = get_cache().get(key)
+	metrics.incr("journal.cache.hits" if value is not None else "journal.cache.misses")
+	return value
+
+
+def store(key, value, timeout=CACHE_TIMEOUT):
+	if enabled():
+		get_cache().set(key, value, timeout)
+
+
+def get_or_set(key, compute, timeout=CACHE_TIMEOUT):
+	""" Returns the value cached under key, computing and caching it on a miss."""
+	value = lookup(key)
+	if value is None:
+		with routers.read_primary():
+			value = compute()
+		store(key, value, timeout)
+	return value
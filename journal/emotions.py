@@ -0,0 +1,132 @@
+""" Process-wide registry of the emotions
+
+Emotion is a tiny, nearly static table. The registry loads all of its
+rows once per process and resolves names and ids without a query. Every
+committed change of an emotion bumps a version stamp in the journal cache,
+shared by the worker processes (settings.JOURNAL_CACHE);
+EmotionRegistryMiddleware compares it on each request and the registry
+reloads on the next lookup when it moved. Until the transaction of a
+change ends, the thread that made it sees the emotions of its
+transaction and the other threads the committed ones: a rolled back
+change must not stay visible.
+
+Writes that bypass the Emotion signals (bulk_create) must call
+emotion_registry.changed().
+"""
+import functools
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from journal import cache
+from journal.models import Emotion
+
+VERSION_KEY = "journal:emotions:version"
+
+
+class EmotionRegistry:
+	""" name <-> id map of all emotions, loaded lazily. """
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		# (name -> id, id -> name), replaced as a whole
+		self._maps = None
+		self._version = None
+		# Per thread: the connection of changes in an open transaction, their
+		# on_commit callbacks and the maps as that transaction sees them
+		self._local = threading.local()
+
+	def check(self):
+		""" Drops the loaded emotions if another process changed them."""
+		current = cache.version(VERSION_KEY)
+		if current != self._version:
+			self._maps = None
+			self._version = current
+
+	def changed(self, using=None):
+		""" Marks the emotions as changed, here and in every other process
+		once the transaction commits.
+		"""
+		connection = connections[using or DEFAULT_DB_ALIAS]
+		if not connection.in_atomic_block:
+			self._committed()
+			return
+		local = self._local
+		callback = functools.partial(self._committed)
+		if getattr(local, "connection", None) is not connection:
+			local.connection, local.callbacks = connection, []
+		local.callbacks.append(callback)
+		local.maps = None
+		transaction.on_commit(callback, using=using)
+
+	def _committed(self):
+		self._local.connection = self._local.maps = None
+		self._maps = None
+		cache.bump(VERSION_KEY)
+		self._version = cache.version(VERSION_KEY)
+
+	def _query(self):
+		# Not from a lagging replica, the maps stay until the next change
+		rows = list(Emotion.objects.using(DEFAULT_DB_ALIAS).values_list("name", "id"))
+		return dict(rows), {pk: name for name, pk in rows}
+
+	def _pending(self):
+		""" Whether this thread changed emotions in a transaction still open.
+		A rollback drops the on_commit callbacks of the changes it undid.
+		"""
+		local = self._local
+		connection = getattr(local, "connection", None)
+		if connection is None:
+			return False
+		registered = {id(func) for _, func in connection.run_on_commit}
+		callbacks = [callback for callback in local.callbacks if id(callback) in registered]
+		if len(callbacks) < len(local.callbacks):
+			local.maps = None
+		local.callbacks = callbacks
+		if not callbacks:
+			local.connection = None
+		return bool(callbacks)
+
+	def _load(self):
+		if self._pending():
+			# Uncommitted changes, for this thread only
+			if self._local.maps is None:
+				self._local.maps = self._query()
+			return self._local.maps
+		maps = self._maps
+		if maps is None:
+			with self._lock:
+				if self._maps is None:
+					self._maps = self._query()
+				maps = self._maps
+		return maps
+
+	def ids_by_name(self):
+		""" Returns a copy of the name -> id map."""
+		return dict(self._load()[0])
+
+	def id_for(self, name):
+		""" Returns the id of the emotion name, None if there is none."""
+		return self._load()[0].get(name)
+
+	def name_for(self, pk):
+		return self._load()[1].get(pk)
+
+	def names(self):
+		""" Returns all names in Emotion ordering."""
+		return sorted(self._load()[0])
+
+	def get(self, name, using="default"):
+		""" Returns an Emotion for name without a query.
+		Raises Emotion.DoesNotExist for unknown names.
+		"""
+		pk = self.id_for(name)
+		if pk is None:
+			raise Emotion.DoesNotExist("Emotion %r does not exist." % name)
+		emotion = Emotion(id=pk, name=name)
+		emotion._state.adding = False
+		emotion._state.db = using
+		return emotion
+
+
+emotion_registry = EmotionRegistry()
@@ -0,0 +1,114 @@
+""" Constant memory export of journal entries (NDJSON, CSV, Markdown)
+
+Entries are read with QuerySet.iterator() in chunks, the emotions of a
+chunk are resolved with one query, and every chunk is rendered and yielded
+before the next one is read. Memory does not grow with the number of
+entries, so the generators can back a StreamingHttpResponse.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.http import StreamingHttpResponse
+
+from journal.models import Entry
+
+CHUNK_SIZE = 500
+
+FIELDS = ["id", "occasion", "text", "emotions", "created_at", "updated_at"]
+
+
+def iter_chunks(queryset, chunk_size=CHUNK_SIZE):
+	""" Yields lists of entry dicts (FIELDS) of at most chunk_size entries."""
+	rows = queryset.values_list(
+		"id", "occasion", "text", "created_at", "updated_at"
+	).iterator(chunk_size=chunk_size)
+	chunk = []
+	for row in rows:
+		chunk.append(row)
+		if len(chunk) >= chunk_size:
+			yield _with_emotions(chunk, queryset.db)
+			chunk = []
+	if chunk:
+		yield _with_emotions(chunk, queryset.db)
+
+
+def _with_emotions(rows, using):
+	emotions = defaultdict(list)
+	links = (
+		Entry.emotions.through.objects.using(using)
+		.filter(entry_id__in=[row[0] for row in rows])
+		.order_by("emotion__name")
+		.values_list("entry_id", "emotion__name")
+	)
+	for entry_id, name in links:
+		emotions[entry_id].append(name)
+	return [
+		{
+			"id": pk,
+			"occasion": occasion,
+			"text": text,
+			"emotions": emotions[pk],
+			"created_at": created_at,
+			"updated_at": updated_at,
+		}
+		for pk, occasion, text, created_at, updated_at in rows
+	]
+
+
+def render_ndjson(chunks, title=None):
+	for chunk in chunks:
+		yield "".join(
+			json.dumps(entry, default=str, ensure_ascii=False) + "\n" for entry in chunk
+		)
+
+
+def render_csv(chunks, title=None):
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	writer.writerow(FIELDS)
+	for chunk in chunks:
+		for entry in chunk:
+			writer.writerow([
+				", ".join(entry[name]) if name == "emotions" else entry[name] for name in FIELDS
+			])
+		yield buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate()
+	yield buffer.getvalue()
+
+
+def render_markdown(chunks, title=None):
+	yield "# %s\n" % (title or "Journal")
+	for chunk in chunks:
+		parts = []
+		for entry in chunk:
+			parts.append("\n## %s\n\n%s\n" % (entry["occasion"], entry["text"].strip()))
+			if entry["emotions"]:
+				parts.append("\n*%s*\n" % ", ".join(entry["emotions"]))
+		yield "".join(parts)
+
+
+FORMATS = {
+	# format: (renderer, content type, file extension)
+	"ndjson": (render_ndjson, "application/x-ndjson", "ndjson"),
+	"csv": (render_csv, "text/csv", "csv"),
+	"markdown": (render_markdown, "text/markdown", "md"),
+}
+
+
+def export_entries(queryset, format="ndjson", title=None, chunk_size=CHUNK_SIZE):
+	""" Returns a generator of the rendered export of the entries."""
+	if format not in FORMATS:
+		raise ValueError("Unknown format %r, choose from %s" % (format, ", ".join(FORMATS)))
+	return FORMATS[format][0](iter_chunks(queryset, chunk_size), title=title)
+
+
+def streaming_export_response(queryset, format="ndjson", filename="journal", title=None):
+	""" StreamingHttpResponse downloading the export of the entries."""
+	content = export_entries(queryset, format, title=title)
+	_, content_type, extension = FORMATS[format]
+	response = StreamingHttpResponse(content, content_type="%s; charset=utf-8" % content_type)
+	response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (filename, extension)
+	return response
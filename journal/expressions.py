@@ -0,0 +1,24 @@
+from django.db.models import Aggregate, CharField, Value
+
+
+class GroupConcat(Aggregate):
+	""" Concatenates the values of a group into a single string.
+
+	GROUP_CONCAT on SQLite, STRING_AGG on PostgreSQL. Other vendors are
+	not supported, check `GroupConcat.supports(connection)` first.
+	"""
+	function = "GROUP_CONCAT"
+	output_field = CharField()
+	vendors = ("sqlite", "postgresql")
+
+	def __init__(self, expression, separator=",", **extra):
+		super(GroupConcat, self).__init__(expression, Value(separator), **extra)
+
+	@classmethod
+	def supports(cls, connection):
+		return connection.vendor in cls.vendors
+
+	def as_postgresql(self, compiler, connection, **extra_context):
+		return super(GroupConcat, self).as_sql(
+			compiler, connection, function="STRING_AGG", **extra_context
+		)
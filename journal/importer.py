@@ -0,0 +1,212 @@
+""" Bulk import of journal entries from JSONL or CSV
+
+Rows are parsed as a stream and inserted in chunks, each chunk in its own
+transaction with one bulk_create for the entries and one for the rows of
+the Entry.emotions through table. Emotion names are resolved once.
+Invalid rows are reported with their line number and skipped, they do not
+abort the import.
+
+Row fields: text (required), occasion (YYYY-MM-DD, defaults to today like
+Entry.save) and emotions (a list, or comma separated names in CSV).
+"""
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from journal import shards
+from journal.emotions import emotion_registry
+from journal.models import Emotion, Entry
+from journal.signals import entries_bulk_written
+
+FORMATS = ("jsonl", "csv")
+BATCH_SIZE = 1000
+INVALID_UTF8 = "Invalid UTF-8"
+
+
+@dataclass
+class ImportResult:
+	created: int = 0
+	errors: list = field(default_factory=list)
+	seconds: float = 0.0
+
+	@property
+	def rows_per_second(self):
+		return self.created / self.seconds if self.seconds else 0.0
+
+
+def guess_format(filename):
+	""" Returns the format from a file name extension, jsonl by default."""
+	return "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+
+def decoded_lines(stream, invalid):
+	""" Yields the lines of stream, decoding binary streams (e.g. uploaded
+	files) as UTF-8. Lines that are not valid UTF-8 are decoded with
+	replacement characters and their numbers added to the invalid set.
+	"""
+	if isinstance(stream, io.TextIOBase):
+		yield from stream
+		return
+	for number, line in enumerate(stream, start=1):
+		encoding = "utf-8-sig" if number == 1 else "utf-8"
+		try:
+			yield line.decode(encoding)
+		except UnicodeDecodeError:
+			invalid.add(number)
+			yield line.decode(encoding, errors="replace")
+
+
+def parse_jsonl(stream):
+	""" Yields (line number, row dict or error message) per non-empty line."""
+	invalid = set()
+	for number, line in enumerate(decoded_lines(stream, invalid), start=1):
+		if number in invalid:
+			yield number, INVALID_UTF8
+			continue
+		if not line.strip():
+			continue
+		try:
+			row = json.loads(line)
+		except ValueError as error:
+			yield number, "Invalid JSON: %s" % error
+			continue
+		yield number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def parse_csv(stream):
+	""" Yields (line number, row dict or error message) per data row, after
+	the header.
+	"""
+	invalid = set()
+	reader = csv.DictReader(decoded_lines(stream, invalid))
+	last = 0
+	try:
+		for row in reader:
+			# A quoted value can span lines
+			lines = range(last + 1, reader.line_num + 1)
+			last = reader.line_num
+			yield reader.line_num, INVALID_UTF8 if invalid.intersection(lines) else row
+	except csv.Error as error:
+		yield reader.line_num, "Invalid CSV, the rest of the file is skipped: %s" % error
+
+
+PARSERS = {"jsonl": parse_jsonl, "csv": parse_csv}
+
+
+def _emotion_names(value):
+	if not value:
+		return []
+	if isinstance(value, str):
+		value = value.split(",")
+	if not isinstance(value, list):
+		raise ValidationError("emotions must be a list of names")
+	return [str(name).strip() for name in value if str(name).strip()]
+
+
+class EntryImporter:
+	""" Imports rows as entries of one user.
+
+	create_emotions: create unknown emotion names instead of rejecting
+	the row
+	"""
+
+	def __init__(self, user, batch_size=BATCH_SIZE, create_emotions=False, using="default"):
+		self.user = user
+		self.batch_size = batch_size
+		self.create_emotions = create_emotions
+		self.using = using
+		self.emotions = None
+
+	def run(self, rows):
+		""" Imports (line number, row) pairs, as yielded by the parsers."""
+		result = ImportResult()
+		start = time.perf_counter()
+		# name -> id of every emotion, for the whole import
+		emotion_registry.check()
+		self.emotions = emotion_registry.ids_by_name()
+		batch = []
+		for number, row in rows:
+			try:
+				batch.append(self._build(row))
+			except ValidationError as error:
+				result.errors.append((number, "; ".join(error.messages)))
+				continue
+			except (TypeError, ValueError) as error:
+				result.errors.append((number, str(error)))
+				continue
+			if len(batch) >= self.batch_size:
+				result.created += self._write(batch)
+				batch = []
+		if batch:
+			result.created += self._write(batch)
+		if result.created:
+			entries_bulk_written.send(
+				sender=Entry, user_ids=[self.user.pk], entries=(), deleted=(), using=self.using
+			)
+		result.seconds = time.perf_counter() - start
+		return result
+
+	def _build(self, row):
+		""" Returns a validated (unsaved entry, emotion names) pair."""
+		if isinstance(row, str):
+			raise ValidationError(row)
+		for name in ("occasion", "text"):
+			if row.get(name) and not isinstance(row[name], str):
+				raise ValidationError("%s must be a string" % name)
+		entry = Entry(user=self.user, occasion=row.get("occasion") or None, text=row.get("text") or "")
+		entry.apply_defaults()
+		# The user is known to exist, validating it would query per row
+		entry.full_clean(exclude=["user"], validate_unique=False)
+		names = _emotion_names(row.get("emotions"))
+		unknown = [name for name in names if name not in self.emotions]
+		if unknown and not self.create_emotions:
+			raise ValidationError("Unknown emotions: %s" % ", ".join(unknown))
+		return entry, names
+
+	def _write(self, batch):
+		""" Inserts a batch of entries and their emotion links."""
+		entries = [entry for entry, _ in batch]
+		with transaction.atomic(using=self.using):
+			self._create_missing_emotions(batch)
+			Entry.objects.using(self.using).bulk_create_with_pks(entries, batch_size=self.batch_size)
+			Through = Entry.emotions.through
+			Through.objects.using(self.using).bulk_create(
+				[
+					Through(entry_id=entry.pk, emotion_id=self.emotions[name])
+					for entry, names in batch for name in dict.fromkeys(names)
+				],
+				batch_size=self.batch_size,
+			)
+			entries_bulk_written.send(
+				sender=Entry, user_ids=[], entries=entries, deleted=(), using=self.using
+			)
+		return len(entries)
+
+	def _create_missing_emotions(self, batch):
+		missing = {name for _, names in batch for name in names if name not in self.emotions}
+		if not missing:
+			return
+		# With sharding, emotions are created on "default" and copied to the shards
+		using = DEFAULT_DB_ALIAS if shards.enabled() else self.using
+		Emotion.objects.using(using).bulk_create(
+			[Emotion(name=name) for name in missing], ignore_conflicts=True
+		)
+		emotion_registry.changed(using=using)
+		shards.sync_emotions()
+		self.emotions.update(
+			Emotion.objects.using(using).filter(name__in=missing).values_list("name", "id")
+		)
+
+
+def import_entries(user, stream, format="jsonl", **options):
+	""" Imports the entries of a JSONL or CSV stream for user.
+	Returns an ImportResult.
+	"""
+	if format not in PARSERS:
+		raise ValueError("Unknown format %r, choose from %s" % (format, ", ".join(FORMATS)))
+	return EntryImporter(user, **options).run(PARSERS[format](stream))
@@ -0,0 +1,108 @@
+import asyncio
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import AsyncClient, override_settings
+
+from journal.models import Emotion, Entry
+from journal.signals import entries_bulk_written
+from users.provisioning import provision_users
+from users.signals import NORMAL_USER_GROUP
+
+ENDPOINTS = {
+	"sync": "/api/entries/",
+	"async": "/api/async/entries/",
+}
+
+
+def _percentile(values, percent):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+	help = (
+		"Seeds a fresh SQLite database and runs concurrent clients against the "
+		"ASGI application, comparing the entry list of the REST framework view "
+		"(/api/entries/) with the async view (/api/async/entries/). Reports the "
+		"requests per second and the p50 and p99 latencies of each."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+		parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight.")
+		parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint.")
+		parser.add_argument("--users", type=int, default=50)
+		parser.add_argument("--entries", type=int, default=100, help="Entries per user.")
+
+	def handle(self, *args, **options):
+		with tempfile.TemporaryDirectory() as directory:
+			connection = connections[DEFAULT_DB_ALIAS]
+			connection.close()
+			connection.settings_dict["NAME"] = Path(directory) / "benchmark.sqlite3"
+			try:
+				keys = self.seed(options)
+				# Nor the replicas or the shards of the settings, they are not seeded
+				with override_settings(DATABASE_REPLICAS=[], ENTRY_SHARDS=[], DEBUG=False, ALLOWED_HOSTS=["testserver"]):
+					for endpoint in options["endpoints"]:
+						self.run_endpoint(endpoint, keys, options)
+			finally:
+				connections.close_all()
+
+	def seed(self, options):
+		call_command("migrate", verbosity=0)
+		Group.objects.get_or_create(name=NORMAL_USER_GROUP)
+		provision_users({"username": "benchmark%d" % number} for number in range(options["users"]))
+		emotions = [Emotion.objects.create(name=name) for name in ("joy", "calm", "anger")]
+		Through = Entry.emotions.through
+		rng = random.Random(0)
+		users = list(Group.objects.get(name=NORMAL_USER_GROUP).user_set.select_related("auth_token"))
+		for user in users:
+			Entry.objects.bulk_create([
+				Entry(user=user, occasion=date(2020, 1, 1) + timedelta(days=day), text="Entry %d" % day)
+				for day in range(options["entries"])
+			])
+			entries = list(Entry.objects.filter(user=user))
+			Through.objects.bulk_create(
+				[Through(entry=entry, emotion=rng.choice(emotions)) for entry in entries]
+			)
+			entries_bulk_written.send(sender=Entry, user_ids=[user.pk], entries=entries, deleted=(), using=DEFAULT_DB_ALIAS)
+		return [user.auth_token.key for user in users]
+
+	def run_endpoint(self, endpoint, keys, options):
+		latencies = []
+		statuses = {}
+		queue = asyncio.Queue()
+
+		async def client():
+			http = AsyncClient()
+			while not queue.empty():
+				key = queue.get_nowait()
+				start = time.perf_counter()
+				response = await http.get(ENDPOINTS[endpoint], authorization="Token %s" % key)
+				latencies.append(time.perf_counter() - start)
+				statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+		async def run():
+			rng = random.Random(1)
+			for _ in range(options["requests"]):
+				queue.put_nowait(rng.choice(keys))
+			start = time.perf_counter()
+			await asyncio.gather(*[client() for _ in range(options["concurrency"])])
+			return time.perf_counter() - start
+
+		elapsed = asyncio.run(run())
+		self.stdout.write(
+			"%-6s %d clients: %6.0f requests/s, p50 %6.1fms, p99 %6.1fms, statuses %s" % (
+				endpoint, options["concurrency"], len(latencies) / elapsed,
+				_percentile(latencies, 50) * 1000, _percentile(latencies, 99) * 1000,
+				", ".join("%d: %d" % item for item in sorted(statuses.items())),
+			)
+		)
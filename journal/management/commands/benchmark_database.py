@@ -0,0 +1,100 @@
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+
+from journal.models import Entry
+
+User = get_user_model()
+
+PROFILES = {
+	"default": {"ENGINE": "django.db.backends.sqlite3"},
+	"production": settings.SQLITE_PRODUCTION,
+}
+
+
+def _worker(alias, user_ids, operations, read_ratio, seed, queue):
+	rng = random.Random(seed)
+	reads = writes = errors = 0
+	start = time.perf_counter()
+	for number in range(operations):
+		user_id = rng.choice(user_ids)
+		try:
+			if rng.random() < read_ratio:
+				list(Entry.objects.using(alias).filter(user_id=user_id).select_related("user")[:20])
+				reads += 1
+			else:
+				with transaction.atomic(using=alias):
+					Entry.objects.using(alias).create(
+						user_id=user_id,
+						occasion=date(2020, 1, 1) + timedelta(days=rng.randrange(1000)),
+						text="Entry %d of worker %d" % (number, seed),
+					)
+				writes += 1
+		except OperationalError:
+			errors += 1
+		# What request_finished does: close connections older than CONN_MAX_AGE
+		close_old_connections()
+	queue.put((reads, writes, errors, time.perf_counter() - start))
+
+
+class Command(BaseCommand):
+	help = (
+		"Runs concurrent worker processes reading and writing entries against a "
+		"fresh SQLite database per profile (default, production) and reports the "
+		"throughput and the \"database is locked\" errors of each."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+		parser.add_argument("--processes", type=int, default=4)
+		parser.add_argument("--operations", type=int, default=500, help="Operations per process.")
+		parser.add_argument("--read-ratio", type=float, default=0.8)
+		parser.add_argument("--users", type=int, default=20)
+
+	def handle(self, *args, **options):
+		with tempfile.TemporaryDirectory() as directory:
+			for profile in options["profiles"]:
+				self.run_profile(profile, Path(directory) / ("%s.sqlite3" % profile), options)
+
+	def run_profile(self, profile, path, options):
+		alias = "benchmark_%s" % profile
+		connections.databases[alias] = {**PROFILES[profile], "NAME": path}
+		call_command("migrate", database=alias, verbosity=0)
+		User.objects.using(alias).bulk_create(
+			[User(username="benchmark%d" % number) for number in range(options["users"])]
+		)
+		user_ids = list(User.objects.using(alias).values_list("pk", flat=True))
+		# Forked workers must open connections of their own
+		connections.close_all()
+
+		context = multiprocessing.get_context("fork")
+		queue = context.Queue()
+		workers = [
+			context.Process(
+				target=_worker, args=(alias, user_ids, options["operations"], options["read_ratio"], seed, queue)
+			)
+			for seed in range(options["processes"])
+		]
+		start = time.perf_counter()
+		for worker in workers:
+			worker.start()
+		results = [queue.get() for _ in workers]
+		for worker in workers:
+			worker.join()
+		elapsed = time.perf_counter() - start
+
+		reads, writes, errors = (sum(result[column] for result in results) for column in range(3))
+		self.stdout.write(
+			"%-10s %d processes: %6.0f ops/s (%d reads, %d writes, %d errors) in %.2fs" % (
+				profile, len(workers), (reads + writes) / elapsed, reads, writes, errors, elapsed,
+			)
+		)
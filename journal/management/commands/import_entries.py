@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import importer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = "Imports journal entries of a user from a JSONL or CSV file."
+
+	def add_arguments(self, parser):
+		parser.add_argument("username")
+		parser.add_argument("path")
+		parser.add_argument("--format", choices=importer.FORMATS, help="Guessed from the file name if omitted.")
+		parser.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+		parser.add_argument("--create-emotions", action="store_true", help="Create unknown emotions.")
+		parser.add_argument("--database", default="default")
+
+	def handle(self, *args, **options):
+		try:
+			user = User.objects.using(options["database"]).get(username=options["username"])
+		except User.DoesNotExist:
+			raise CommandError("User %s does not exist" % options["username"])
+		with open(options["path"], "rb") as stream:
+			result = importer.import_entries(
+				user,
+				stream,
+				format=options["format"] or importer.guess_format(options["path"]),
+				batch_size=options["batch_size"],
+				create_emotions=options["create_emotions"],
+				using=options["database"],
+			)
+		for line, error in result.errors:
+			self.stderr.write("Line %d: %s" % (line, error))
+		self.stdout.write(self.style.SUCCESS(
+			"Imported %d entries in %.2fs (%.0f rows/s), %d rows skipped." % (
+				result.created, result.seconds, result.rows_per_second, len(result.errors),
+			)
+		))
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import shards
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = (
+		"Prepares the migrated shards of settings.ENTRY_SHARDS: sets their entry id "
+		"ranges and copies the emotions. With --pin, stores the current shard of "
+		"every user, to run before changing ENTRY_SHARDS."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--pin", action="store_true", help="Store the shard of users placed by id.")
+
+	def handle(self, *args, **options):
+		if not shards.enabled():
+			raise CommandError("Sharding is disabled, see settings.ENTRY_SHARDS.")
+		for alias in shards.aliases():
+			shards.init_id_range(alias)
+			self.stdout.write("Entry ids of %s start at %d" % (alias, shards.aliases().index(alias) << shards.ID_BITS))
+		shards.sync_emotions()
+		if options["pin"]:
+			pinned = 0
+			for user in User.objects.filter(shard="").only("pk", "shard").iterator():
+				user.shard = shards.shard_for(user)
+				user.save(update_fields=["shard"])
+				pinned += 1
+			self.stdout.write("Pinned %d users" % pinned)
+		self.stdout.write(self.style.SUCCESS("Shards ready."))
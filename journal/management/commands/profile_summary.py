@@ -0,0 +1,33 @@
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diary import profiling
+
+SORT_KEYS = ("tottime", "cumulative", "calls")
+
+
+class Command(BaseCommand):
+	help = (
+		"Sums up the request profiles collected by diary.profiling and lists the "
+		"functions taking the most time over all of them."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--limit", type=int, default=30, help="Number of functions to list.")
+		parser.add_argument("--sort", choices=SORT_KEYS, default="tottime")
+		parser.add_argument("--url-name", help="Only the profiles of this URL name, e.g. api:entry-list.")
+		parser.add_argument("--latest", type=int, help="Only the newest LATEST profiles.")
+
+	def handle(self, *args, **options):
+		paths = profiling.profiles()
+		if options["url_name"]:
+			name = profiling.file_name_part(options["url_name"])
+			paths = [path for path in paths if profiling.file_url_name(path) == name]
+		if options["latest"]:
+			paths = paths[:options["latest"]]
+		if not paths:
+			raise CommandError("No profiles in %s." % profiling.directory())
+		stats = pstats.Stats(*map(str, paths), stream=self.stdout)
+		self.stdout.write("%d profiles, %s to %s" % (len(paths), paths[-1].name, paths[0].name))
+		stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
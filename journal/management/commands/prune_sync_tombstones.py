@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from journal import shards, sync
+
+
+class Command(BaseCommand):
+	help = (
+		"Deletes the tombstones of deleted entries older than SYNC_TOMBSTONE_DAYS "
+		"on every shard. Clients with an older sync cursor get a full snapshot."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--days", type=int, help="Keep this many days instead of SYNC_TOMBSTONE_DAYS.")
+
+	def handle(self, *args, **options):
+		older_than = timedelta(days=options["days"]) if options["days"] is not None else None
+		for alias in shards.aliases():
+			deleted = sync.prune_tombstones(older_than, using=alias)
+			self.stdout.write("%s: deleted %d tombstones" % (alias, deleted))
+		self.stdout.write(self.style.SUCCESS("Tombstones pruned."))
@@ -0,0 +1,80 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from journal import shards
+from journal.models import Entry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = (
+		"Moves users with their entries between the shards of settings.ENTRY_SHARDS: "
+		"one user with USERNAME SHARD, otherwise users of the fullest shards to the "
+		"emptiest ones until the entry counts are within --tolerance. Moved entries "
+		"get new ids; a write of a user during the move rolls the move back."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("username", nargs="?")
+		parser.add_argument("shard", nargs="?")
+		parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed deviation from the mean.")
+		parser.add_argument("--batch-size", type=int, default=1000)
+		parser.add_argument("--dry-run", action="store_true")
+
+	def handle(self, *args, **options):
+		if not shards.enabled():
+			raise CommandError("Sharding is disabled, see settings.ENTRY_SHARDS.")
+		if options["username"]:
+			if not options["shard"]:
+				raise CommandError("Give the shard to move %s to." % options["username"])
+			try:
+				user = User.objects.get(username=options["username"])
+			except User.DoesNotExist:
+				raise CommandError("User %s does not exist" % options["username"])
+			moves = [(user, options["shard"])]
+		else:
+			moves = self.plan(options["tolerance"])
+		for user, target in moves:
+			self.stdout.write("Moving %s from %s to %s" % (user, shards.shard_for(user), target))
+			if not options["dry_run"]:
+				try:
+					count = shards.move_user(user, target, batch_size=options["batch_size"])
+				except shards.MoveInterrupted as error:
+					raise CommandError("%s Run it again." % error)
+				self.stdout.write("  %d entries moved" % count)
+		self.stdout.write(self.style.SUCCESS(
+			("%d users to move." if options["dry_run"] else "%d users moved.") % len(moves)
+		))
+
+	def plan(self, tolerance):
+		""" Greedy plan: moves the largest user of the fullest shard that
+		fits into the emptiest shard, while that narrows the gap.
+		"""
+		users = {user.pk: user for user in User.objects.only("pk", "username", "shard")}
+		sizes = {}
+		for alias in shards.aliases():
+			rows = Entry.objects.using(alias).values_list("user_id").annotate(count=Count("pk")).order_by()
+			sizes[alias] = Counter({user_id: count for user_id, count in rows if user_id in users})
+		totals = {alias: sum(counts.values()) for alias, counts in sizes.items()}
+		mean = sum(totals.values()) / len(totals)
+		moves = []
+		while True:
+			fullest = max(totals, key=totals.get)
+			emptiest = min(totals, key=totals.get)
+			if totals[fullest] <= mean * (1 + tolerance):
+				break
+			gap = totals[fullest] - totals[emptiest]
+			candidates = [(count, user_id) for user_id, count in sizes[fullest].items() if count < gap]
+			if not candidates:
+				break
+			count, user_id = max(candidates)
+			del sizes[fullest][user_id]
+			sizes[emptiest][user_id] = count
+			totals[fullest] -= count
+			totals[emptiest] += count
+			moves.append((users[user_id], emptiest))
+		return moves
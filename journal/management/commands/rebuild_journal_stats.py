@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from journal import stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = (
+		"Recomputes the writing statistics of all users (or the given ones) "
+		"from their entries, e.g. after bulk writes that bypassed the signals."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("usernames", nargs="*", help="Only rebuild these users.")
+		parser.add_argument("--batch-size", type=int, default=500, help="Users per batch.")
+		parser.add_argument("--database", default="default")
+
+	def handle(self, *args, **options):
+		users = User.objects.using(options["database"]).order_by("pk")
+		if options["usernames"]:
+			users = users.filter(username__in=options["usernames"])
+		user_ids = list(users.values_list("pk", flat=True))
+		batch_size = options["batch_size"]
+		for start in range(0, len(user_ids), batch_size):
+			batch = user_ids[start:start + batch_size]
+			stats.rebuild_stats(batch, using=options["database"])
+			self.stdout.write("Rebuilt %d/%d users" % (start + len(batch), len(user_ids)))
+		self.stdout.write(self.style.SUCCESS("Statistics rebuilt."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from journal import search
+
+
+class Command(BaseCommand):
+	help = "Rebuilds the full-text search index of all journal entries."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--database", default="default")
+
+	def handle(self, *args, **options):
+		if not search.is_available(options["database"]):
+			self.stderr.write("Full-text search is not available on this database.")
+			return
+		search.rebuild_index(using=options["database"])
+		self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import seeding
+
+
+class Command(BaseCommand):
+	help = (
+		"Creates USERS users with ENTRIES synthetic entries each, with bulk inserts "
+		"and without the per-row signals. The same --seed creates the same data; "
+		"usernames that exist already are skipped with their entries."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--users", type=int, default=100)
+		parser.add_argument("--entries", type=int, default=100, help="Entries per user.")
+		parser.add_argument("--seed", type=int, default=0)
+		parser.add_argument("--batch-size", type=int, default=seeding.BATCH_SIZE, help="Rows per insert transaction.")
+		parser.add_argument("--database", default="default")
+
+	def handle(self, *args, **options):
+		if options["users"] < 0 or options["entries"] < 0 or options["batch_size"] < 1:
+			raise CommandError("--users and --entries must not be negative, --batch-size must be positive.")
+		total = options["users"] * options["entries"]
+		step = max(total // 10, options["batch_size"])
+		reported = [0]
+
+		def progress(entries):
+			if entries > reported[0] and (entries - reported[0] >= step or entries == total):
+				reported[0] = entries
+				self.stdout.write("%d/%d entries" % (entries, total))
+
+		result = seeding.seed_journal(
+			options["users"], options["entries"], seed=options["seed"],
+			batch_size=options["batch_size"], using=options["database"], progress=progress,
+		)
+		self.stdout.write(self.style.SUCCESS(
+			"Created %d users (%d skipped), %d entries and %d emotion links in %.1fs (%.0f entries/s)." % (
+				result.users, result.skipped_users, result.entries, result.emotion_links,
+				result.seconds, result.entries_per_second,
+			)
+		))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+	help = (
+		'Copies the SQLite database "default" into the SQLite read replicas '
+		"(settings.DATABASE_REPLICAS), the local stand-in for replication."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("--interval", type=float, help="Keep copying every INTERVAL seconds.")
+
+	def handle(self, *args, **options):
+		replicas = getattr(settings, "DATABASE_REPLICAS", ())
+		if not replicas:
+			raise CommandError("No replicas configured, see settings.DATABASE_REPLICAS.")
+		for alias in (DEFAULT_DB_ALIAS, *replicas):
+			if connections[alias].vendor != "sqlite":
+				raise CommandError("%s is not an SQLite database." % alias)
+		while True:
+			self.sync(replicas)
+			if not options["interval"]:
+				break
+			time.sleep(options["interval"])
+
+	def sync(self, replicas):
+		source = connections[DEFAULT_DB_ALIAS]
+		source.ensure_connection()
+		for alias in replicas:
+			start = time.perf_counter()
+			target = connections[alias]
+			target.ensure_connection()
+			# Online backup: consistent snapshot while "default" stays writable
+			source.connection.backup(target.connection)
+			self.stdout.write("Synced %s in %.2fs" % (alias, time.perf_counter() - start))
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from journal.emotions import emotion_registry
+
+
+class EmotionRegistryMiddleware:
+	""" Checks the version stamp of the emotion registry on each request,
+	so the emotions changed by another process are reloaded.
+	"""
+
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		emotion_registry.check()
+		return self.get_response(request)
+
+	async def __acall__(self, request):
+		emotion_registry.check()
+		return await self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0004_alter_entry_user'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='entry',
+            options={'ordering': ('-occasion', 'id'), 'verbose_name': 'Entry', 'verbose_name_plural': 'Entries'},
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['user', '-occasion', 'id'], name='journal_entry_user_occ_idx'),
+        ),
+    ]
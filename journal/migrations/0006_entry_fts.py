@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from journal.search import FTS_TABLE
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE %s USING fts5("
+        "text, owner, tokenize = 'unicode61 remove_diacritics 2')" % FTS_TABLE
+    )
+    schema_editor.execute(
+        "INSERT INTO %s (rowid, text, owner) "
+        "SELECT id, text, 'u' || user_id FROM journal_entry" % FTS_TABLE
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0005_entry_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0006_entry_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserJournalStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('entry_count', models.PositiveIntegerField(default=0, verbose_name='Entries')),
+                ('char_count', models.PositiveIntegerField(default=0, verbose_name='Characters')),
+                ('word_count', models.PositiveIntegerField(default=0, verbose_name='Words')),
+                ('char_counts', models.JSONField(blank=True, default=dict, verbose_name='Characters by count')),
+                ('first_occasion', models.DateField(blank=True, null=True, verbose_name='First occasion')),
+                ('last_occasion', models.DateField(blank=True, null=True, verbose_name='Last occasion')),
+                ('streak', models.PositiveIntegerField(default=0, verbose_name='Streak')),
+                ('user', models.OneToOneField(help_text='Author of the entries', on_delete=django.db.models.deletion.CASCADE, related_name='journal_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Journal Statistics',
+                'verbose_name_plural': 'Journal Statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """ Covering index (emotion_id, entry_id) on the auto-created
+    Entry.emotions through table, for emotion trends limited to some
+    emotions and the emotions list_filter of the admin. The opposite
+    direction is covered by the (entry_id, emotion_id) unique constraint.
+    """
+
+    dependencies = [
+        ('journal', '0007_userjournalstats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX "journal_entry_emotions_emotion_entry_idx" '
+            'ON "journal_entry_emotions" ("emotion_id", "entry_id")',
+            'DROP INDEX "journal_entry_emotions_emotion_entry_idx"',
+        ),
+    ]
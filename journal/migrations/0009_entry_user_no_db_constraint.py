@@ -0,0 +1,26 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0008_entry_emotions_emotion_entry_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='entry',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Author of the entry', on_delete=django.db.models.deletion.CASCADE, related_name='entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='userjournalstats',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, help_text='Author of the entries', on_delete=django.db.models.deletion.CASCADE, related_name='journal_stats', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0009_entry_user_no_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_id', models.BigIntegerField(verbose_name='Entry')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Deleted at')),
+            ],
+            options={
+                'verbose_name': 'Entry Tombstone',
+                'verbose_name_plural': 'Entry Tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['user', 'updated_at'], name='journal_entry_user_upd_idx'),
+        ),
+        migrations.AddField(
+            model_name='entrytombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, help_text='Author of the deleted entry', on_delete=django.db.models.deletion.DO_NOTHING, related_name='entry_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='entrytombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='journal_tomb_user_del_idx'),
+        ),
+    ]
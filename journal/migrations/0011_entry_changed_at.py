@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0010_entry_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='changed_at',
+            field=models.DateTimeField(blank=True, help_text='When the author last changed the entry', null=True, verbose_name='Changed at'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 import uuid
 from datetime import date
-from django.db import models
+from django.db import connections, models
+from django.db.transaction import TransactionManagementError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
@@ -42,15 +44,84 @@ class Emotion(BaseModel):
 		return _("%s") % (self.name)
 
 
-class EntryManager(models.Manager):
+class EntryQuerySet(models.QuerySet):
+	""" QuerySet for Entries
+
+	after(occasion, pk): keyset filter for cursor pagination
+	create(**kwargs): routed by the user of the new entry
+	bulk_create_with_pks(entries): bulk_create() that sets the primary keys
+	delete_rows(): one DELETE, without signals
+	"""
+
+	def after(self, occasion, pk):
+		""" Returns the entries following the keyset (occasion, pk) in
+		("-occasion", "id") order. Served by the (user, -occasion, id)
+		index, so deep pages cost the same as the first one.
+		"""
+		return self.filter(
+			models.Q(occasion__lt=occasion) | models.Q(occasion=occasion, id__gt=pk)
+		)
+
+	def create(self, **kwargs):
+		""" Saves through the database router with the new entry as hint,
+		so it is stored on the shard of its user (journal.shards).
+		"""
+		if self._db is not None:
+			return super().create(**kwargs)
+		entry = self.model(**kwargs)
+		entry.save(force_insert=True)
+		return entry
+
+	def bulk_create_with_pks(self, entries, batch_size=None):
+		""" Inserts the entries with bulk_create() and sets their primary
+		keys, also where the database cannot return them (SQLite on Django
+		3.2). Those are then the highest ids: call it in a transaction,
+		which holds the write lock since the insert, so no other entry can
+		have been inserted in between.
+		"""
+		self.bulk_create(entries, batch_size=batch_size)
+		if entries and entries[0].pk is None:
+			if not connections[self.db].in_atomic_block:
+				raise TransactionManagementError("bulk_create_with_pks() needs a transaction.")
+			pks = list(self.order_by("-pk").values_list("pk", flat=True)[:len(entries)])
+			for entry, pk in zip(entries, reversed(pks)):
+				entry.pk = pk
+		return entries
+
+	def delete_rows(self):
+		""" Deletes the entries with a single DELETE, bypassing the collector:
+		no per-entry signals and no cascades, delete the emotion links first.
+		Returns the number of deleted rows.
+		"""
+		return self._raw_delete(self.db)
+
+
+class EntryManager(models.Manager.from_queryset(EntryQuerySet)):
 	""" Manager for Entries
 
-	my_entries(user): returns a list of entries descendingly sorted
+	my_entries(user, after): returns a list of entries descendingly sorted,
+	of a user or a user id
 	"""
 	
-	def my_entries(self, user):
-		""" Returns a list of entries descendingly sorted."""
-		return self.filter(user=user).order_by("-occasion")
+	def my_entries(self, user, after=None):
+		""" Returns a list of entries descendingly sorted.
+
+		after: optional (occasion, id) keyset of the last seen entry.
+		Only the entries following it are returned.
+		"""
+		if isinstance(user, models.Model):
+			# Through the related manager: the query goes to the shard of the
+			# user (journal.shards) and every entry's user is `user`, unjoined.
+			queryset = user.entries.order_by("-occasion", "id")
+		else:
+			from journal import shards
+
+			queryset = self.filter(user_id=user).order_by("-occasion", "id").using(shards.shard_for_user_id(user))
+		if self._db:
+			queryset = queryset.using(self._db)
+		if after is not None:
+			queryset = queryset.after(*after)
+		return queryset
 
 
 class Entry(BaseModel):
@@ -61,18 +132,34 @@ class Entry(BaseModel):
 	date: when the entry was made
 	text: the entry
 	emotions: emotion tags
+	changed_at: when its author last changed it, on their device for
+	the changes of offline clients (journal.sync); updated_at is the
+	server time of the change
 	"""
 
 	class Meta:
 		verbose_name = _("Entry")
 		verbose_name_plural = _("Entries")
-		ordering = ("-occasion",)
+		ordering = ("-occasion", "id")
+		indexes = [
+			models.Index(
+				fields=["user", "-occasion", "id"],
+				name="journal_entry_user_occ_idx",
+			),
+			# Changes since a sync cursor (journal.sync)
+			models.Index(
+				fields=["user", "updated_at"],
+				name="journal_entry_user_upd_idx",
+			),
+		]
 
 	user = models.ForeignKey(
         User,
         help_text=_("Author of the entry"),
         related_name="entries",
         blank=True, on_delete=models.CASCADE,
+        # Entries may live on another database than their user (journal.shards)
+        db_constraint=False,
     )
 
 	occasion = models.DateField(
@@ -93,12 +180,96 @@ class Entry(BaseModel):
 		blank=True,
 	)
 
+	changed_at = models.DateTimeField(
+		_("Changed at"),
+		help_text=_("When the author last changed the entry"),
+		null=True, blank=True,
+	)
+
 	objects = EntryManager()
 
 	def __str__(self):
 		return _("%s Entry from %s") % (self.user, self.occasion)
 
 	def save(self, *args, **kwargs):
+		self.apply_defaults()
+		# Changed on the server
+		self.changed_at = timezone.now()
+		super(Entry, self).save(*args, **kwargs)
+
+	def apply_defaults(self):
+		""" Defaults applied on save. Call before bulk_create, which bypasses save."""
 		if not self.occasion:
 			self.occasion = date.today() #FIX: timezone aware...!
-		super(Entry, self).save(*args, **kwargs)
\ No newline at end of file
+		if self.changed_at is None:
+			self.changed_at = timezone.now()
+
+class EntryTombstone(models.Model):
+	""" EntryTombstone Model
+	Marks a deleted entry for the delta sync of offline clients, see
+	journal.sync. Lives on the shard of the user, like the entry did.
+
+	user: author of the deleted entry
+	entry_id: id of the deleted entry
+	deleted_at: when it was deleted
+	"""
+
+	class Meta:
+		verbose_name = _("Entry Tombstone")
+		verbose_name_plural = _("Entry Tombstones")
+		indexes = [
+			models.Index(
+				fields=["user", "deleted_at"],
+				name="journal_tomb_user_del_idx",
+			),
+		]
+
+	user = models.ForeignKey(
+		User,
+		help_text=_("Author of the deleted entry"),
+		related_name="entry_tombstones",
+		# Removed with the user by the journal signals, on its shard
+		on_delete=models.DO_NOTHING,
+		db_constraint=False,
+	)
+	entry_id = models.BigIntegerField(_("Entry"))
+	deleted_at = models.DateTimeField(_("Deleted at"), default=timezone.now)
+
+	def __str__(self):
+		return _("Entry %s deleted at %s") % (self.entry_id, self.deleted_at)
+
+
+class UserJournalStats(BaseModel):
+	""" UserJournalStats Model
+	Writing statistics of a user, maintained incrementally by the Entry
+	signals (see journal.stats), so reading them is a single row lookup.
+
+	user: whose entries are counted
+	entry_count, char_count, word_count: totals over all entries
+	char_counts: count per character over all entries
+	first_occasion, last_occasion: date range of the entries
+	streak: consecutive days with entries, ending at last_occasion
+	"""
+
+	class Meta:
+		verbose_name = _("Journal Statistics")
+		verbose_name_plural = _("Journal Statistics")
+
+	user = models.OneToOneField(
+		User,
+		help_text=_("Author of the entries"),
+		related_name="journal_stats",
+		on_delete=models.CASCADE,
+		db_constraint=False,
+	)
+
+	entry_count = models.PositiveIntegerField(_("Entries"), default=0)
+	char_count = models.PositiveIntegerField(_("Characters"), default=0)
+	word_count = models.PositiveIntegerField(_("Words"), default=0)
+	char_counts = models.JSONField(_("Characters by count"), default=dict, blank=True)
+	first_occasion = models.DateField(_("First occasion"), null=True, blank=True)
+	last_occasion = models.DateField(_("Last occasion"), null=True, blank=True)
+	streak = models.PositiveIntegerField(_("Streak"), default=0)
+
+	def __str__(self):
+		return _("Statistics of %s") % (self.user)
@@ -0,0 +1,145 @@
+""" Full-text search over Entry.text
+
+Entries are indexed in an SQLite FTS5 table, kept in sync by the Entry
+post_save/post_delete receivers in journal.signals. The owner of an entry
+is indexed as a token as well, so a per-user search is an intersection of
+two posting lists instead of a filter over every match of the term.
+
+On databases without FTS5 the search falls back to `text__icontains`.
+"""
+import re
+
+from django.db import connections
+from django.utils.html import escape
+
+FTS_TABLE = "journal_entry_fts"
+
+# Tag inserted around the matched terms of a snippet
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 16
+# Placeholders of the tags while the snippet text is escaped (private use
+# characters, not expected in diary text)
+_START, _END = "\ue000", "\ue001"
+
+
+def is_available(using="default"):
+	""" FTS5 is created by migration 0006 on SQLite only."""
+	return connections[using].vendor == "sqlite"
+
+
+def owner_token(user_id):
+	return "u%s" % user_id
+
+
+def match_expression(query, user_id=None):
+	""" Builds a safe FTS5 MATCH expression from a user supplied query.
+
+	Every word becomes a quoted phrase (no FTS5 syntax is passed through),
+	the last one matches as a prefix. Returns None if there are no words.
+	"""
+	terms = re.findall(r"\w+", query)
+	if not terms:
+		return None
+	phrases = ['"%s"' % term for term in terms]
+	phrases[-1] += "*"
+	expression = "text : (%s)" % " ".join(phrases)
+	if user_id is not None:
+		expression = 'owner : "%s" AND %s' % (owner_token(user_id), expression)
+	return expression
+
+
+def index_entries(entries, using="default"):
+	""" (Re-)indexes the given entries."""
+	if not is_available(using):
+		return
+	rows = [(entry.pk, entry.text, owner_token(entry.user_id)) for entry in entries]
+	with connections[using].cursor() as cursor:
+		cursor.executemany(
+			"DELETE FROM %s WHERE rowid = %%s" % FTS_TABLE, [row[:1] for row in rows]
+		)
+		cursor.executemany(
+			"INSERT INTO %s (rowid, text, owner) VALUES (%%s, %%s, %%s)" % FTS_TABLE, rows
+		)
+
+
+def unindex_entries(pks, using="default"):
+	""" Removes the entries with the given primary keys from the index."""
+	if not is_available(using):
+		return
+	with connections[using].cursor() as cursor:
+		cursor.executemany(
+			"DELETE FROM %s WHERE rowid = %%s" % FTS_TABLE, [(pk,) for pk in pks]
+		)
+
+
+def rebuild_index(using="default"):
+	""" Rebuilds the whole index from journal_entry, e.g. after bulk writes
+	that bypassed the signals.
+	"""
+	if not is_available(using):
+		return
+	with connections[using].cursor() as cursor:
+		cursor.execute("DELETE FROM %s" % FTS_TABLE)
+		cursor.execute(
+			"INSERT INTO %s (rowid, text, owner) "
+			"SELECT id, text, 'u' || user_id FROM journal_entry" % FTS_TABLE
+		)
+
+
+def matching_ids_sql(query, user_id=None):
+	""" Returns (sql, params) selecting the ids of the matching entries,
+	to be used in a `pk__in=RawSQL(...)` filter. None if nothing can match.
+	"""
+	expression = match_expression(query, user_id)
+	if expression is None:
+		return None
+	return "SELECT rowid FROM %s WHERE %s MATCH %%s" % (FTS_TABLE, FTS_TABLE), [expression]
+
+
+def search_entries(user, query, limit=20, using="default"):
+	""" Returns the entries of `user` matching `query`, best match first.
+
+	Each entry carries a `snippet` of the matching text, HTML escaped, with
+	the matches wrapped in SNIPPET_START/SNIPPET_END, and its bm25 `rank`
+	(lower is better).
+	"""
+	from journal.models import Entry
+
+	entries = (
+		Entry.objects.my_entries(user).using(using).prefetch_related("emotions")
+	)
+	if not is_available(using):
+		terms = re.findall(r"\w+", query)
+		if not terms:
+			return []
+		for term in terms:
+			entries = entries.filter(text__icontains=term)
+		results = list(entries[:limit])
+		for entry in results:
+			entry.snippet, entry.rank = escape(entry.text[:200]), None
+		return results
+
+	expression = match_expression(query, user.pk)
+	if expression is None:
+		return []
+	with connections[using].cursor() as cursor:
+		cursor.execute(
+			"SELECT rowid, snippet(%s, 0, %%s, %%s, '…', %%s), rank FROM %s "
+			"WHERE %s MATCH %%s ORDER BY rank LIMIT %%s" % ((FTS_TABLE,) * 3),
+			[_START, _END, SNIPPET_TOKENS, expression, limit],
+		)
+		hits = cursor.fetchall()
+	by_id = entries.in_bulk([pk for pk, _, _ in hits])
+	results = []
+	for pk, snippet, rank in hits:
+		if pk in by_id:
+			entry = by_id[pk]
+			entry.snippet, entry.rank = _highlight(snippet), rank
+			results.append(entry)
+	return results
+
+
+def _highlight(snippet):
+	""" Escapes the snippet text and turns the placeholders into the tags."""
+	return escape(snippet).replace(_START, SNIPPET_START).replace(_END, SNIPPET_END)
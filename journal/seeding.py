@@ -0,0 +1,202 @@
+""" Synthetic journal data at scale
+
+seed_journal() creates users with the data of UserFactory and, for each
+of them, entries with EntryFactory texts and dates: texts of a few to a
+few dozen sentences, dates clustered in a window of the user's activity
+and a skewed distribution of 0-3 emotions. The same seed generates the
+same data.
+
+Rows are written like the bulk paths of the app: users through
+provision_users(), entries and their emotion links with one bulk insert
+each per batch. No per-row signal runs; the search index, the statistics
+and the journal cache are brought up to date once at the end.
+"""
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import factory
+import factory.random
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from journal import cache, search, shards, stats
+from journal.emotions import emotion_registry
+from journal.models import Emotion, Entry
+from journal.tests.factories import EntryFactory
+from users.provisioning import provision_users
+from users.tests.factories import UserFactory
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+# Texts are assembled from the sentences of this many EntryFactory texts
+TEXT_POOL_SIZE = 500
+# Range of EntryFactory.occasion
+FIRST_DAY = date(2020, 1, 1)
+LAST_DAY = date(2021, 12, 31)
+# Emotion names and their relative frequency
+EMOTIONS = (
+	("joy", 30), ("gratitude", 18), ("calm", 14), ("hope", 10), ("sadness", 9),
+	("anxiety", 8), ("love", 6), ("anger", 3), ("fear", 2),
+)
+# Relative frequency of entries with 0, 1, 2 and 3 emotions
+EMOTION_COUNTS = (25, 45, 22, 8)
+
+
+@dataclass
+class SeedResult:
+	users: int = 0
+	skipped_users: int = 0
+	entries: int = 0
+	emotion_links: int = 0
+	seconds: float = 0.0
+
+	@property
+	def entries_per_second(self):
+		return self.entries / self.seconds if self.seconds else 0.0
+
+
+class SeedUserFactory(UserFactory):
+	# No password hashing: provisioned users get an unusable password
+	password = None
+
+
+def user_rows(count, seed=0):
+	""" Returns count provision_users() rows, usernames made unique by
+	their number.
+	"""
+	factory.random.reseed_random(seed)
+	return [
+		{"username": "%s%d" % (user.username, number), "email": user.email}
+		for number, user in enumerate(SeedUserFactory.build_batch(count))
+	]
+
+
+def sentence_pool(seed=0):
+	factory.random.reseed_random(seed)
+	return [
+		sentence.rstrip(".") + "."
+		for entry in EntryFactory.build_batch(TEXT_POOL_SIZE, user=None)
+		for sentence in entry.text.split(". ")
+	]
+
+
+class EntryGenerator:
+	""" Generates the entries of users as (unsaved entry, emotion ids)."""
+
+	def __init__(self, emotion_ids, seed=0):
+		self.rng = random.Random(seed)
+		self.sentences = sentence_pool(seed)
+		# emotion_ids: id -> relative frequency
+		self.emotion_ids = list(emotion_ids)
+		self.emotion_weights = list(emotion_ids.values())
+
+	def text(self):
+		# Log-normal: mostly short notes, some long ones
+		length = min(60, max(1, int(self.rng.lognormvariate(1.3, 0.8))))
+		return " ".join(self.rng.choices(self.sentences, k=length))
+
+	def occasions(self, count):
+		""" Returns count dates within a window of activity, newest first."""
+		days = (LAST_DAY - FIRST_DAY).days + 1
+		span = self.rng.randint(min(days, max(7, count // 2)), days)
+		start = self.rng.randrange(days - span + 1)
+		offsets = sorted((self.rng.randrange(span) for _ in range(count)), reverse=True)
+		return [FIRST_DAY + timedelta(days=start + offset) for offset in offsets]
+
+	def emotions(self):
+		count = self.rng.choices(range(len(EMOTION_COUNTS)), weights=EMOTION_COUNTS)[0]
+		if not count or not self.emotion_ids:
+			return ()
+		return set(self.rng.choices(self.emotion_ids, weights=self.emotion_weights, k=count))
+
+	def entries(self, user_id, count):
+		for occasion in self.occasions(count):
+			yield Entry(user_id=user_id, occasion=occasion, text=self.text()), self.emotions()
+
+
+def _emotion_ids(using=DEFAULT_DB_ALIAS):
+	""" Returns emotion id -> frequency of EMOTIONS on the database using,
+	creating the missing ones.
+	"""
+	# With sharding, emotions are created on "default" and copied to the shards
+	if shards.enabled():
+		using = DEFAULT_DB_ALIAS
+	names = dict(EMOTIONS)
+	existing = set(Emotion.objects.using(using).filter(name__in=names).values_list("name", flat=True))
+	if len(existing) < len(names):
+		Emotion.objects.using(using).bulk_create(
+			[Emotion(name=name) for name in names if name not in existing], ignore_conflicts=True
+		)
+		emotion_registry.changed(using=using)
+	shards.sync_emotions()
+	return {
+		pk: names[name]
+		for name, pk in Emotion.objects.using(using).filter(name__in=names).order_by("name").values_list("name", "pk")
+	}
+
+
+def _write(batch, using):
+	""" Inserts a batch of entries and their emotion links. Returns the
+	number of links.
+	"""
+	entries = [entry for entry, _ in batch]
+	Through = Entry.emotions.through
+	with transaction.atomic(using=using):
+		Entry.objects.using(using).bulk_create_with_pks(entries)
+		links = [Through(entry_id=entry.pk, emotion_id=pk) for entry, emotions in batch for pk in emotions]
+		Through.objects.using(using).bulk_create(links)
+	return len(links)
+
+
+def _users(usernames, using, chunk_size=500):
+	for index in range(0, len(usernames), chunk_size):
+		yield from (
+			User.objects.using(using).filter(username__in=usernames[index:index + chunk_size])
+			.order_by("pk").only("pk", "shard")
+		)
+
+
+def seed_journal(users, entries, seed=0, batch_size=BATCH_SIZE, using=DEFAULT_DB_ALIAS, progress=None):
+	""" Creates users users with entries entries each, on the database
+	using (the shards of the users with sharding).
+
+	Usernames that already exist are skipped, with their entries: seeding
+	twice with the same seed adds nothing. progress is called with the
+	number of entries written so far. Returns a SeedResult.
+	"""
+	start = time.perf_counter()
+	result = SeedResult()
+	provisioned = provision_users(user_rows(users, seed), batch_size=batch_size, using=using)
+	result.users, result.skipped_users = len(provisioned.created), len(provisioned.skipped)
+	generator = EntryGenerator(_emotion_ids(using), seed)
+
+	batches, user_ids = {}, {}
+	for user in _users(provisioned.created, using):
+		alias = shards.shard_for(user) if shards.enabled() else using
+		user_ids.setdefault(alias, []).append(user.pk)
+		batch = batches.setdefault(alias, [])
+		for row in generator.entries(user.pk, entries):
+			batch.append(row)
+			if len(batch) >= batch_size:
+				result.emotion_links += _write(batch, alias)
+				result.entries += len(batch)
+				batch.clear()
+				if progress is not None:
+					progress(result.entries)
+	for alias, batch in batches.items():
+		if batch:
+			result.emotion_links += _write(batch, alias)
+			result.entries += len(batch)
+	if progress is not None:
+		progress(result.entries)
+
+	for alias, ids in user_ids.items():
+		search.rebuild_index(using=alias)
+		for index in range(0, len(ids), 500):
+			stats.rebuild_stats(ids[index:index + 500], using=alias)
+	cache.bump_all(using=using)
+	result.seconds = time.perf_counter() - start
+	return result
@@ -0,0 +1,417 @@
+""" Per-user sharding of the journal entries
+
+settings.ENTRY_SHARDS lists the database aliases holding entries, e.g.
+["default", "shard1"]. Empty (the default) disables sharding. A user's
+entries, their emotion links and their statistics live on one shard: the
+alias in User.shard, pinned when the user is created (place_users()).
+Users without one, created before sharding, live on the first shard.
+Adding a shard moves nobody, "manage.py rebalance_shards" does. The rest
+(users, tokens, emotions) lives on "default"; every shard keeps a copy of
+the emotions, which the emotion links and their joins need.
+
+ShardRouter sends the queries of Entry.objects.my_entries(user), of
+user.entries and of loaded entries to their shard. Queries over all users
+use FanOut, which runs them on every shard and merges the results.
+
+Entry ids are unique over all shards: each shard allocates them in its own
+range of 2**ID_BITS, set up by "manage.py init_shards". shard_of_pk() finds
+the shard of an entry id. move_user() moves a user's entries to another
+shard, see "manage.py rebalance_shards"; moved entries get new ids, the
+old ones become sync tombstones. A move that a write of the user
+interrupts is rolled back.
+"""
+import heapq
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, OrderBy
+from django.utils import timezone
+
+from journal import cache
+from journal.models import Emotion, Entry, EntryTombstone, UserJournalStats
+
+User = get_user_model()
+
+ID_BITS = 40
+
+# Number of users pinned to a shard, per database of the users
+USER_COUNT_KEY = "journal:shards:users:%s:%s"
+
+SHARDED_MODELS = {
+	Entry._meta.label_lower,
+	Entry.emotions.through._meta.label_lower,
+	EntryTombstone._meta.label_lower,
+	UserJournalStats._meta.label_lower,
+}
+
+
+def enabled():
+	return bool(getattr(settings, "ENTRY_SHARDS", ()))
+
+
+def aliases():
+	return list(getattr(settings, "ENTRY_SHARDS", ())) or [DEFAULT_DB_ALIAS]
+
+
+def shard_for(user):
+	""" Returns the alias of the database holding user's entries."""
+	shards = aliases()
+	if len(shards) == 1:
+		return shards[0]
+	if user.shard:
+		if user.shard not in shards:
+			raise ValueError("Shard %r of %s is not in ENTRY_SHARDS." % (user.shard, user))
+		return user.shard
+	return shards[0]
+
+
+def _user_counts(using, shards):
+	""" Returns the number of users per shard, kept in the journal cache
+	once counted.
+	"""
+	store = cache.get_cache()
+	keys = {shard: USER_COUNT_KEY % (using, shard) for shard in shards}
+	stored = store.get_many(keys.values())
+	if len(stored) == len(keys):
+		return Counter({shard: stored[key] for shard, key in keys.items()})
+	counts = Counter(dict.fromkeys(shards, 0))
+	rows = User.objects.using(using).values_list("shard").annotate(count=Count("pk")).order_by()
+	for shard, count in rows:
+		counts[shard or shards[0]] += count
+	store.set_many({key: counts[shard] for shard, key in keys.items()}, None)
+	return counts
+
+
+def count_users(shard, delta, using=DEFAULT_DB_ALIAS):
+	""" Adds delta to the number of users of shard, see place_users()."""
+	if not enabled():
+		return
+	try:
+		cache.get_cache().incr(USER_COUNT_KEY % (using, shard), delta)
+	except ValueError:
+		# Not counted yet, the next placement counts
+		pass
+
+
+def place_users(users, using=DEFAULT_DB_ALIAS):
+	""" Pins the new users without a shard to the shards with the fewest
+	users. The counts are queried once and then kept up to date by the
+	placements, moves and deletions, so they may drift by the users of
+	rolled back transactions: they only balance the placement.
+	"""
+	if not enabled():
+		return
+	shards = aliases()
+	counts = _user_counts(using, shards)
+	placed = Counter()
+	for user in users:
+		if not user.shard:
+			user.shard = min(shards, key=lambda shard: counts[shard] + placed[shard])
+		placed[user.shard] += 1
+	for shard, count in placed.items():
+		count_users(shard, count, using)
+
+
+def shard_for_user_id(user_id):
+	if not enabled():
+		return DEFAULT_DB_ALIAS
+	shard = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).values_list("shard", flat=True).first()
+	return shard_for(User(pk=user_id, shard=shard or ""))
+
+
+def shard_of_pk(pk):
+	""" Returns the alias of the shard that allocated the entry id pk."""
+	shards = aliases()
+	index = int(pk) >> ID_BITS
+	if index >= len(shards):
+		raise ValueError("Entry id %s is out of the range of all shards." % pk)
+	return shards[index]
+
+
+class ShardRouter:
+	""" Routes the sharded journal models by the user their hints belong to.
+	Other models stay on "default", the emotions of an entry are read from
+	the entry's shard.
+	"""
+
+	def _shard(self, instance):
+		if instance is None:
+			return None
+		if isinstance(instance, User):
+			return shard_for(instance)
+		if instance._meta.label_lower not in SHARDED_MODELS:
+			return None
+		if instance._state.db in aliases():
+			return instance._state.db
+		user = instance._state.fields_cache.get("user")
+		if user is not None:
+			return shard_for(user)
+		return shard_for_user_id(instance.user_id) if instance.user_id is not None else None
+
+	def _route(self, model, hints, write):
+		if not enabled():
+			return None
+		instance = hints.get("instance")
+		if model._meta.label_lower in SHARDED_MODELS:
+			return self._shard(instance)
+		if instance is not None and instance._meta.label_lower in SHARDED_MODELS:
+			# entry.emotions joins the links on the shard, entry.user is on "default"
+			if model is Emotion and not write:
+				return instance._state.db
+			return DEFAULT_DB_ALIAS
+		return None
+
+	def db_for_read(self, model, **hints):
+		return self._route(model, hints, write=False)
+
+	def db_for_write(self, model, **hints):
+		return self._route(model, hints, write=True)
+
+	def allow_relation(self, obj1, obj2, **hints):
+		if enabled() and SHARDED_MODELS & {obj1._meta.label_lower, obj2._meta.label_lower}:
+			return True
+		return None
+
+
+class _Descending:
+	__slots__ = ("value",)
+
+	def __init__(self, value):
+		self.value = value
+
+	def __lt__(self, other):
+		return other.value < self.value
+
+	def __eq__(self, other):
+		return self.value == other.value
+
+
+def _merge_ordering(queryset):
+	""" Returns the ordering of queryset as (attname, descending) pairs of
+	local fields, ending with the primary key. Orderings by related models
+	are dropped: their tables are not on the shards.
+	"""
+	opts = queryset.model._meta
+	ordering = []
+	for term in queryset.query.order_by or opts.ordering:
+		if isinstance(term, str):
+			name, descending = term.lstrip("-"), term.startswith("-")
+		elif isinstance(term, OrderBy) and isinstance(term.expression, F):
+			name, descending = term.expression.name, term.descending
+		else:
+			continue
+		name = opts.pk.name if name == "pk" else name
+		try:
+			field = opts.get_field(name)
+		except FieldDoesNotExist:
+			continue
+		if field.concrete and not field.many_to_many:
+			ordering.append((field.attname, descending))
+	if opts.pk.attname not in [name for name, _ in ordering]:
+		ordering.append((opts.pk.attname, False))
+	return ordering
+
+
+class FanOut:
+	""" Read-only union of an entry queryset over all shards, in its order.
+
+	Supports count(), len(), iteration and slicing, which is enough for a
+	Paginator and the admin changelist. A slice [start:stop] reads the
+	first `stop` rows of each shard and merges them.
+	"""
+	ordered = True
+
+	def __init__(self, queryset):
+		self.ordering = _merge_ordering(queryset)
+		self.queryset = (
+			queryset.select_related(None).prefetch_related("user")
+			.order_by(*[("-" if descending else "") + name for name, descending in self.ordering])
+		)
+		self._count = None
+
+	def _key(self, instance):
+		return tuple(
+			_Descending(getattr(instance, name)) if descending else getattr(instance, name)
+			for name, descending in self.ordering
+		)
+
+	def count(self):
+		if self._count is None:
+			self._count = sum(self.queryset.using(alias).count() for alias in aliases())
+		return self._count
+
+	def __len__(self):
+		return self.count()
+
+	def __getitem__(self, index):
+		if not isinstance(index, slice):
+			return self[index:index + 1][0]
+		start, stop = index.start or 0, index.stop
+		parts = [
+			self.queryset.using(alias)[:stop] if stop is not None else self.queryset.using(alias)
+			for alias in aliases()
+		]
+		return list(islice(heapq.merge(*parts, key=self._key), start, stop))
+
+	def __iter__(self):
+		return iter(self[0:None])
+
+	def _clone(self):
+		return self
+
+
+def init_id_range(alias):
+	""" Makes the shard alias allocate entry ids from its own range."""
+	start = aliases().index(alias) << ID_BITS
+	if not start:
+		return
+	table = Entry._meta.db_table
+	connection = connections[alias]
+	with connection.cursor() as cursor:
+		if connection.vendor == "sqlite":
+			cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+			row = cursor.fetchone()
+			if row is None:
+				cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+			elif row[0] < start:
+				cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+		elif connection.vendor == "postgresql":
+			cursor.execute(
+				"SELECT setval(pg_get_serial_sequence(%%s, 'id'), GREATEST(%%s, (SELECT COALESCE(MAX(id), 0) FROM %s)))"
+				% connection.ops.quote_name(table),
+				[table, start],
+			)
+		else:
+			raise NotImplementedError("Entry id ranges are not supported on %s." % connection.vendor)
+
+
+def sync_emotions():
+	""" Copies the emotions of "default" to every other shard."""
+	if not enabled():
+		return
+	emotions = {emotion.pk: emotion for emotion in Emotion.objects.using(DEFAULT_DB_ALIAS)}
+	for alias in aliases():
+		if alias == DEFAULT_DB_ALIAS:
+			continue
+		with transaction.atomic(using=alias):
+			Emotion.objects.using(alias).exclude(pk__in=emotions).delete()
+			copies = Emotion.objects.using(alias).in_bulk()
+			changed = [emotion for pk, emotion in emotions.items() if pk in copies and copies[pk].name != emotion.name]
+			if changed:
+				Emotion.objects.using(alias).bulk_update(changed, ["name", "updated_at"])
+			Emotion.objects.using(alias).bulk_create(
+				[emotion for pk, emotion in emotions.items() if pk not in copies]
+			)
+
+
+def delete_user_entries(user_id, using, pks=None):
+	""" Deletes the entries, emotion links and statistics of the user on
+	one database, without the per-entry signals; only the entries of pks
+	if given. Returns the entry ids.
+	"""
+	from journal import search
+
+	if pks is None:
+		pks = list(Entry.objects.using(using).filter(user_id=user_id).values_list("pk", flat=True))
+	if pks:
+		Entry.emotions.through.objects.using(using).filter(entry_id__in=pks).delete()
+		search.unindex_entries(pks, using=using)
+		Entry.objects.using(using).filter(user_id=user_id, pk__in=pks).delete_rows()
+	UserJournalStats.objects.using(using).filter(user_id=user_id).delete()
+	return pks
+
+
+class MoveInterrupted(Exception):
+	""" The user wrote entries during move_user(), nothing was moved."""
+
+
+def move_user(user, target, batch_size=1000):
+	""" Moves the entries of user, with their emotion links and sync
+	tombstones, to the shard target and points the user there. The entries
+	get ids of the target's range and count as changed now; the old ids
+	become tombstones, so the next delta sync of a client replaces them.
+	Returns the number of moved entries.
+
+	The source transaction stays open until the user points to the target:
+	the copied entries are locked where the database supports it, and a
+	write of the user during the move makes it fail (MoveInterrupted, or a
+	database error where the source is locked as a whole) and roll back
+	instead of getting lost. Retry it then.
+	"""
+	from journal.signals import entries_bulk_written
+
+	source = shard_for(user)
+	if target not in aliases():
+		raise ValueError("%r is not in ENTRY_SHARDS." % target)
+	if target == source:
+		return 0
+	Through = Entry.emotions.through
+	try:
+		with transaction.atomic(using=source):
+			rows = list(
+				Entry.objects.using(source).select_for_update().filter(user_id=user.pk).order_by("pk")
+				.values_list("pk", "occasion", "text", "changed_at", "created_at")
+			)
+			entries = {
+				pk: Entry(user=user, occasion=occasion, text=text, changed_at=changed_at)
+				for pk, occasion, text, changed_at, _ in rows
+			}
+			links = list(
+				Through.objects.using(source).filter(entry_id__in=entries).values_list("entry_id", "emotion_id")
+			)
+			tombstones = dict(
+				EntryTombstone.objects.using(source).filter(user_id=user.pk).values_list("entry_id", "deleted_at")
+			)
+			sync_emotions()
+			with transaction.atomic(using=target):
+				# Left over by an interrupted move, the source is authoritative
+				leftover = delete_user_entries(user.pk, target)
+				moved = list(entries.values())
+				Entry.objects.using(target).bulk_create_with_pks(moved, batch_size=batch_size)
+				# bulk_create applied auto_now_add, keep the original creation time
+				for pk, *_, created_at in rows:
+					entries[pk].created_at = created_at
+				Entry.objects.using(target).bulk_update(moved, ["created_at"], batch_size=batch_size)
+				Through.objects.using(target).bulk_create(
+					[Through(entry_id=entries[entry_id].pk, emotion_id=emotion_id) for entry_id, emotion_id in links],
+					batch_size=batch_size,
+				)
+				moved_at = moved[0].updated_at if moved else timezone.now()
+				for pk in [*entries, *leftover]:
+					tombstones.setdefault(pk, moved_at)
+				existing = set(
+					EntryTombstone.objects.using(target).filter(user_id=user.pk).values_list("entry_id", flat=True)
+				)
+				EntryTombstone.objects.using(target).bulk_create(
+					[
+						EntryTombstone(user_id=user.pk, entry_id=pk, deleted_at=deleted_at)
+						for pk, deleted_at in tombstones.items() if pk not in existing
+					],
+					batch_size=batch_size,
+				)
+				entries_bulk_written.send(
+					sender=Entry, user_ids=[user.pk], entries=moved, deleted=(), using=target
+				)
+			delete_user_entries(user.pk, source, pks=list(entries))
+			EntryTombstone.objects.using(source).filter(user_id=user.pk, entry_id__in=tombstones).delete()
+			if (
+				Entry.objects.using(source).filter(user_id=user.pk).exists()
+				or EntryTombstone.objects.using(source).filter(user_id=user.pk).exists()
+			):
+				raise MoveInterrupted("%s wrote entries during the move to %s." % (user, target))
+			user.shard = target
+			user.save(update_fields=["shard"])
+	except Exception:
+		# The source still holds everything, drop the copies
+		with transaction.atomic(using=target):
+			delete_user_entries(user.pk, target)
+			EntryTombstone.objects.using(target).filter(user_id=user.pk).delete()
+		raise
+	using = user._state.db or DEFAULT_DB_ALIAS
+	count_users(source, -1, using)
+	count_users(target, 1, using)
+	return len(entries)
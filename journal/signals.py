@@ -0,0 +1,169 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from journal import cache, search, shards, stats, sync
+from journal.emotions import emotion_registry
+from journal.models import Emotion, Entry, EntryTombstone
+
+User = get_user_model()
+
+# Sent by code writing entries in bulk (bulk_create, bulk_update, queryset
+# delete without signals), which bypasses the per-instance signals below.
+# Arguments: user_ids (affected users), entries (created or updated
+# entries), deleted (primary keys of deleted entries, of the single user
+# in user_ids), optionally snapshots ((old, new) stats snapshot pairs of
+# all changes, applied instead of rebuilding the statistics), using.
+entries_bulk_written = Signal()
+
+
+# FULL-TEXT INDEX (post save / post delete)
+@receiver(post_save, sender=Entry)
+def entry_index(sender, instance, using, **kwargs):
+	search.index_entries([instance], using=using)
+
+@receiver(post_delete, sender=Entry)
+def entry_unindex(sender, instance, using, **kwargs):
+	search.unindex_entries([instance.pk], using=using)
+
+@receiver(entries_bulk_written, sender=Entry)
+def entries_bulk_index(sender, entries=(), deleted=(), using="default", **kwargs):
+	search.unindex_entries(deleted, using=using)
+	search.index_entries(entries, using=using)
+
+
+# WRITING STATISTICS (pre save / post save / post delete)
+@receiver(pre_save, sender=Entry)
+def entry_remember_stored(sender, instance, using, **kwargs):
+	# The stored version is needed to apply only the difference
+	instance._stats_previous = stats.stored_snapshot(instance, using=using)
+
+@receiver(post_save, sender=Entry)
+def entry_stats_saved(sender, instance, using, **kwargs):
+	stats.apply_change(getattr(instance, "_stats_previous", None), stats.snapshot(instance), using=using)
+
+@receiver(post_delete, sender=Entry)
+def entry_stats_deleted(sender, instance, using, **kwargs):
+	stats.apply_change(stats.snapshot(instance), None, using=using)
+
+@receiver(entries_bulk_written, sender=Entry)
+def entries_bulk_stats(sender, user_ids, snapshots=None, using="default", **kwargs):
+	if snapshots is not None:
+		stats.apply_changes(snapshots, using=using)
+	else:
+		stats.rebuild_stats(list(user_ids), using=using)
+
+
+# JOURNAL CACHE VERSIONS (post save / post delete / m2m changed)
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def entry_cache_changed(sender, instance, using, **kwargs):
+	cache.bump_user(instance.user_id, using=using)
+	previous = getattr(instance, "_stats_previous", None)
+	if previous and previous.user_id != instance.user_id:
+		cache.bump_user(previous.user_id, using=using)
+
+@receiver(m2m_changed, sender=Entry.emotions.through)
+def entry_emotions_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+	if action not in ("post_add", "post_remove", "post_clear"):
+		return
+	if not reverse:
+		cache.bump_user(instance.user_id, using=using)
+	elif action == "post_clear":
+		# emotion.entry_set.clear(): the affected entries are gone
+		cache.bump_all(using=using)
+	else:
+		user_ids = Entry.objects.using(using).filter(pk__in=pk_set).values_list("user_id", flat=True)
+		for user_id in set(user_ids):
+			cache.bump_user(user_id, using=using)
+
+@receiver(entries_bulk_written, sender=Entry)
+def entries_bulk_cache_changed(sender, user_ids, using="default", **kwargs):
+	for user_id in user_ids:
+		cache.bump_user(user_id, using=using)
+
+@receiver(post_save, sender=User)
+def user_cache_changed(sender, instance, using, **kwargs):
+	# The username is part of the serialized entries
+	cache.bump_user(instance.pk, using=using)
+
+@receiver(post_save, sender=Emotion)
+@receiver(post_delete, sender=Emotion)
+def emotion_cache_changed(sender, using, **kwargs):
+	# A renamed or deleted emotion shows up in the data of every user
+	cache.bump_all(using=using)
+
+
+# EMOTION REGISTRY (post save / post delete)
+@receiver(post_save, sender=Emotion)
+@receiver(post_delete, sender=Emotion)
+def emotion_registry_changed(sender, using, **kwargs):
+	emotion_registry.changed(using=using)
+
+
+# SHARDS (post save / post delete / pre save / pre delete)
+@receiver(post_save, sender=Emotion)
+@receiver(post_delete, sender=Emotion)
+def emotion_shards_changed(sender, using, **kwargs):
+	# Every shard keeps a copy of the emotions of "default"
+	if using == DEFAULT_DB_ALIAS:
+		shards.sync_emotions()
+
+@receiver(pre_save, sender=User)
+def user_shard_place(sender, instance, using, **kwargs):
+	if instance._state.adding:
+		shards.place_users([instance], using=using)
+
+@receiver(pre_delete, sender=User)
+def user_shard_delete(sender, instance, using, **kwargs):
+	# The deletion cascades on "default" only
+	shard = shards.shard_for(instance)
+	shards.count_users(shard, -1, using)
+	if shard != DEFAULT_DB_ALIAS:
+		shards.delete_user_entries(instance.pk, shard)
+
+
+# DELTA SYNC (post delete / m2m changed / pre save / pre delete)
+@receiver(post_delete, sender=Entry)
+def entry_tombstone(sender, instance, using, **kwargs):
+	sync.add_tombstones(instance.user_id, [instance.pk], using=using)
+
+@receiver(entries_bulk_written, sender=Entry)
+def entries_bulk_tombstones(sender, user_ids, deleted=(), using="default", **kwargs):
+	if deleted:
+		(user_id,) = user_ids
+		sync.add_tombstones(user_id, deleted, using=using)
+
+@receiver(m2m_changed, sender=Entry.emotions.through)
+def entry_emotions_touch(sender, instance, action, reverse, pk_set, using, **kwargs):
+	# The links are synced with their entries, by updated_at
+	if action == "pre_clear" and reverse:
+		instance._sync_cleared = list(instance.entry_set.using(using).values_list("pk", flat=True))
+	if action not in ("post_add", "post_remove", "post_clear"):
+		return
+	if not reverse:
+		instance.updated_at = instance.changed_at = sync.touch_entries(
+			Entry.objects.filter(pk=instance.pk), using=using
+		)
+	else:
+		pks = pk_set if action != "post_clear" else getattr(instance, "_sync_cleared", ())
+		sync.touch_entries(Entry.objects.filter(pk__in=pks), using=using)
+
+@receiver(pre_save, sender=Emotion)
+def emotion_rename_touch(sender, instance, using, **kwargs):
+	if instance.pk is None or using != DEFAULT_DB_ALIAS:
+		return
+	stored = Emotion.objects.using(using).filter(pk=instance.pk).values_list("name", flat=True).first()
+	if stored is not None and stored != instance.name:
+		# The shards get the new name from shards.sync_emotions()
+		for alias in shards.aliases():
+			sync.touch_entries(Entry.objects.filter(emotions=instance.pk), using=alias)
+
+@receiver(pre_delete, sender=Emotion)
+def emotion_delete_touch(sender, instance, using, **kwargs):
+	sync.touch_entries(Entry.objects.filter(emotions=instance.pk), using=using)
+
+@receiver(post_delete, sender=User)
+def user_tombstones_delete(sender, instance, **kwargs):
+	EntryTombstone.objects.using(shards.shard_for(instance)).filter(user_id=instance.pk).delete()
@@ -0,0 +1,204 @@
+""" Incrementally maintained writing statistics (UserJournalStats)
+
+The Entry signals pass a snapshot of an entry before and after a change,
+only the difference between both is applied to the statistics row of the
+user. Writes that bypass the signals (bulk_create, queryset.update) must
+be followed by rebuild_stats(), see the rebuild_journal_stats command.
+"""
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from journal.models import Entry, UserJournalStats
+
+# The parts of an entry the statistics depend on
+Snapshot = namedtuple("Snapshot", ["user_id", "occasion", "text"])
+
+TOP_CHARS = 10
+
+
+def snapshot(entry):
+	return Snapshot(entry.user_id, entry.occasion, entry.text)
+
+
+def stored_snapshot(entry, using="default"):
+	""" Returns the snapshot of the stored version of entry, None if new."""
+	if entry.pk is None:
+		return None
+	row = (
+		Entry.objects.using(using).filter(pk=entry.pk)
+		.values_list("user_id", "occasion", "text").first()
+	)
+	return Snapshot(*row) if row else None
+
+
+def word_count(text):
+	return len(text.split())
+
+
+def apply_change(old, new, using="default"):
+	""" Applies the change of an entry from snapshot old to snapshot new.
+	Either may be None for a created or deleted entry.
+	"""
+	if old == new:
+		return
+	if old and new and old.user_id == new.user_id:
+		_apply(new.user_id, [old], [new], using)
+		return
+	if old:
+		_apply(old.user_id, [old], [], using)
+	if new:
+		_apply(new.user_id, [], [new], using)
+
+
+def apply_changes(changes, using="default"):
+	""" Applies many (old, new) snapshot pairs as in apply_change(), with
+	one update of the statistics row per user.
+	"""
+	by_user = {}
+	for old, new in changes:
+		if old == new:
+			continue
+		if old:
+			by_user.setdefault(old.user_id, ([], []))[0].append(old)
+		if new:
+			by_user.setdefault(new.user_id, ([], []))[1].append(new)
+	for user_id, (removed, added) in by_user.items():
+		_apply(user_id, removed, added, using)
+
+
+def _apply(user_id, removed, added, using):
+	""" Removes the removed snapshots from the statistics of the user and
+	adds the added ones.
+	"""
+	with transaction.atomic(using=using):
+		stats = (
+			UserJournalStats.objects.using(using).select_for_update()
+			.filter(user_id=user_id).first()
+		)
+		if stats is None:
+			# Built in full on first access (see get_stats). Not on removals,
+			# which may come from the cascade deleting the user.
+			if added:
+				rebuild_stats([user_id], using=using)
+			return
+		chars = Counter(stats.char_counts)
+		for snapshot in removed:
+			stats.entry_count -= 1
+			stats.char_count -= len(snapshot.text)
+			stats.word_count -= word_count(snapshot.text)
+			chars.subtract(snapshot.text)
+		for snapshot in added:
+			stats.entry_count += 1
+			stats.char_count += len(snapshot.text)
+			stats.word_count += word_count(snapshot.text)
+			chars.update(snapshot.text)
+		stats.char_counts = {c: count for c, count in chars.items() if count > 0}
+		occasions = sorted(snapshot.occasion for snapshot in added)
+		# Unchanged occasions keep the bounds and the streak
+		unchanged = removed and sorted(snapshot.occasion for snapshot in removed) == occasions
+		if not unchanged and (removed or not all(_add_occasion(stats, occasion) for occasion in occasions)):
+			_refresh_occasions(stats, using)
+		stats.save(using=using)
+
+
+def _add_occasion(stats, occasion):
+	""" Updates first/last occasion and the streak for a new occasion in
+	O(1) where possible. Returns False if the streak must be recomputed.
+	"""
+	if stats.last_occasion is None:
+		stats.first_occasion = stats.last_occasion = occasion
+		stats.streak = 1
+		return True
+	streak_start = stats.last_occasion - timedelta(days=stats.streak - 1)
+	stats.first_occasion = min(stats.first_occasion, occasion)
+	if occasion == stats.last_occasion + timedelta(days=1):
+		stats.last_occasion = occasion
+		stats.streak += 1
+	elif occasion > stats.last_occasion:
+		stats.last_occasion = occasion
+		stats.streak = 1
+	elif occasion == streak_start - timedelta(days=1):
+		# Extends the streak backwards, possibly joining an earlier run
+		return False
+	return True
+
+
+def _refresh_occasions(stats, using):
+	entries = Entry.objects.using(using).filter(user_id=stats.user_id)
+	bounds = entries.aggregate(first=Min("occasion"), last=Max("occasion"))
+	stats.first_occasion, stats.last_occasion = bounds["first"], bounds["last"]
+	stats.streak = streak(
+		entries.order_by("-occasion").values_list("occasion", flat=True).distinct().iterator()
+	)
+
+
+def streak(occasions):
+	""" Length of the run of consecutive days at the start of occasions,
+	which are distinct dates in descending order.
+	"""
+	length, previous = 0, None
+	for occasion in occasions:
+		if previous is not None and previous - occasion != timedelta(days=1):
+			break
+		length, previous = length + 1, occasion
+	return length
+
+
+def _fill(stats, rows):
+	""" Computes the statistics from scratch from (occasion, text) rows."""
+	chars = Counter()
+	stats.entry_count = stats.char_count = stats.word_count = 0
+	occasions = set()
+	for occasion, text in rows:
+		stats.entry_count += 1
+		stats.char_count += len(text)
+		stats.word_count += word_count(text)
+		chars.update(text)
+		occasions.add(occasion)
+	stats.char_counts = dict(chars)
+	stats.first_occasion = min(occasions, default=None)
+	stats.last_occasion = max(occasions, default=None)
+	stats.streak = streak(sorted(occasions, reverse=True))
+	return stats
+
+
+def get_stats(user, using="default"):
+	""" Returns the statistics of user, building them on first access."""
+	try:
+		return UserJournalStats.objects.using(using).get(user=user)
+	except UserJournalStats.DoesNotExist:
+		return rebuild_stats([user.pk], using=using)[0]
+
+
+def rebuild_stats(user_ids, using="default"):
+	""" Recomputes the statistics of the given users from their entries,
+	streamed in one query and written with one bulk insert.
+	"""
+	rows = (
+		Entry.objects.using(using).filter(user_id__in=user_ids).order_by("user_id")
+		.values_list("user_id", "occasion", "text").iterator(chunk_size=2000)
+	)
+	by_user = {user_id: UserJournalStats(user_id=user_id) for user_id in user_ids}
+	for user_id, user_rows in groupby(rows, key=itemgetter(0)):
+		_fill(by_user[user_id], (row[1:] for row in user_rows))
+	with transaction.atomic(using=using):
+		UserJournalStats.objects.using(using).filter(user_id__in=user_ids).delete()
+		UserJournalStats.objects.using(using).bulk_create(by_user.values())
+	return list(by_user.values())
+
+
+def current_streak(stats, today=None):
+	""" The streak is current if it reaches today or yesterday."""
+	today = today or date.today()
+	if stats.last_occasion is None or stats.last_occasion < today - timedelta(days=1):
+		return 0
+	return stats.streak
+
+
+def top_chars(stats, k=TOP_CHARS):
+	return Counter(stats.char_counts).most_common(k)
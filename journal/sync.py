@@ -0,0 +1,207 @@
+""" Delta sync of the journal for offline clients
+
+A client keeps the cursor of its last sync and asks for the changes since
+then: changes_since() returns the entries whose updated_at is newer, with
+their emotions, and the tombstones (EntryTombstone) of the entries deleted
+since. Changes of the emotion links move updated_at of their entries (see
+the journal signals), so one cursor covers both. The cursor is the newest
+timestamp returned, served by the (user, updated_at) indexes.
+
+apply_changes() applies a batch of client changes in one transaction, last
+write wins: a change replaces the stored entry only when the client made
+it after the stored version was made, by the updated_at of the change and
+Entry.changed_at, which keeps the client time of the changes applied here.
+updated_at of the entries stays the server time, the cursors depend on
+it. Clients must have roughly correct clocks.
+
+Tombstones are kept for settings.SYNC_TOMBSTONE_DAYS, a client whose cursor
+is older gets a full snapshot instead ("reset"). Moving a user to another
+shard renumbers the entries (journal.shards.move_user): the next delta
+deletes the old ids and returns the entries under their new ones.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from journal import batch, shards
+from journal.models import Entry, EntryTombstone
+
+# Statuses of applied changes
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+CONFLICT = "conflict"
+GONE = "gone"
+NOT_FOUND = "not_found"
+
+
+def page_size():
+	return getattr(settings, "SYNC_PAGE_SIZE", 500)
+
+
+def tombstone_retention():
+	return timedelta(days=getattr(settings, "SYNC_TOMBSTONE_DAYS", 90))
+
+
+def encode_cursor(moment):
+	return moment.isoformat() if moment is not None else None
+
+
+def decode_cursor(cursor):
+	""" Returns the aware datetime of cursor, None for an empty one.
+	Raises ValueError for an invalid one.
+	"""
+	if not cursor:
+		return None
+	moment = parse_datetime(cursor)
+	if moment is None:
+		raise ValueError("Invalid cursor %r." % cursor)
+	if timezone.is_naive(moment):
+		moment = timezone.make_aware(moment, timezone.utc)
+	return moment
+
+
+@dataclass
+class Delta:
+	entries: list = field(default_factory=list)
+	# (entry id, deleted at) pairs
+	deleted: list = field(default_factory=list)
+	cursor: datetime = None
+	has_more: bool = False
+	# The cursor was too old for the tombstones, this is a full snapshot
+	reset: bool = False
+
+
+def changes_since(user, since=None, limit=None, using=None):
+	""" Returns the Delta of user's journal after the cursor timestamp since,
+	at most about limit entries, oldest change first. Entries changed at the
+	same instant are never split over two deltas.
+	"""
+	using = using or shards.shard_for(user)
+	limit = limit or page_size()
+	reset = since is not None and since < timezone.now() - tombstone_retention()
+	if reset:
+		since = None
+	delta = Delta(cursor=since, reset=reset)
+	entries = Entry.objects.my_entries(user).using(using).prefetch_related("emotions").order_by("updated_at", "id")
+	if since is not None:
+		entries = entries.filter(updated_at__gt=since)
+	delta.entries = list(entries[:limit + 1])
+	until = None
+	if len(delta.entries) > limit:
+		delta.entries, delta.has_more = delta.entries[:limit], True
+		last = delta.entries[-1]
+		until = last.updated_at
+		delta.entries += list(entries.filter(updated_at=until, id__gt=last.pk))
+	if not delta.reset:
+		tombstones = EntryTombstone.objects.using(using).filter(user_id=user.pk)
+		if since is not None:
+			tombstones = tombstones.filter(deleted_at__gt=since)
+		if until is not None:
+			tombstones = tombstones.filter(deleted_at__lte=until)
+		delta.deleted = list(tombstones.order_by("deleted_at", "entry_id").values_list("entry_id", "deleted_at"))
+	moments = [entry.updated_at for entry in delta.entries] + [deleted_at for _, deleted_at in delta.deleted]
+	if moments:
+		delta.cursor = max(moments)
+	return delta
+
+
+@dataclass
+class Change:
+	""" A client change: a new entry without id, the new state of an
+	existing one, or its deletion. updated_at is when the client made it.
+	"""
+	updated_at: datetime
+	id: int = None
+	occasion: object = None
+	text: str = None
+	# Emotion instances, None to keep the stored ones
+	emotions: list = None
+	deleted: bool = False
+
+
+def apply_changes(user, changes, using=None):
+	""" Applies the Change list of user in one transaction, last write wins,
+	with journal.batch.write_entries(). Returns a (status, entry or None)
+	pair per change.
+	"""
+	using = using or shards.shard_for(user)
+	results = []
+	with transaction.atomic(using=using):
+		ids = [change.id for change in changes if change.id is not None]
+		stored = Entry.objects.my_entries(user).using(using).select_for_update().in_bulk(ids)
+		gone = set(
+			EntryTombstone.objects.using(using).filter(user_id=user.pk, entry_id__in=ids)
+			.values_list("entry_id", flat=True)
+		)
+		# Entry id -> its operation, repeated changes of an entry are merged
+		operations = {}
+		for change in changes:
+			results.append(_plan(user, change, stored, gone, operations))
+		batch.write_entries(user, list(operations.values()), using=using)
+	conflicts = [entry for status, entry in results if status == CONFLICT]
+	prefetch_related_objects(conflicts, "emotions")
+	return results
+
+
+def _plan(user, change, stored, gone, operations):
+	""" Adds the operation of change to operations, returns its result."""
+	emotions = [emotion.pk for emotion in change.emotions] if change.emotions is not None else None
+	fields = {name: getattr(change, name) for name in batch.FIELDS if getattr(change, name) is not None}
+	if change.id is None:
+		if change.deleted:
+			return NOT_FOUND, None
+		entry = Entry(**fields)
+		operations[id(entry)] = batch.Operation(
+			batch.CREATE, entry, emotions=emotions, changed_at=change.updated_at
+		)
+		return CREATED, entry
+	entry = stored.get(change.id)
+	if entry is None:
+		return (GONE, None) if change.id in gone else (NOT_FOUND, None)
+	planned = operations.get(entry.pk)
+	if change.updated_at <= (entry.changed_at or entry.updated_at) or (
+		planned is not None and change.updated_at < planned.changed_at
+	):
+		# The stored version, or an earlier change of the batch, is newer and wins
+		return CONFLICT, entry
+	if change.deleted:
+		operations[entry.pk] = batch.Operation(batch.DELETE, entry, changed_at=change.updated_at)
+		del stored[change.id]
+		gone.add(change.id)
+		return DELETED, None
+	operation = operations.setdefault(entry.pk, batch.Operation(batch.UPDATE, entry))
+	operation.changes.update(fields)
+	if emotions is not None:
+		operation.emotions = emotions
+	operation.changed_at = change.updated_at
+	return UPDATED, entry
+
+
+def add_tombstones(user_id, entry_ids, using=None):
+	""" Records the deletion of entry_ids of the user."""
+	now = timezone.now()
+	EntryTombstone.objects.using(using).bulk_create(
+		[EntryTombstone(user_id=user_id, entry_id=pk, deleted_at=now) for pk in entry_ids]
+	)
+
+
+def touch_entries(entries, using=None):
+	""" Moves updated_at and changed_at of the entries queryset to now, so
+	their changed emotions show up in the next delta. Returns the timestamp.
+	"""
+	now = timezone.now()
+	entries.using(using).update(updated_at=now, changed_at=now)
+	return now
+
+
+def prune_tombstones(older_than=None, using=None):
+	""" Deletes the tombstones past the retention. Returns their number."""
+	before = timezone.now() - (older_than if older_than is not None else tombstone_retention())
+	deleted, _ = EntryTombstone.objects.using(using).filter(deleted_at__lt=before).delete()
+	return deleted
@@ -0,0 +1,26 @@
+from datetime import date
+
+from factory import Faker, Sequence, SubFactory
+from factory.django import DjangoModelFactory
+
+from journal.models import Emotion, Entry
+from users.tests.factories import UserFactory
+
+
+class EmotionFactory(DjangoModelFactory):
+
+    name = Sequence(lambda n: f"emotion-{n}")
+
+    class Meta:
+        model = Emotion
+        django_get_or_create = ["name"]
+
+
+class EntryFactory(DjangoModelFactory):
+
+    user = SubFactory(UserFactory)
+    occasion = Faker("date_between", start_date=date(2020, 1, 1), end_date=date(2021, 12, 31))
+    text = Faker("paragraph", nb_sentences=5)
+
+    class Meta:
+        model = Entry
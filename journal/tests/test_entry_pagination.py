@@ -0,0 +1,59 @@
+import pytest
+from datetime import date, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from journal.api.pagination import EntryCursorPagination
+from journal.models import Entry
+from journal.tests.factories import EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _entries(user, days=5, per_day=3):
+    start = date(2021, 1, 1)
+    for day in range(days):
+        EntryFactory.create_batch(per_day, user=user, occasion=start + timedelta(days=day))
+
+
+def test_my_entries_after_keyset(user):
+    """ Walking the keyset yields every entry exactly once, in my_entries() order,
+    including entries that share an occasion.
+    """
+    _entries(user)
+    EntryFactory()  # another user's entry must not leak in
+    expected = list(Entry.objects.my_entries(user).values_list("occasion", "id"))
+    seen, after = [], None
+    while True:
+        page = list(Entry.objects.my_entries(user, after=after)[:4].values_list("occasion", "id"))
+        if not page:
+            break
+        seen.extend(page)
+        after = page[-1]
+    assert seen == expected
+    assert len(seen) == 15
+
+
+def test_cursor_pagination_pages(user):
+    _entries(user)
+    paginator = EntryCursorPagination()
+    factory = APIRequestFactory()
+    url, seen = "/api/entries/?page_size=4", []
+    while url:
+        request = Request(factory.get(url))
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.paginate_queryset(Entry.objects.my_entries(user), request)
+        # No COUNT(*), a single keyset query per page
+        assert len(queries) == 1
+        seen.extend(entry.pk for entry in page)
+        url = paginator.get_paginated_response([]).data["next"]
+    assert seen == list(Entry.objects.my_entries(user).values_list("id", flat=True))
+
+
+def test_cursor_pagination_invalid_cursor(user):
+    request = Request(APIRequestFactory().get("/api/entries/", {"cursor": "garbage"}))
+    with pytest.raises(NotFound):
+        EntryCursorPagination().paginate_queryset(Entry.objects.my_entries(user), request)
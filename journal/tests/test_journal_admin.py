@@ -0,0 +1,62 @@
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from journal.models import Entry
+from journal.tests.factories import EmotionFactory, EntryFactory
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _changelist_queries(client, rows):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/journal/entry/")
+    assert response.status_code == 200
+    assert len(response.context["cl"].result_list) == rows
+    return len(queries)
+
+
+def _entries(user, count):
+    joy, fear = EmotionFactory(name="joy"), EmotionFactory(name="fear")
+    for _ in range(count):
+        EntryFactory(user=user).emotions.add(joy, fear)
+
+
+@pytest.mark.parametrize("superuser", [True, False])
+def test_entry_changelist_query_count_is_constant(client, superuser):
+    user = UserFactory(is_superuser=superuser)
+    user.user_permissions.add(Permission.objects.get(codename="view_entry"))
+    client.force_login(user)
+    _entries(user, 2)
+    _changelist_queries(client, 2)  # loads the emotion registry
+    few = _changelist_queries(client, 2)
+    _entries(user, 20)
+    assert _changelist_queries(client, 22) == few
+
+
+def test_emotion_filter_from_registry(client, user):
+    user.is_superuser = True
+    user.save()
+    client.force_login(user)
+    _entries(user, 1)
+    EntryFactory(user=user)
+    response = client.get("/journal/entry/")
+    choices = response.context["cl"].filter_specs[0].choices(response.context["cl"])
+    assert [choice["display"] for choice in choices][1:] == ["fear", "joy"]
+    joy_id = EmotionFactory(name="joy").pk
+    response = client.get("/journal/entry/", {"emotions__id__exact": joy_id})
+    assert len(response.context["cl"].result_list) == 1
+
+
+def test_emotion_list_display(user):
+    _entries(user, 1)
+    user.is_superuser = True
+    request = RequestFactory().get("/journal/entry/")
+    request.user = user
+    admin = site._registry[Entry]
+    entry = admin.get_queryset(request).get()
+    assert admin._get_emotion_list(entry) == "fear, joy"
@@ -0,0 +1,69 @@
+import pytest
+from datetime import date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from journal.analytics import emotion_trends
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def emotions():
+    return EmotionFactory(name="joy"), EmotionFactory(name="fear")
+
+
+def test_trends_single_query_and_cached(user, emotions):
+    joy, fear = emotions
+    EntryFactory(user=user, occasion=date(2021, 3, 1)).emotions.add(joy, fear)
+    EntryFactory(user=user, occasion=date(2021, 3, 3)).emotions.add(joy)
+    EntryFactory(user=user, occasion=date(2021, 4, 2)).emotions.add(fear)
+    EntryFactory(occasion=date(2021, 3, 1)).emotions.add(joy)  # another user
+
+    with CaptureQueriesContext(connection) as queries:
+        series = emotion_trends(user, bucket="month")
+    assert len(queries) == 1
+    assert series == [
+        {"period": date(2021, 3, 1), "counts": {"fear": 1, "joy": 2}},
+        {"period": date(2021, 4, 1), "counts": {"fear": 1}},
+    ]
+    with CaptureQueriesContext(connection) as queries:
+        assert emotion_trends(user, bucket="month") == series
+    assert len(queries) == 0
+
+    assert emotion_trends(user, start=date(2021, 3, 2), end=date(2021, 3, 31), bucket="week") == [
+        {"period": date(2021, 3, 1), "counts": {"joy": 1}},
+    ]
+    assert emotion_trends(user, bucket="year", emotions=["fear"]) == [
+        {"period": date(2021, 1, 1), "counts": {"fear": 2}},
+    ]
+
+
+def test_trends_invalidation(user, emotions):
+    joy, fear = emotions
+    entry = EntryFactory(user=user, occasion=date(2021, 3, 1))
+    entry.emotions.add(joy)
+    assert emotion_trends(user)[0]["counts"] == {"joy": 1}
+
+    entry.emotions.add(fear)
+    assert emotion_trends(user)[0]["counts"] == {"fear": 1, "joy": 1}
+    fear.entry_set.remove(entry)
+    assert emotion_trends(user)[0]["counts"] == {"joy": 1}
+    joy.name = "bliss"
+    joy.save()
+    assert emotion_trends(user)[0]["counts"] == {"bliss": 1}
+    entry.delete()
+    assert emotion_trends(user) == []
+
+
+def test_trends_endpoint(user, emotions):
+    EntryFactory(user=user, occasion=date(2021, 3, 1)).emotions.add(emotions[0])
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get("/api/emotions/trends/", {"bucket": "month", "start": "2021-01-01"})
+    assert response.status_code == 200
+    assert response.data["series"] == [{"period": date(2021, 3, 1), "counts": {"joy": 1}}]
+    assert client.get("/api/emotions/trends/", {"bucket": "decade"}).status_code == 400
+    assert client.get("/api/emotions/trends/", {"start": "yesterday"}).status_code == 400
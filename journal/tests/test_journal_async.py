@@ -0,0 +1,102 @@
+from datetime import date
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.test import AsyncClient, override_settings
+
+from diary import profiling
+from journal.models import Entry
+from journal.tests.factories import EmotionFactory, EntryFactory
+from users.tests.factories import UserFactory
+
+# The pool threads use connections of their own, which only see committed data
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def user():
+    Group.objects.get_or_create(name="Normal User")
+    return UserFactory()
+
+
+def get(user, path):
+    # The async test client takes ASGI header names
+    return async_to_sync(AsyncClient().get)(path, authorization="Token %s" % user.auth_token.key)
+
+
+def post(user, path, data):
+    return async_to_sync(AsyncClient().post)(
+        path, data, content_type="application/json", authorization="Token %s" % user.auth_token.key
+    )
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+def test_async_list(user):
+    joy = EmotionFactory(name="joy")
+    for day in (1, 2, 3):
+        EntryFactory(user=user, occasion=date(2021, 1, day)).emotions.add(joy)
+    EntryFactory()
+    response = get(user, "/api/async/entries/?page_size=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert [entry["occasion"] for entry in data["results"]] == ["2021-01-03", "2021-01-02"]
+    assert data["results"][0]["emotions"] == ["joy"]
+    assert data["results"][0]["user"] == user.username
+    assert data["stats"]["entry_count"] == 3
+    assert data["emotions"] == ["joy"]
+    # Queries of the database threads are timed as well
+    assert 'db;dur=' in response["Server-Timing"] and 'desc="0 queries"' not in response["Server-Timing"]
+    response = get(user, data["next"])
+    assert [entry["occasion"] for entry in response.json()["results"]] == ["2021-01-01"]
+
+
+def test_async_create_and_detail(user):
+    EmotionFactory(name="joy")
+    response = post(user, "/api/async/entries/", {"text": "Hello", "occasion": "2021-02-01", "emotions": ["joy"]})
+    assert response.status_code == 201
+    entry = Entry.objects.get(user=user)
+    assert entry.text == "Hello"
+    response = get(user, "/api/async/entries/%d/" % entry.pk)
+    assert response.json()["emotions"] == ["joy"]
+    response = post(user, "/api/async/entries/", {"emotions": ["unknown"]})
+    assert response.status_code == 400
+    assert set(response.json()) == {"text", "emotions"}
+
+
+def test_async_requires_authentication(user):
+    other = EntryFactory()
+    # Like the REST framework views: SessionAuthentication comes first
+    response = async_to_sync(AsyncClient().get)("/api/async/entries/")
+    assert response.status_code == 403
+    assert "WWW-Authenticate" not in response
+    response = get(user, "/api/async/entries/%d/" % other.pk)
+    assert response.status_code == 404
+
+
+def test_async_unauthorized_with_token_authentication(settings):
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_AUTHENTICATION_CLASSES": ["users.authentication.CachedTokenAuthentication"],
+    }
+    response = async_to_sync(AsyncClient().get)("/api/async/entries/")
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == "Token"
+
+
+def test_async_profiling(tmp_path):
+    Group.objects.get_or_create(name="Normal User")
+    admin = UserFactory(is_superuser=True)
+    with override_settings(PROFILING_DIR=tmp_path):
+        response = get(admin, "/api/async/entries/?profile=1")
+        assert response.status_code == 200
+        assert (tmp_path / response["X-Profile"]).exists()
+        # Sync views under ASGI
+        response = get(admin, "/api/users/?profile=1")
+        assert response.status_code == 200
+        assert profiling.file_url_name(response["X-Profile"]) == "api_user-list"
+        # Checked before the view runs
+        response = get(UserFactory(), "/api/async/entries/?profile=1")
+        assert response.status_code == 200
+        assert "X-Profile" not in response
+        assert len(profiling.profiles()) == 2
@@ -0,0 +1,128 @@
+import pytest
+from datetime import date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from journal import search, stats, sync
+from journal.emotions import emotion_registry
+from journal.models import Entry, EntryTombstone, UserJournalStats
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+STATS_FIELDS = ["entry_count", "char_count", "word_count", "char_counts", "first_occasion", "last_occasion", "streak"]
+
+
+def _stats(user):
+    return UserJournalStats.objects.filter(user=user).values(*STATS_FIELDS).get()
+
+
+def _operations(entries, creates):
+    return [
+        {"action": "create", "client_id": "new-%d" % n, "text": "batch entry %d" % n, "emotions": ["joy", "calm"]}
+        for n in range(creates)
+    ] + [
+        {"action": "update", "id": entry.pk, "text": "updated %d" % entry.pk, "emotions": ["calm"]}
+        for entry in entries[::2]
+    ] + [
+        {"action": "delete", "id": entry.pk} for entry in entries[1::2]
+    ]
+
+
+def test_batch_write(api_client, user):
+    EmotionFactory(name="joy")
+    EmotionFactory(name="calm")
+    entries = EntryFactory.create_batch(4, user=user)
+    stats.get_stats(user)
+    cursor = sync.changes_since(user).cursor
+    response = api_client.post("/api/entries/batch/", _operations(entries, 2), format="json")
+    assert response.status_code == 200
+    results = response.data["results"]
+    assert [(result["action"], result["client_id"]) for result in results[:2]] == [
+        ("create", "new-0"), ("create", "new-1"),
+    ]
+    created = Entry.objects.get(pk=results[0]["id"])
+    assert (created.text, created.occasion) == ("batch entry 0", date.today())
+    assert sorted(e.name for e in created.emotions.all()) == ["calm", "joy"]
+    assert results[0]["entry"]["emotions"] == ["calm", "joy"]
+    updated = Entry.objects.get(pk=entries[0].pk)
+    assert updated.text == results[2]["entry"]["text"] == "updated %d" % entries[0].pk
+    assert [e.name for e in updated.emotions.all()] == ["calm"]
+    assert (results[4]["id"], results[4]["entry"]) == (entries[1].pk, None)
+    assert not Entry.objects.filter(pk__in=[entries[1].pk, entries[3].pk]).exists()
+    assert not Entry.emotions.through.objects.filter(entry_id__in=[entries[1].pk, entries[3].pk]).exists()
+
+    # Incremental statistics, the search index and the delta sync agree
+    incremental = _stats(user)
+    stats.rebuild_stats([user.pk])
+    assert incremental == _stats(user)
+    assert sorted(e.pk for e in search.search_entries(user, "batch")) == sorted(r["id"] for r in results[:2])
+    delta = sync.changes_since(user, cursor)
+    assert sorted(e.pk for e in delta.entries) == sorted([results[0]["id"], results[1]["id"], entries[0].pk, entries[2].pk])
+    assert sorted(pk for pk, _ in delta.deleted) == [entries[1].pk, entries[3].pk]
+    # The cached list sees the batch
+    assert len(api_client.get("/api/entries/").data["results"]) == 4
+
+
+def test_batch_write_query_count_is_constant(api_client, user, django_capture_on_commit_callbacks):
+    """ The queries do not grow with the number of operations."""
+    with django_capture_on_commit_callbacks(execute=True):
+        EmotionFactory(name="joy")
+        EmotionFactory(name="calm")
+    counts = []
+    for size in (4, 40):
+        entries = EntryFactory.create_batch(size, user=user)
+        stats.get_stats(user)
+        emotion_registry.names()  # Loaded once per process
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post("/api/entries/batch/", _operations(entries, size), format="json")
+        assert response.status_code == 200
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+
+def test_batch_write_validates_all(api_client, user):
+    entry = EntryFactory(user=user)
+    other = EntryFactory()
+    text = entry.text
+    response = api_client.post("/api/entries/batch/", [
+        {"action": "update", "id": entry.pk, "text": "Changed"},
+        {"action": "delete", "id": other.pk},
+    ], format="json")
+    assert response.status_code == 400
+    assert response.data[0] == {} and "id" in response.data[1]
+    response = api_client.post("/api/entries/batch/", [
+        {"action": "update", "id": entry.pk, "text": "Changed"},
+        {"action": "delete", "id": entry.pk},
+    ], format="json")
+    assert response.status_code == 400
+    response = api_client.post("/api/entries/batch/", [
+        {"action": "create", "text": "Fine"},
+        {"action": "create"},
+        {"action": "move", "id": entry.pk},
+    ], format="json")
+    assert response.status_code == 400
+    assert response.data[0] == {} and set(response.data[1]) == {"text"} and set(response.data[2]) == {"action"}
+    entry.refresh_from_db()
+    assert entry.text == text
+    assert Entry.objects.filter(user=user).count() == 1
+    assert not EntryTombstone.objects.exists()
+
+
+def test_batch_write_loads_in_its_transaction(api_client, user):
+    entry = EntryFactory(user=user)
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.post("/api/entries/batch/", [{"action": "delete", "id": entry.pk}], format="json")
+    assert response.status_code == 200
+    sql = [query["sql"] for query in queries]
+    begin = next(index for index, query in enumerate(sql) if query.startswith("SAVEPOINT"))
+    load = next(index for index, query in enumerate(sql) if query.startswith('SELECT "journal_entry"."id"'))
+    assert begin < load
+    assert not Entry.objects.filter(pk=entry.pk).exists()
+
+
+def test_batch_write_size_limit(api_client, settings):
+    settings.ENTRY_BATCH_MAX = 2
+    response = api_client.post("/api/entries/batch/", [{"action": "create", "text": "x"}] * 3, format="json")
+    assert response.status_code == 400
+    assert api_client.post("/api/entries/batch/", {"action": "create"}, format="json").status_code == 400
@@ -0,0 +1,68 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from diary import metrics
+from journal.tests.factories import EmotionFactory, EntryFactory
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _get(api_client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(url)
+    assert response.status_code == 200
+    return response.data, len(queries)
+
+
+def _assert_cache_invalidation(api_client, user):
+    entry = EntryFactory(user=user, text="Erster")
+    data, queries = _get(api_client, "/api/entries/")
+    assert queries > 0
+    assert _get(api_client, "/api/entries/") == (data, 0)
+    assert _get(api_client, "/api/entries/%d/" % entry.pk)[1] > 0
+    assert _get(api_client, "/api/entries/%d/" % entry.pk)[1] == 0
+
+    # Every kind of change is visible on the next read
+    entry.text = "Geändert"
+    entry.save()
+    assert _get(api_client, "/api/entries/")[0]["results"][0]["text"] == "Geändert"
+    assert _get(api_client, "/api/entries/%d/" % entry.pk)[0]["text"] == "Geändert"
+    joy = EmotionFactory(name="joy")
+    entry.emotions.add(joy)
+    assert _get(api_client, "/api/entries/")[0]["results"][0]["emotions"] == ["joy"]
+    joy.name = "bliss"
+    joy.save()
+    assert _get(api_client, "/api/entries/")[0]["results"][0]["emotions"] == ["bliss"]
+    EntryFactory()  # another user's change keeps this user's cache
+    assert _get(api_client, "/api/entries/")[1] == 0
+    entry.delete()
+    assert _get(api_client, "/api/entries/")[0]["results"] == []
+
+
+def test_entry_list_cache(api_client, user):
+    metrics.reset()
+    _assert_cache_invalidation(api_client, user)
+    assert metrics.get("journal.cache.hits") == 3
+    assert metrics.get("journal.cache.misses") == 7
+
+
+def test_entry_list_not_cached_in_local_memory(api_client, user, settings):
+    # Other worker processes would not see the invalidation
+    settings.CACHES = {**settings.CACHES, "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    metrics.reset()
+    EntryFactory(user=user)
+    data, queries = _get(api_client, "/api/entries/")
+    assert _get(api_client, "/api/entries/") == (data, queries)
+    assert metrics.get("journal.cache.misses") == 0
+
+
+def test_metrics_endpoint(api_client, user):
+    api_client.get("/api/entries/")
+    assert api_client.get("/api/metrics/").status_code == 403
+    admin = UserFactory(is_superuser=True)
+    api_client.force_authenticate(admin)
+    response = api_client.get("/api/metrics/")
+    assert response.status_code == 200
+    assert response.data["counters"]["journal.cache.misses"] >= 1
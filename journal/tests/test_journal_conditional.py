@@ -0,0 +1,97 @@
+import pytest
+from datetime import date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _get(api_client, url, etag=None, **headers):
+    if etag is not None:
+        headers["HTTP_IF_NONE_MATCH"] = etag
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(url, **headers)
+    return response, len(queries)
+
+
+def test_entry_list_not_modified(api_client, user, settings):
+    dummy = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    settings.CACHES = {"default": dummy, "shared": dummy}
+    EntryFactory.create_batch(3, user=user)
+    response, full = _get(api_client, "/api/entries/")
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert response.has_header("Last-Modified")
+
+    response, queries = _get(api_client, "/api/entries/", etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert not response.content
+    # The (id, updated_at) rows only, no prefetch
+    assert queries == 1 < full
+
+
+def test_entry_list_etag_changes(api_client, user):
+    entry = EntryFactory(user=user)
+    second = EntryFactory(user=user)
+    etag = _get(api_client, "/api/entries/")[0]["ETag"]
+    # Answered from the journal cache, without a query
+    response, queries = _get(api_client, "/api/entries/", etag)
+    assert (response.status_code, queries) == (304, 0)
+
+    entry.text = "Changed"
+    entry.save()
+    response = _get(api_client, "/api/entries/", etag)[0]
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    etag = response["ETag"]
+
+    entry.emotions.add(EmotionFactory())
+    response = _get(api_client, "/api/entries/", etag)[0]
+    assert response.status_code == 200
+    assert any(result["emotions"] for result in response.data["results"])
+    etag = response["ETag"]
+
+    second.delete()
+    response = _get(api_client, "/api/entries/", etag)[0]
+    assert response.status_code == 200
+    assert len(response.data["results"]) == 1
+
+    EntryFactory()  # another user's entry
+    assert _get(api_client, "/api/entries/", response["ETag"])[0].status_code == 304
+
+
+def test_entry_detail_not_modified(api_client, user):
+    entry = EntryFactory(user=user)
+    response = _get(api_client, "/api/entries/%d/" % entry.pk)[0]
+    etag = response["ETag"]
+    assert _get(api_client, "/api/entries/%d/" % entry.pk, etag)[0].status_code == 304
+    entry.emotions.add(EmotionFactory())
+    assert _get(api_client, "/api/entries/%d/" % entry.pk, etag)[0].status_code == 200
+    # Another user's entry stays hidden
+    other = EntryFactory()
+    assert _get(api_client, "/api/entries/%d/" % other.pk, etag)[0].status_code == 404
+
+
+def test_entry_list_pages_differ(api_client, user):
+    EntryFactory.create_batch(3, user=user)
+    first = api_client.get("/api/entries/", {"page_size": 2})
+    second = api_client.get(first.data["next"])
+    assert second.status_code == 200
+    assert second["ETag"] != first["ETag"]
+    etag = second["ETag"]
+    # A row after the page moves the next link of the page
+    EntryFactory(user=user, occasion=date(1990, 1, 1))
+    assert api_client.get(first.data["next"], HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_emotion_not_modified(api_client):
+    joy = EmotionFactory(name="joy")
+    response = _get(api_client, "/api/emotions/%d/" % joy.pk)[0]
+    assert _get(api_client, "/api/emotions/%d/" % joy.pk, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])[0].status_code == 304
+    etag = _get(api_client, "/api/emotions/")[0]["ETag"]
+    assert _get(api_client, "/api/emotions/", etag)[0].status_code == 304
+    EmotionFactory(name="anger")
+    assert _get(api_client, "/api/emotions/", etag)[0].status_code == 200
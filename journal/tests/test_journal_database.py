@@ -0,0 +1,46 @@
+import pytest
+from django.conf import settings
+from django.db import connection
+
+from diary.sqlite3.base import DatabaseWrapper
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def production(tmp_path):
+    wrapper = DatabaseWrapper(
+        {**connection.settings_dict, **settings.SQLITE_PRODUCTION, "NAME": str(tmp_path / "db.sqlite3")},
+        alias="production",
+    )
+    yield wrapper
+    wrapper.close()
+
+
+def pragma(wrapper, name):
+    with wrapper.cursor() as cursor:
+        cursor.execute("PRAGMA %s" % name)
+        return cursor.fetchone()[0]
+
+
+def test_production_pragmas(production):
+    assert pragma(production, "journal_mode") == "wal"
+    assert pragma(production, "synchronous") == 1
+    assert pragma(production, "busy_timeout") == 20000
+    assert pragma(production, "cache_size") == -64000
+    assert pragma(production, "temp_store") == 2
+
+
+def test_production_begins_immediate(production):
+    other = DatabaseWrapper({**production.settings_dict, "OPTIONS": {"timeout": 0}}, alias="other")
+    with production.cursor() as cursor:
+        cursor.execute("CREATE TABLE item (id integer primary key)")
+    production._start_transaction_under_autocommit()
+    try:
+        # The write lock is taken at BEGIN, before anything was written
+        with pytest.raises(Exception, match="locked"):
+            with other.cursor() as cursor:
+                cursor.execute("INSERT INTO item VALUES (1)")
+    finally:
+        production.cursor().execute("ROLLBACK")
+        other.close()
@@ -0,0 +1,64 @@
+import pytest
+from datetime import date, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework.test import APIClient
+
+from journal.api.pagination import EntryCursorPagination
+from journal.models import Emotion, Entry
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _bulk_entries(user, count, emotions):
+    """ Creates `count` entries with two emotions each in a few queries."""
+    start = date(2000, 1, 1)
+    Entry.objects.bulk_create(
+        Entry(user=user, occasion=start + timedelta(days=n), text=f"entry {n}")
+        for n in range(count)
+    )
+    Through = Entry.emotions.through
+    Through.objects.bulk_create(
+        Through(entry_id=pk, emotion_id=emotion.pk)
+        for pk in Entry.objects.filter(user=user).values_list("pk", flat=True)
+        for emotion in emotions
+    )
+
+
+def test_entry_urls():
+    assert reverse("api:entry-list") == "/api/entries/"
+    assert resolve("/api/entries/").view_name == "api:entry-list"
+    assert reverse("api:emotion-list") == "/api/emotions/"
+
+
+def test_entry_create_and_scope(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    EmotionFactory(name="joy")
+    EntryFactory()  # another user's entry
+    response = client.post("/api/entries/", {"text": "Hello", "emotions": ["joy"]}, format="json")
+    assert response.status_code == 201
+    assert response.data["user"] == user.username
+    assert response.data["occasion"] == date.today().isoformat()
+    response = client.get("/api/entries/")
+    assert [e["text"] for e in response.data["results"]] == ["Hello"]
+    assert response.data["results"][0]["emotions"] == ["joy"]
+
+
+@pytest.mark.parametrize("rows", [10, 100, 1000])
+def test_entry_list_query_count_is_constant(user, rows, monkeypatch):
+    """ Listing a page of entries must not issue a query per row (N+1)."""
+    monkeypatch.setattr(EntryCursorPagination, "max_page_size", 1000)
+    emotions = [EmotionFactory(), EmotionFactory()]
+    _bulk_entries(user, rows, emotions)
+    client = APIClient()
+    client.force_authenticate(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/entries/", {"page_size": rows})
+    assert response.status_code == 200
+    assert len(response.data["results"]) == rows
+    assert len(response.data["results"][-1]["emotions"]) == 2
+    # Entries joined with their user, plus one prefetch for the emotions
+    assert len(queries) == 2
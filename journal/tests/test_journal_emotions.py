@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from journal import cache
+from journal.emotions import VERSION_KEY, emotion_registry
+from journal.models import Emotion
+from journal.tests.factories import EmotionFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_registry_loads_once(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        joy = EmotionFactory(name="joy")
+        EmotionFactory(name="anger")
+    assert emotion_registry.names() == ["anger", "joy"]
+    with CaptureQueriesContext(connection) as queries:
+        assert emotion_registry.id_for("joy") == joy.pk
+        assert emotion_registry.name_for(joy.pk) == "joy"
+        assert emotion_registry.get("joy").pk == joy.pk
+        assert emotion_registry.id_for("awe") is None
+    assert len(queries) == 0
+    with pytest.raises(Emotion.DoesNotExist):
+        emotion_registry.get("awe")
+
+
+def test_registry_follows_changes(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        joy = EmotionFactory(name="joy")
+    assert emotion_registry.names() == ["joy"]
+    with django_capture_on_commit_callbacks(execute=True):
+        joy.name = "bliss"
+        joy.save()
+    assert emotion_registry.names() == ["bliss"]
+    # A change made by another process, only the shared stamp moves
+    Emotion.objects.bulk_create([Emotion(name="awe")])
+    assert emotion_registry.names() == ["bliss"]
+    cache.bump(VERSION_KEY)
+    emotion_registry.check()
+    assert emotion_registry.names() == ["awe", "bliss"]
+
+
+def test_registry_changes_wait_for_the_commit(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        EmotionFactory(name="joy")
+    assert emotion_registry.names() == ["joy"]
+    stamp = cache.version(VERSION_KEY)
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            EmotionFactory(name="ghost")
+            # The writer sees its change, nobody else is told yet
+            assert emotion_registry.names() == ["ghost", "joy"]
+            assert cache.version(VERSION_KEY) == stamp
+            raise RuntimeError
+    assert emotion_registry.names() == ["joy"]
+    assert cache.version(VERSION_KEY) == stamp
+
+
+def test_other_threads_keep_the_committed_emotions(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        EmotionFactory(name="joy")
+    assert emotion_registry.names() == ["joy"]
+    seen = []
+    with django_capture_on_commit_callbacks(execute=True):
+        EmotionFactory(name="awe")
+        assert emotion_registry.names() == ["awe", "joy"]
+        # Served from the committed map, without a query
+        thread = threading.Thread(target=lambda: seen.append(emotion_registry.names()))
+        thread.start()
+        thread.join()
+        with CaptureQueriesContext(connection) as queries:
+            emotion_registry.id_for("awe"), emotion_registry.id_for("joy")
+        assert len(queries) == 0
+    assert seen == [["joy"]]
+    assert emotion_registry.names() == ["awe", "joy"]
+
+
+def test_serializer_resolves_names_without_queries(user):
+    EmotionFactory(name="joy"), EmotionFactory(name="fear")
+    client = APIClient()
+    client.force_authenticate(user)
+    client.get("/api/emotions/")  # any request, loads the registry lazily
+    emotion_registry.names()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post("/api/entries/", {"text": "Hallo", "emotions": ["joy", "fear"]}, format="json")
+    assert response.status_code == 201
+    assert sorted(response.data["emotions"]) == ["fear", "joy"]
+    assert not any('FROM "journal_emotion" WHERE' in query["sql"] for query in queries)
+    response = client.post("/api/entries/", {"text": "Hallo", "emotions": ["awe"]}, format="json")
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+import pytest
+from datetime import date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from journal.exporter import export_entries
+from journal.models import Entry
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def entries(user):
+    joy, fear = EmotionFactory(name="joy"), EmotionFactory(name="fear")
+    entries = [EntryFactory(user=user, occasion=date(2021, 1, day)) for day in range(1, 8)]
+    entries[0].emotions.add(joy, fear)
+    return entries
+
+
+def test_export_ndjson_queries_per_chunk(user, entries):
+    with CaptureQueriesContext(connection) as queries:
+        lines = "".join(export_entries(Entry.objects.my_entries(user), "ndjson", chunk_size=3)).splitlines()
+    # The entries, plus one emotion query per chunk of 3
+    assert len(queries) == 1 + 3
+    rows = [json.loads(line) for line in lines]
+    assert [row["id"] for row in rows] == [entry.pk for entry in reversed(entries)]
+    assert rows[-1]["emotions"] == ["fear", "joy"]
+    assert rows[-1]["occasion"] == "2021-01-01"
+
+
+def test_export_csv_and_markdown(user, entries):
+    rows = list(csv.DictReader(io.StringIO("".join(export_entries(Entry.objects.my_entries(user), "csv")))))
+    assert len(rows) == 7
+    assert rows[-1]["emotions"] == "fear, joy"
+    markdown = "".join(export_entries(Entry.objects.my_entries(user), "markdown", title="Mein Tagebuch"))
+    assert markdown.startswith("# Mein Tagebuch\n")
+    assert "## 2021-01-01\n\n%s\n\n*fear, joy*\n" % entries[0].text.strip() in markdown
+
+
+def test_export_endpoint_streams(user, entries):
+    EntryFactory()  # another user's entry
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get("/api/entries/export/", {"fmt": "ndjson"})
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Disposition"] == 'attachment; filename="journal-%s.ndjson"' % user.username
+    assert len(b"".join(response.streaming_content).splitlines()) == 7
+    assert client.get("/api/entries/export/", {"fmt": "pdf"}).status_code == 400
+
+
+def test_export_admin_action(client, user, entries):
+    user.is_superuser = True
+    user.save()
+    client.force_login(user)
+    response = client.post("/journal/entry/", {
+        "action": "export_csv",
+        "_selected_action": [entry.pk for entry in entries[:2]],
+    })
+    assert response.streaming
+    assert len(b"".join(response.streaming_content).decode().splitlines()) == 3
@@ -5,7 +5,7 @@ from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from users.tests.factories import UserFactory
 from factory import Faker
-from journal.diary.models import Entry, Emotion
+from journal.models import Entry, Emotion
 
 User = get_user_model()
 
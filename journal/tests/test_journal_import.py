@@ -0,0 +1,94 @@
+import io
+import json
+import pytest
+from datetime import date
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from journal import search
+from journal.importer import import_entries
+from journal.models import Emotion, Entry, UserJournalStats
+from journal.tests.factories import EmotionFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _jsonl(rows):
+    return io.BytesIO("\n".join(json.dumps(row) for row in rows).encode("utf-8"))
+
+
+def test_import_jsonl(user):
+    EmotionFactory(name="joy"), EmotionFactory(name="fear")
+    rows = [
+        {"occasion": "2021-01-0%d" % (n % 9 + 1), "text": "Eintrag %d" % n, "emotions": ["joy", "fear"]}
+        for n in range(50)
+    ]
+    rows[3] = {"text": "", "emotions": []}
+    rows[7] = {"text": "Unbekannt", "emotions": ["awe"]}
+    stream = io.BytesIO(_jsonl(rows).getvalue() + b'\nnot json\n{"text": "Heute"}')
+
+    with CaptureQueriesContext(connection) as queries:
+        result = import_entries(user, stream, batch_size=20)
+    # Independent of the number of rows: a few queries per batch of 20
+    assert len(queries) < 60
+
+    assert result.created == 49
+    assert [line for line, _ in result.errors] == [4, 8, 51]
+    assert "Unknown emotions: awe" in result.errors[1][1]
+    assert Entry.objects.filter(user=user).count() == 49
+    assert Entry.emotions.through.objects.count() == 96
+    entry = Entry.objects.get(user=user, text="Eintrag 49")
+    assert sorted(entry.emotions.values_list("name", flat=True)) == ["fear", "joy"]
+    # Entry.save default for the occasion is applied
+    assert Entry.objects.get(user=user, text="Heute").occasion == date.today()
+    # Bulk writes reached the search index and the statistics
+    assert len(search.search_entries(user, "Eintrag", limit=100)) == 48
+    assert UserJournalStats.objects.get(user=user).entry_count == 49
+
+
+def test_import_csv_command(user, tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text('occasion,text,emotions\n2021-02-01,"Erster, Tag","joy, awe"\n', encoding="utf-8")
+    call_command("import_entries", user.username, str(path), "--create-emotions")
+    entry = Entry.objects.get(user=user)
+    assert entry.text == "Erster, Tag"
+    assert sorted(entry.emotions.values_list("name", flat=True)) == ["awe", "joy"]
+    assert Emotion.objects.count() == 2
+
+
+def test_import_endpoint(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    upload = SimpleUploadedFile("diary.jsonl", _jsonl([{"text": "A"}, {"text": "B"}]).getvalue())
+    response = client.post("/api/entries/import/", {"file": upload}, format="multipart")
+    assert response.status_code == 201
+    assert response.data["created"] == 2
+    assert response.data["errors"] == []
+    assert client.post("/api/entries/import/", {}, format="multipart").status_code == 400
+
+
+def test_import_invalid_values(user):
+    stream = io.BytesIO(
+        b'{"text": "A", "occasion": 5}\n'
+        b'{"text": ["B"]}\n'
+        b'{"text": "C\xff"}\n'
+        b'{"text": "D", "occasion": "2021-13-45"}\n'
+        b'{"text": "E"}\n'
+    )
+    result = import_entries(user, stream)
+    assert result.created == 1
+    assert [line for line, _ in result.errors] == [1, 2, 3, 4]
+    assert result.errors[0][1] == "occasion must be a string"
+    assert result.errors[2][1] == "Invalid UTF-8"
+    assert Entry.objects.get(user=user).text == "E"
+
+
+def test_import_csv_invalid_utf8(user):
+    # A byte order mark, and a value spanning lines 3 and 4
+    stream = io.BytesIO(b'\xef\xbb\xbftext,occasion\nA,2021-01-01\n"B\xff\nC",2021-01-02\nD,\n')
+    result = import_entries(user, stream, format="csv")
+    assert result.errors == [(4, "Invalid UTF-8")]
+    assert sorted(Entry.objects.filter(user=user).values_list("text", flat=True)) == ["A", "D"]
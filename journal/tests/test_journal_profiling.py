@@ -0,0 +1,86 @@
+import pytest
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from diary import profiling
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def profiling_dir(tmp_path):
+    with override_settings(PROFILING_DIR=tmp_path):
+        yield tmp_path
+
+
+def _client(user):
+    # Authenticated like real requests: the middleware checks the user before the view
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token %s" % user.auth_token.key)
+    return client
+
+
+def test_superusers_request_profiles(profiling_dir):
+    client = _client(UserFactory(is_superuser=True))
+    assert "X-Profile" not in client.get("/api/users/")
+    response = client.get("/api/users/?profile=1")
+    assert response.status_code == 200
+    assert response.json()["results"]
+    assert profiling.file_url_name(response["X-Profile"]) == "api_user-list"
+    assert (profiling_dir / response["X-Profile"]).exists()
+
+    response = client.get("/api/entries/", HTTP_X_PROFILE="1")
+    assert profiling.file_url_name(response["X-Profile"]) == "api_entry-list"
+    assert len(profiling.profiles()) == 2
+
+    session = APIClient()
+    session.force_login(UserFactory(is_superuser=True))
+    assert "X-Profile" in session.get("/api/users/?profile=1")
+
+
+def test_other_users_cannot_profile(user, profiling_dir):
+    # Every user is staff (users.signals)
+    assert user.is_staff
+    response = _client(user).get("/api/users/?profile=1")
+    assert response.status_code == 200
+    assert "X-Profile" not in response
+    assert not list(profiling_dir.iterdir())
+
+
+def test_anonymous_requests_not_profiled(user, profiling_dir, monkeypatch):
+    def profile(*args):
+        raise AssertionError("profiled")
+
+    monkeypatch.setattr(profiling.ProfilingMiddleware, "profile", profile)
+    assert APIClient().get("/api/users/?profile=1").status_code == 403
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token invalid")
+    assert client.get("/api/users/", HTTP_X_PROFILE="1").status_code == 403
+    assert _client(user).get("/api/users/?profile=1").status_code == 200
+
+
+def test_sampled_profiles_and_retention(user):
+    client = _client(user)
+    with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_FILES=2):
+        for _ in range(3):
+            assert "X-Profile" in client.get("/api/entries/")
+    assert len(profiling.profiles()) == 2
+    with override_settings(PROFILING_MAX_AGE=-1):
+        profiling.prune()
+    assert profiling.profiles() == []
+
+
+def test_profile_summary_command(capsys):
+    client = _client(UserFactory(is_superuser=True))
+    with pytest.raises(CommandError):
+        call_command("profile_summary")
+    client.get("/api/users/?profile=1")
+    client.get("/api/entries/?profile=1")
+    call_command("profile_summary", limit=5)
+    output = capsys.readouterr().out
+    assert output.startswith("2 profiles")
+    assert "function calls" in output
+    call_command("profile_summary", url_name="api:entry-list", sort="cumulative")
+    assert capsys.readouterr().out.startswith("1 profiles")
@@ -0,0 +1,92 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from diary.routers import PIN_KEY, ReplicaRouter, ReplicaRouterMiddleware, pin_user, read_primary
+from journal.models import Emotion, Entry
+
+User = get_user_model()
+
+router = ReplicaRouter()
+
+# The test database wraps every django_db test in a transaction, where all
+# reads go to "default": only test_reads_in_transaction_go_to_default uses it.
+user = User(pk=1, username="alice")
+other_user = User(pk=2, username="bob")
+
+
+@pytest.fixture(autouse=True)
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ["replica"]
+
+
+def within_request(user, view):
+    request = RequestFactory().get("/")
+    request.user = user
+    return ReplicaRouterMiddleware(lambda request: view())(request)
+
+
+def test_reads_go_to_replica():
+    assert router.db_for_read(Entry) == "replica"
+    assert router.db_for_read(Emotion) == "replica"
+    # Not routed: tokens are read for authentication, right after their creation
+    assert router.db_for_read(Token) is None
+    entry = Entry(pk=1)
+    entry._state.db = "replica"
+    assert router.db_for_write(Entry, instance=entry) == "default"
+
+
+def test_writes_keep_the_database_of_other_instances():
+    # Django's default: "default", or the database (shard) of the instance
+    assert router.db_for_write(Entry) is None
+    entry = Entry(pk=1)
+    entry._state.db = "shard1"
+    assert router.db_for_write(Entry, instance=entry) is None
+
+
+def test_cache_fills_read_default():
+    with read_primary():
+        assert router.db_for_read(Entry) == "default"
+        assert within_request(user, lambda: router.db_for_read(Entry)) == "default"
+    assert router.db_for_read(Entry) == "replica"
+
+
+def test_no_replicas(settings):
+    settings.DATABASE_REPLICAS = []
+    assert router.db_for_read(Entry) is None
+
+
+@pytest.mark.django_db
+def test_reads_in_transaction_go_to_default():
+    with transaction.atomic():
+        assert router.db_for_read(Entry) == "default"
+
+
+def test_reads_after_write_in_request():
+    def view():
+        assert router.db_for_read(Entry) == "replica"
+        router.db_for_write(Entry)
+        assert router.db_for_read(Entry) == "default"
+        return "response"
+
+    assert within_request(user, view) == "response"
+
+
+def test_user_pinned_after_write():
+    within_request(user, lambda: router.db_for_write(Entry))
+    assert within_request(user, lambda: router.db_for_read(Entry)) == "default"
+    assert within_request(other_user, lambda: router.db_for_read(Entry)) == "replica"
+    # Outside of requests nobody is pinned
+    assert router.db_for_read(Entry) == "replica"
+    # Where the other worker processes see it
+    assert caches["shared"].get(PIN_KEY % user.pk) is not None
+    assert caches["default"].get(PIN_KEY % user.pk) is None
+
+
+@override_settings(REPLICA_PIN_SECONDS=0)
+def test_pin_expires():
+    pin_user(user.pk)
+    assert within_request(user, lambda: router.db_for_read(Entry)) == "replica"
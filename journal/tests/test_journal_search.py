@@ -0,0 +1,67 @@
+import pytest
+from rest_framework.test import APIClient
+
+from journal import search
+from journal.models import Entry
+from journal.tests.factories import EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_match_expression_escapes_syntax():
+    assert search.match_expression('NEAR("x" OR y*') == 'text : ("NEAR" "x" "OR" "y"*)'
+    assert search.match_expression("Park", user_id=3) == 'owner : "u3" AND text : ("Park"*)'
+    assert search.match_expression("!?") is None
+
+
+def test_snippets_are_escaped(user):
+    EntryFactory(user=user, text="<b>Park</b> & <script>")
+    [entry] = search.search_entries(user, "script")
+    assert entry.snippet == "&lt;b&gt;Park&lt;/b&gt; &amp; &lt;<mark>script</mark>&gt;"
+
+
+def test_search_is_scoped_ranked_and_synced(user):
+    best = EntryFactory(user=user, text="Park Park, ein Tag im Park")
+    other = EntryFactory(user=user, text="Heute waren wir im Park spazieren und dann Kaffee trinken")
+    EntryFactory(user=user, text="Nichts besonderes")
+    EntryFactory(text="Auch ein anderer Nutzer war im Park")
+
+    results = search.search_entries(user, "park")
+    assert [entry.pk for entry in results] == [best.pk, other.pk]
+    assert "<mark>Park</mark>" in results[0].snippet
+
+    other.text = "Heute nur Kaffee"
+    other.save()
+    assert [entry.pk for entry in search.search_entries(user, "park")] == [best.pk]
+    best.delete()
+    assert search.search_entries(user, "park") == []
+    # Prefix match on the last word, umlauts folded
+    assert [e.pk for e in search.search_entries(user, "kaff")] == [other.pk]
+
+
+def test_rebuild_index(user):
+    Entry.objects.bulk_create([Entry(user=user, occasion="2021-01-01", text="bulk geschrieben")])
+    assert search.search_entries(user, "bulk") == []
+    search.rebuild_index()
+    assert len(search.search_entries(user, "bulk")) == 1
+
+
+def test_search_endpoint(user):
+    EntryFactory(user=user, text="Glücklicher Tag am See")
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get("/api/entries/search/", {"q": "gluck"})
+    assert response.status_code == 200
+    assert response.data[0]["snippet"] == "<mark>Glücklicher</mark> Tag am See"
+
+
+def test_admin_search(client, user):
+    user.is_superuser = True
+    user.save()
+    EntryFactory(user=user, text="Ein Tag am See")
+    EntryFactory(user=user, text="Ein Tag im Büro")
+    client.force_login(user)
+    response = client.get("/journal/entry/", {"q": "see"})
+    assert [entry.text for entry in response.context["cl"].result_list] == ["Ein Tag am See"]
+    response = client.get("/journal/entry/", {"q": user.username})
+    assert len(response.context["cl"].result_list) == 2
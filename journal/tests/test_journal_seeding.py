@@ -0,0 +1,71 @@
+import pytest
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from journal import search, seeding
+from journal.models import Emotion, Entry, UserJournalStats
+
+pytestmark = pytest.mark.django_db
+
+
+def _generate(seed):
+    generator = seeding.EntryGenerator({1: 3, 2: 1}, seed=seed)
+    return [
+        (entry.occasion, entry.text, emotions)
+        for user_id in (1, 2) for entry, emotions in generator.entries(user_id, 30)
+    ]
+
+
+def test_generation_is_deterministic():
+    assert _generate(7) == _generate(7)
+    assert _generate(7) != _generate(8)
+    assert seeding.user_rows(5, seed=3) == seeding.user_rows(5, seed=3)
+    assert len({row["username"] for row in seeding.user_rows(200)}) == 200
+
+
+def test_generated_entries_are_realistic():
+    rows = _generate(0)
+    occasions = [occasion for occasion, _, _ in rows[:30]]
+    assert occasions == sorted(occasions, reverse=True)
+    assert all(seeding.FIRST_DAY <= occasion <= seeding.LAST_DAY for occasion in occasions)
+    assert len({len(text) for _, text, _ in rows}) > 10
+    assert {len(emotions) for _, _, emotions in rows} >= {0, 1, 2}
+
+
+def test_seed_journal():
+    with CaptureQueriesContext(connection) as queries:
+        result = seeding.seed_journal(users=6, entries=25, seed=1, batch_size=40)
+    # A few queries per batch of 40 entries, none per row
+    assert len(queries) < 60
+
+    assert (result.users, result.entries) == (6, 150)
+    assert Entry.objects.count() == 150
+    assert Entry.emotions.through.objects.count() == result.emotion_links
+    assert set(Emotion.objects.values_list("name", flat=True)) == {name for name, _ in seeding.EMOTIONS}
+    stats = UserJournalStats.objects.select_related("user")
+    assert [item.entry_count for item in stats] == [25] * 6
+    entry = Entry.objects.select_related("user").first()
+    word = entry.text.split()[0].strip(".")
+    assert entry in search.search_entries(entry.user, word, limit=100)
+
+    again = seeding.seed_journal(users=6, entries=25, seed=1)
+    assert (again.users, again.skipped_users, again.entries) == (0, 6, 0)
+
+
+def test_seed_journal_command(capsys):
+    call_command("seed_journal", users=2, entries=3, seed=5)
+    assert Entry.objects.count() == 6
+    assert "Created 2 users (0 skipped), 6 entries" in capsys.readouterr().out
+
+
+@pytest.mark.django_db(databases=["default", "shard1"])
+def test_seed_journal_other_database():
+    # Users go to the Normal User group of that database
+    Group.objects.using("shard1").get_or_create(name="Normal User")
+    result = seeding.seed_journal(users=2, entries=3, seed=2, using="shard1")
+    assert result.entries == 6
+    assert Entry.objects.using("shard1").count() == 6
+    assert Emotion.objects.using("shard1").exists()
+    assert not Emotion.objects.using("default").exists()
@@ -0,0 +1,188 @@
+from datetime import date
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from journal import shards, sync
+from journal.models import Entry, EntryTombstone, UserJournalStats
+from journal.tests.factories import EmotionFactory
+from users.provisioning import provision_users
+from users.tests.factories import UserFactory
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db(databases=["default", "shard1"])
+
+
+@pytest.fixture(autouse=True)
+def sharded(settings):
+    settings.ENTRY_SHARDS = ["default", "shard1"]
+    shards.init_id_range("shard1")
+
+
+def write(user, occasion, text="Dear diary", emotions=()):
+    # EntryFactory saves on "default" explicitly
+    entry = Entry.objects.create(user=user, occasion=occasion, text=text)
+    entry.emotions.add(*emotions)
+    return entry
+
+
+def test_entries_live_on_the_user_shard():
+    user = UserFactory(shard="shard1")
+    joy = EmotionFactory(name="joy")
+    entry = write(user, date(2021, 1, 1), emotions=[joy])
+    assert entry._state.db == "shard1"
+    assert shards.shard_of_pk(entry.pk) == "shard1"
+    assert not Entry.objects.using("default").exists()
+    [stored] = Entry.objects.my_entries(user).prefetch_related("emotions")
+    assert stored == entry
+    assert [emotion.name for emotion in stored.emotions.all()] == ["joy"]
+    assert stored.user.username == user.username
+    assert UserJournalStats.objects.using("shard1").get(user_id=user.pk).entry_count == 1
+
+
+def test_placement_pinned_at_creation(settings):
+    first, second, third = UserFactory(), UserFactory(), UserFactory()
+    assert {first.shard, second.shard} == {"default", "shard1"}
+    assert third.shard in ("default", "shard1")
+    assert User.objects.get(pk=first.pk).shard == first.shard
+    # Users without a shard stay on the first one, adding a shard moves nobody
+    legacy = User(pk=first.pk + 100, username="legacy")
+    assert shards.shard_for(legacy) == "default"
+    settings.ENTRY_SHARDS = ["default", "shard1", "shard2"]
+    assert shards.shard_for(first) == first.shard
+    assert shards.shard_for(legacy) == "default"
+
+
+def test_placement_counts_once():
+    UserFactory()
+    with CaptureQueriesContext(connections["default"]) as queries:
+        users = [UserFactory() for _ in range(4)]
+    assert not any("GROUP BY" in query["sql"] for query in queries)
+    assert sorted(user.shard for user in users) == ["default", "default", "shard1", "shard1"]
+
+
+def test_provisioned_users_pinned():
+    UserFactory(shard="shard1")
+    provision_users([{"username": "user%d" % n} for n in range(3)])
+    shards_of = dict(User.objects.filter(username__startswith="user").values_list("username", "shard"))
+    assert sorted(shards_of.values()) == ["default", "default", "shard1"]
+
+
+def test_my_entries_of_user_id():
+    user = UserFactory(shard="shard1")
+    entry = write(user, date(2021, 1, 1))
+    assert list(Entry.objects.my_entries(user.pk)) == [entry]
+    assert list(Entry.objects.my_entries(user)) == [entry]
+
+
+def test_api_on_shard():
+    user = UserFactory(shard="shard1")
+    EmotionFactory(name="joy")
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post(
+        "/api/entries/", {"text": "Sunny walk", "occasion": "2021-05-01", "emotions": ["joy"]}, format="json"
+    )
+    assert response.status_code == 201
+    assert Entry.objects.using("shard1").filter(user_id=user.pk).count() == 1
+    assert [entry["text"] for entry in client.get("/api/entries/").data["results"]] == ["Sunny walk"]
+    assert [entry["text"] for entry in client.get("/api/entries/search/?q=sunny").data] == ["Sunny walk"]
+    assert client.get("/api/entries/stats/").data["entry_count"] == 1
+    assert client.delete(response.data["url"]).status_code == 204
+    assert not Entry.objects.using("shard1").exists()
+
+
+def test_admin_fans_out(client):
+    admin = UserFactory(is_superuser=True)
+    first, second = UserFactory(shard="default"), UserFactory(shard="shard1")
+    entries = [
+        write(first, date(2021, 1, 3)), write(second, date(2021, 1, 2)),
+        write(second, date(2021, 1, 4)), write(first, date(2021, 1, 1)),
+    ]
+    client.force_login(admin)
+    response = client.get("/journal/entry/?o=3")
+    assert response.status_code == 200
+    assert response.context["cl"].result_count == 4
+    assert [entry.occasion for entry in response.context["cl"].result_list] == sorted(
+        entry.occasion for entry in entries
+    )
+    assert client.get("/journal/entry/%d/change/" % entries[1].pk).status_code == 200
+
+
+def test_move_user():
+    user = UserFactory(shard="default")
+    joy, fear = EmotionFactory(name="joy"), EmotionFactory(name="fear")
+    entries = [write(user, date(2021, 1, day), emotions=[joy, fear][:day]) for day in (1, 2)]
+    call_command("rebalance_shards", user.username, "shard1")
+    user.refresh_from_db()
+    assert user.shard == "shard1"
+    assert not Entry.objects.using("default").exists()
+    assert not UserJournalStats.objects.using("default").exists()
+    moved = list(Entry.objects.my_entries(user).prefetch_related("emotions"))
+    assert [entry.occasion for entry in moved] == [date(2021, 1, 2), date(2021, 1, 1)]
+    assert all(shards.shard_of_pk(entry.pk) == "shard1" for entry in moved)
+    assert [entry.created_at for entry in moved] == [entry.created_at for entry in reversed(entries)]
+    assert [sorted(e.name for e in entry.emotions.all()) for entry in moved] == [["fear", "joy"], ["joy"]]
+    assert UserJournalStats.objects.using("shard1").get(user_id=user.pk).entry_count == 2
+
+
+def test_move_user_interrupted(monkeypatch):
+    user = UserFactory(shard="default")
+    kept = write(user, date(2021, 1, 1))
+    sync_emotions = shards.sync_emotions
+
+    def write_during_the_move():
+        sync_emotions()
+        write(user, date(2021, 1, 2))
+
+    monkeypatch.setattr(shards, "sync_emotions", write_during_the_move)
+    with pytest.raises(shards.MoveInterrupted):
+        shards.move_user(user, "shard1")
+    user.refresh_from_db()
+    assert user.shard == "default"
+    assert Entry.objects.using("default").filter(pk=kept.pk).exists()
+    assert not Entry.objects.using("shard1").exists()
+    assert not EntryTombstone.objects.using("shard1").exists()
+
+
+def test_move_user_delta_sync():
+    user = UserFactory(shard="default")
+    kept, deleted = write(user, date(2021, 1, 1)), write(user, date(2021, 1, 2))
+    deleted_pk = deleted.pk
+    deleted.delete()
+    cursor = sync.changes_since(user).cursor
+    shards.move_user(user, "shard1")
+    assert not EntryTombstone.objects.using("default").exists()
+    # The moved entries replace the old ids in the client's next delta
+    delta = sync.changes_since(user, cursor)
+    assert not delta.reset
+    [moved] = delta.entries
+    assert moved.pk != kept.pk and moved.text == kept.text
+    assert sorted(pk for pk, _ in delta.deleted) == [kept.pk]
+    # Older tombstones moved along
+    assert sorted(pk for pk, _ in sync.changes_since(user).deleted) == sorted([kept.pk, deleted_pk])
+    [(status, _)] = sync.apply_changes(user, [sync.Change(updated_at=timezone.now(), id=kept.pk, text="Late")])
+    assert status == sync.GONE
+
+
+def test_rebalance_plan():
+    crowded = [UserFactory(shard="default") for _ in range(3)]
+    for number, user in enumerate(crowded, start=1):
+        for day in range(number):
+            write(user, date(2021, 1, day + 1))
+    call_command("rebalance_shards")
+    counts = {alias: Entry.objects.using(alias).count() for alias in ("default", "shard1")}
+    assert counts == {"default": 3, "shard1": 3}
+
+
+def test_user_deletion_removes_shard_entries():
+    user = UserFactory(shard="shard1")
+    write(user, date(2021, 1, 1))
+    user.delete()
+    assert not Entry.objects.using("shard1").exists()
@@ -0,0 +1,87 @@
+import pytest
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from journal import stats
+from journal.models import Entry, UserJournalStats
+from journal.tests.factories import EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+FIELDS = [
+    "entry_count", "char_count", "word_count", "char_counts",
+    "first_occasion", "last_occasion", "streak",
+]
+DAY = timedelta(days=1)
+
+
+def _as_dict(user_stats):
+    return {field: getattr(user_stats, field) for field in FIELDS}
+
+
+def _assert_matches_rebuild(user):
+    incremental = _as_dict(UserJournalStats.objects.get(user=user))
+    assert incremental == _as_dict(stats.rebuild_stats([user.pk])[0])
+
+
+def test_incremental_stats_match_rebuild(user):
+    start = date(2021, 3, 1)
+    first = EntryFactory(user=user, occasion=start, text="Ein guter Tag")
+    second = EntryFactory(user=user, occasion=start + DAY, text="Noch ein Tag")
+    EntryFactory(user=user, occasion=start + 3 * DAY, text="Nach einer Pause")
+    _assert_matches_rebuild(user)
+    assert UserJournalStats.objects.get(user=user).streak == 1
+
+    # Filling the gap joins both runs
+    EntryFactory(user=user, occasion=start + 2 * DAY, text="Lücke gefüllt")
+    _assert_matches_rebuild(user)
+    assert UserJournalStats.objects.get(user=user).streak == 4
+
+    second.text = "Ganz anderer Text 🙂"
+    second.save()
+    _assert_matches_rebuild(user)
+    first.occasion = start - 10 * DAY
+    first.save()
+    _assert_matches_rebuild(user)
+    second.delete()
+    _assert_matches_rebuild(user)
+    assert UserJournalStats.objects.get(user=user).streak == 2
+
+
+def test_text_update_is_constant_query(user):
+    entry = EntryFactory(user=user)
+    EntryFactory.create_batch(5, user=user)
+    entry.text = "kurz"
+    with CaptureQueriesContext(connection) as few:
+        entry.save()
+    EntryFactory.create_batch(20, user=user)
+    entry.text = "lang"
+    with CaptureQueriesContext(connection) as many:
+        entry.save()
+    assert len(few) == len(many)
+
+
+def test_user_delete_cascades(user):
+    EntryFactory.create_batch(2, user=user)
+    user.delete()
+    assert not UserJournalStats.objects.exists()
+
+
+def test_rebuild_command(user):
+    Entry.objects.bulk_create([Entry(user=user, occasion=date(2021, 1, 1), text="bulk")])
+    call_command("rebuild_journal_stats", "--batch-size", "1")
+    assert UserJournalStats.objects.get(user=user).char_count == 4
+
+
+def test_stats_endpoint(user):
+    EntryFactory(user=user, occasion=date.today(), text="aab")
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get("/api/entries/stats/")
+    assert response.status_code == 200
+    assert response.data["entry_count"] == 1
+    assert response.data["current_streak"] == 1
+    assert response.data["top_chars"] == [("a", 2), ("b", 1)]
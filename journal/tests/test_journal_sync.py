@@ -0,0 +1,189 @@
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from journal import sync
+from journal.models import Entry, EntryTombstone
+from journal.signals import entries_bulk_written
+from journal.tests.factories import EmotionFactory, EntryFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _ids(delta):
+    return [entry.pk for entry in delta.entries]
+
+
+def test_changes_since(user):
+    first, second = EntryFactory(user=user), EntryFactory(user=user)
+    EntryFactory()  # another user's entry
+    delta = sync.changes_since(user)
+    assert _ids(delta) == [first.pk, second.pk]
+    assert delta.cursor == second.updated_at
+    assert sync.changes_since(user, delta.cursor).entries == []
+
+    first.text = "Changed"
+    first.save()
+    second_pk = second.pk
+    second.delete()
+    delta = sync.changes_since(user, delta.cursor)
+    assert _ids(delta) == [first.pk]
+    assert [pk for pk, _ in delta.deleted] == [second_pk]
+    assert delta.cursor == max(first.updated_at, delta.deleted[0][1])
+
+
+def test_emotion_links_move_updated_at(user):
+    entry = EntryFactory(user=user)
+    cursor = sync.changes_since(user).cursor
+    joy = EmotionFactory(name="joy")
+    entry.emotions.add(joy)
+    assert entry.updated_at > cursor
+    assert _ids(sync.changes_since(user, cursor)) == [entry.pk]
+
+    cursor = sync.changes_since(user, cursor).cursor
+    joy.name = "bliss"
+    joy.save()
+    delta = sync.changes_since(user, cursor)
+    assert [e.emotions.all()[0].name for e in delta.entries] == ["bliss"]
+
+    joy.entry_set.clear()
+    delta = sync.changes_since(user, delta.cursor)
+    assert _ids(delta) == [entry.pk]
+    assert list(delta.entries[0].emotions.all()) == []
+
+
+def test_changes_since_limit_keeps_ties(user):
+    entries = EntryFactory.create_batch(3, user=user)
+    moment = timezone.now() - timedelta(hours=1)
+    Entry.objects.filter(pk__in=[e.pk for e in entries[:2]]).update(updated_at=moment)
+    delta = sync.changes_since(user, limit=1)
+    assert delta.has_more
+    assert _ids(delta) == sorted(e.pk for e in entries[:2])
+    delta = sync.changes_since(user, delta.cursor, limit=1)
+    assert (_ids(delta), delta.has_more) == ([entries[2].pk], False)
+
+
+def test_changes_since_old_cursor_resets(user, settings):
+    settings.SYNC_TOMBSTONE_DAYS = 1
+    entry = EntryFactory(user=user)
+    EntryFactory(user=user).delete()
+    delta = sync.changes_since(user, timezone.now() - timedelta(days=2))
+    assert delta.reset
+    assert (_ids(delta), delta.deleted) == ([entry.pk], [])
+    assert sync.prune_tombstones(timedelta(0)) == 1
+
+
+def test_bulk_deleted_tombstones(user):
+    entries_bulk_written.send(sender=Entry, user_ids=[user.pk], entries=(), deleted=[7, 8], using="default")
+    assert sorted(EntryTombstone.objects.filter(user=user).values_list("entry_id", flat=True)) == [7, 8]
+
+
+def test_user_delete_removes_tombstones(user):
+    EntryFactory(user=user).delete()
+    user.delete()
+    assert not EntryTombstone.objects.exists()
+
+
+def test_apply_changes_last_write_wins(user):
+    joy = EmotionFactory(name="joy")
+    kept, replaced, removed = EntryFactory.create_batch(3, user=user)
+    past = timezone.now() - timedelta(hours=1)
+    later = timezone.now() + timedelta(seconds=1)
+    results = sync.apply_changes(user, [
+        sync.Change(updated_at=later, text="New", emotions=[joy]),
+        sync.Change(updated_at=past, id=kept.pk, text="Stale"),
+        sync.Change(updated_at=later, id=replaced.pk, text="Replaced"),
+        sync.Change(updated_at=later, id=removed.pk, deleted=True),
+        sync.Change(updated_at=later, id=removed.pk, text="Too late"),
+        sync.Change(updated_at=later, id=EntryFactory().pk, text="Not mine"),
+    ])
+    assert [status for status, _ in results] == [
+        sync.CREATED, sync.CONFLICT, sync.UPDATED, sync.DELETED, sync.GONE, sync.NOT_FOUND,
+    ]
+    created = results[0][1]
+    assert [e.name for e in created.emotions.all()] == ["joy"]
+    kept.refresh_from_db()
+    replaced.refresh_from_db()
+    assert (kept.text, replaced.text) == (results[1][1].text, "Replaced")
+    assert not Entry.objects.filter(pk=removed.pk).exists()
+    assert EntryTombstone.objects.filter(entry_id=removed.pk).exists()
+
+
+def test_apply_changes_compares_client_times(user):
+    entry = EntryFactory(user=user)
+    first_edit = timezone.now() + timedelta(seconds=1)
+    second_edit = first_edit + timedelta(seconds=1)
+    # The client that edited second syncs last, and the sync moves
+    # updated_at past both edits
+    sync.apply_changes(user, [sync.Change(updated_at=first_edit, id=entry.pk, text="First")])
+    entry.refresh_from_db()
+    assert entry.changed_at == first_edit and entry.updated_at < first_edit
+    Entry.objects.filter(pk=entry.pk).update(updated_at=second_edit + timedelta(seconds=1))
+    [(status, _)] = sync.apply_changes(user, [sync.Change(updated_at=second_edit, id=entry.pk, text="Second")])
+    assert status == sync.UPDATED
+    [(status, _)] = sync.apply_changes(user, [sync.Change(updated_at=first_edit, id=entry.pk, text="Stale")])
+    assert status == sync.CONFLICT
+    entry.refresh_from_db()
+    assert (entry.text, entry.changed_at) == ("Second", second_edit)
+
+
+def test_apply_changes_is_atomic(user, monkeypatch):
+    entry = EntryFactory(user=user)
+    later = timezone.now() + timedelta(seconds=1)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(sync, "add_tombstones", fail)
+    with pytest.raises(RuntimeError):
+        sync.apply_changes(user, [
+            sync.Change(updated_at=later, id=entry.pk, text="Changed"),
+            sync.Change(updated_at=later, id=entry.pk, deleted=True),
+        ])
+    entry.refresh_from_db()
+    assert entry.text != "Changed"
+
+
+def test_sync_api(api_client, user):
+    EmotionFactory(name="joy")
+    entry = EntryFactory(user=user)
+    response = api_client.get("/api/sync/")
+    assert response.status_code == 200
+    assert [e["id"] for e in response.data["entries"]] == [entry.pk]
+    assert (response.data["has_more"], response.data["reset"], response.data["deleted"]) == (False, False, [])
+    cursor = response.data["cursor"]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert api_client.get("/api/sync/", {"cursor": cursor}).data["entries"] == []
+    # Entries and tombstones, each from their index
+    assert len(queries) == 2
+
+    later = (timezone.now() + timedelta(seconds=1)).isoformat()
+    response = api_client.post("/api/sync/", {"cursor": cursor, "changes": [
+        {"client_id": "local-1", "updated_at": later, "text": "Offline", "emotions": ["joy"]},
+        {"client_id": "local-2", "updated_at": later, "id": entry.pk, "deleted": True},
+    ]}, format="json")
+    assert response.status_code == 200
+    created, deleted = response.data["results"]
+    assert (created["client_id"], created["status"], created["entry"]["emotions"]) == ("local-1", "created", ["joy"])
+    assert (deleted["id"], deleted["status"], deleted["entry"]) == (entry.pk, "deleted", None)
+    assert [e["id"] for e in response.data["entries"]] == [created["id"]]
+    assert [d["id"] for d in response.data["deleted"]] == [entry.pk]
+
+
+def test_sync_api_invalid(api_client, user):
+    assert api_client.get("/api/sync/", {"cursor": "yesterday"}).status_code == 400
+    response = api_client.post("/api/sync/", {"changes": [{"updated_at": timezone.now().isoformat()}]}, format="json")
+    assert response.status_code == 400
+    response = api_client.post("/api/sync/", {"changes": [
+        {"updated_at": timezone.now().isoformat(), "text": "Valid"},
+        {"updated_at": timezone.now().isoformat(), "text": "Unknown emotion", "emotions": ["nope"]},
+    ]}, format="json")
+    assert response.status_code == 400
+    assert not Entry.objects.filter(user=user).exists()
+    for cursor in (5, ["2021-01-01"], {"at": "2021-01-01"}):
+        response = api_client.post("/api/sync/", {"cursor": cursor, "changes": []}, format="json")
+        assert response.status_code == 400
+        assert "cursor" in response.data
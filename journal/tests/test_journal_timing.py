@@ -0,0 +1,74 @@
+import logging
+import re
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from diary import metrics
+from diary.timing import RequestTimings, request_timings
+from journal.tests.factories import EntryFactory
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _server_timing(response):
+    metrics = {}
+    for part in response["Server-Timing"].split(", "):
+        name, duration, *description = part.split(";")
+        metrics[name] = (float(duration[len("dur="):]), *description)
+    return metrics
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+def test_server_timing_header(api_client, user):
+    EntryFactory(user=user)
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get("/api/entries/")
+    timing = _server_timing(response)
+    assert set(timing) == {"total", "view", "render", "db", "db-slowest"}
+    assert timing["db"][1] == 'desc="%d queries"' % len(queries)
+    assert timing["total"][0] >= timing["view"][0] >= timing["db"][0] >= timing["db-slowest"][0]
+
+
+def test_server_timing_header_off_by_default(api_client):
+    assert "Server-Timing" not in api_client.get("/api/entries/")
+
+
+def test_percentiles_per_url_name(api_client):
+    request_timings.reset()
+    for _ in range(3):
+        api_client.get("/api/users/")
+    api_client.get("/api/entries/")
+    timings = request_timings.snapshot()
+    assert timings["api:user-list"]["count"] == 3
+    assert timings["api:user-list"]["p50"] <= timings["api:user-list"]["p99"]
+    assert timings["api:entry-list"]["count"] == 1
+
+    api_client.force_authenticate(UserFactory(is_superuser=True))
+    assert api_client.get("/api/metrics/").data["timings"]["api:entry-list"]["count"] == 1
+
+
+def test_window_is_bounded():
+    timings = RequestTimings(window=10)
+    for number in range(100):
+        timings.add("api:user-list", number)
+    assert timings.percentiles("api:user-list") == {"count": 10, "p50": 95, "p95": 99, "p99": 99}
+    assert timings.percentiles("api:entry-list") is None
+
+
+def test_slow_requests_are_logged(api_client, caplog):
+    metrics.reset()
+    with caplog.at_level(logging.INFO, logger="diary.timing"):
+        with override_settings(SLOW_REQUEST_SECONDS=60, SLOW_REQUEST_THRESHOLDS={"api:entry-list": 0}):
+            api_client.get("/api/users/")
+            api_client.get("/api/entries/")
+    fast, slow = caplog.records
+    assert fast.levelno == logging.INFO and fast.timing["url_name"] == "api:user-list"
+    assert "slowest_sql" not in fast.timing
+    assert slow.levelno == logging.WARNING
+    assert re.match(r"slow request url_name=api:entry-list method=GET path=/api/entries/ status=200 ", slow.getMessage())
+    assert slow.timing["slowest_sql"].startswith("SELECT")
+    assert metrics.get("requests.slow") == 1
@@ -5,12 +5,31 @@ from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateMode
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet,GenericViewSet
 
+from diary.conditional import ConditionalGetMixin
+from diary.permissions import IsSuperUser
+from users import provisioning
+
 from .serializers import UserSerializer
 
 User = get_user_model()
 
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(ConditionalGetMixin, ModelViewSet):
     serializer_class = UserSerializer
     queryset = User.objects.all()
-    lookup_field = "username"
\ No newline at end of file
+    lookup_field = "username"
+
+    @action(detail=False, methods=["post"], permission_classes=[IsSuperUser])
+    def provision(self, request):
+        """ Creates many users at once, with their tokens and group.
+        POST a list of objects with username, email, first_name,
+        last_name and an optional password.
+        """
+        if not isinstance(request.data, list):
+            return Response({"detail": "Expected a list of users."}, status=status.HTTP_400_BAD_REQUEST)
+        result = provisioning.provision_users(request.data)
+        return Response({
+            "created": result.created,
+            "skipped": result.skipped,
+            "errors": [{"row": number, "error": error} for number, error in result.errors],
+        }, status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
\ No newline at end of file
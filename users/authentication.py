@@ -0,0 +1,131 @@
+""" Token authentication with a process-local cache
+
+DRF's TokenAuthentication joins Token and User on every request. The
+CachedTokenAuthentication keeps resolved tokens in a bounded LRU with a
+time to live, so a polling client costs one cache stamp lookup instead.
+
+The users.signals receivers drop tokens of this process when a token is
+deleted or its user is deactivated or changes password, and bump a
+version stamp in the shared cache settings.TOKEN_AUTH_CACHE, an alias of
+its own ("tokens") so clearing another cache does not drop all tokens;
+every process compares it before serving from its LRU and clears it when
+it moved. A local memory cache would hide the
+revocation of a token from the other processes: tokens are not cached
+then, nor while the stamp cannot be stored (diary.caching).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from diary import caching, metrics
+
+CACHE_ALIAS = getattr(settings, "TOKEN_AUTH_CACHE", "tokens")
+MAX_SIZE = getattr(settings, "TOKEN_AUTH_CACHE_SIZE", 10000)
+TTL = getattr(settings, "TOKEN_AUTH_CACHE_TTL", 60)
+
+VERSION_KEY = "users:tokens:version"
+
+
+class TokenCache:
+	""" LRU of token key -> (expiry, user, token), bounded by size and age."""
+
+	def __init__(self, max_size=MAX_SIZE, ttl=TTL):
+		self.max_size = max_size
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()
+		self._version = None
+
+	def check(self):
+		""" Clears the cache if another process invalidated tokens. Returns
+		whether it may be used, see the module documentation.
+		"""
+		if not caching.is_shared(CACHE_ALIAS):
+			return False
+		current = self._stamp()
+		if current != self._version:
+			self.clear()
+			self._version = current
+		return current is not None
+
+	def _stamp(self):
+		cache = caches[CACHE_ALIAS]
+		stamp = cache.get(VERSION_KEY)
+		if stamp is None:
+			# Starts at the current time in ms, so a stamp evicted from the
+			# cache comes back different from the one any process has seen
+			cache.add(VERSION_KEY, int(time.time() * 1000), None)
+			stamp = cache.get(VERSION_KEY)
+		return stamp
+
+	def get(self, key):
+		""" Returns (user, token) for key or None, counting hits and misses."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and entry[0] < time.monotonic():
+				del self._entries[key]
+				entry = None
+			if entry is not None:
+				self._entries.move_to_end(key)
+		if entry is None:
+			metrics.incr("users.token_cache.misses")
+			return None
+		metrics.incr("users.token_cache.hits")
+		# Requests must not share instances they may modify
+		return copy.copy(entry[1]), copy.copy(entry[2])
+
+	def set(self, key, user, token):
+		with self._lock:
+			self._entries[key] = (time.monotonic() + self.ttl, user, token)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+				metrics.incr("users.token_cache.evictions")
+
+	def discard(self, key):
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def discard_user(self, user_id):
+		with self._lock:
+			for key in [key for key, entry in self._entries.items() if entry[1].pk == user_id]:
+				del self._entries[key]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def invalidate(self):
+		""" Makes every process clear its cache before the next lookup."""
+		self._stamp()
+		try:
+			caches[CACHE_ALIAS].incr(VERSION_KEY)
+		except ValueError:
+			pass
+
+	def __len__(self):
+		return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+	""" Drop-in replacement of TokenAuthentication resolving tokens from
+	token_cache.
+	"""
+
+	def authenticate_credentials(self, key):
+		if not token_cache.check():
+			return super().authenticate_credentials(key)
+		cached = token_cache.get(key)
+		if cached is not None:
+			return cached
+		user, token = super().authenticate_credentials(key)
+		token_cache.set(key, user, token)
+		return user, token
@@ -0,0 +1,52 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import provisioning
+
+
+def read_rows(path):
+	""" Yields the rows of a CSV (with header) or JSONL file, an error
+	message for an invalid JSON line. Blank lines are skipped, they are
+	not counted as rows.
+	"""
+	with open(path, encoding="utf-8-sig", newline="") as stream:
+		if path.lower().endswith(".csv"):
+			yield from csv.DictReader(stream)
+		else:
+			for line in stream:
+				if not line.strip():
+					continue
+				try:
+					yield json.loads(line)
+				except json.JSONDecodeError as error:
+					yield "Invalid JSON: %s" % error
+
+
+class Command(BaseCommand):
+	help = (
+		"Creates users with their auth tokens and normal user group membership "
+		"in bulk, from a CSV or JSONL file with the columns %s." % ", ".join(provisioning.FIELDS)
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("path")
+		parser.add_argument("--batch-size", type=int, default=provisioning.BATCH_SIZE)
+		parser.add_argument("--database", default="default")
+
+	def handle(self, *args, **options):
+		start = time.perf_counter()
+		result = provisioning.provision_users(
+			read_rows(options["path"]), batch_size=options["batch_size"], using=options["database"]
+		)
+		for number, error in result.errors:
+			self.stderr.write("Row %d: %s" % (number, error))
+		if result.skipped:
+			self.stdout.write("Skipped existing users: %s" % ", ".join(result.skipped))
+		self.stdout.write(self.style.SUCCESS(
+			"Created %d users in %.2fs, %d skipped, %d invalid." % (
+				len(result.created), time.perf_counter() - start, len(result.skipped), len(result.errors),
+			)
+		))
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard',
+            field=models.CharField(blank=True, help_text="Database of the user's journal entries, empty for the default placement", max_length=64, verbose_name='Shard'),
+        ),
+    ]
@@ -6,6 +6,30 @@ class User(AbstractUser):
 	""" User Model for extending functionalities
 
 	url: /api/users/<username>
+	shard: database alias holding the user's journal, see journal.shards
+	updated_at: last change, the validator of conditional requests
 	"""
 	class Meta:
-		ordering = ("username",)
\ No newline at end of file
+		ordering = ("username",)
+
+	shard = models.CharField(
+		_("Shard"),
+		help_text=_("Database of the user's journal entries, empty for the default placement"),
+		max_length=64, blank=True,
+	)
+	updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+
+	# Fields whose change revokes the cached tokens of the user
+	CREDENTIAL_FIELDS = ("is_active", "password")
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		user = super().from_db(db, field_names, values)
+		user._loaded_credentials = user.credentials()
+		return user
+
+	def credentials(self):
+		""" What authenticated tokens depend on, see users.signals.user_changed.
+		Deferred fields count as unknown.
+		"""
+		return tuple(self.__dict__.get(name) for name in self.CREDENTIAL_FIELDS)
@@ -0,0 +1,111 @@
+""" Bulk provisioning of users
+
+Creating a user one by one runs the users.signals receivers: a token
+insert and a group membership insert per user. Provisioning creates a
+whole batch of users, their auth tokens and their normal user group
+memberships with one bulk insert each, in a transaction per batch, and
+applies what the signals would have applied (is_staff, shard, token,
+group).
+
+Passwords are optional. Hashing is slow by design, users created without
+a password get an unusable one and set it through the password reset.
+"""
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from journal import shards
+from users.signals import normal_user_group_id
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+FIELDS = ("username", "email", "first_name", "last_name", "password")
+
+
+@dataclass
+class ProvisionResult:
+	created: list = field(default_factory=list)
+	skipped: list = field(default_factory=list)
+	errors: list = field(default_factory=list)
+
+
+def _build(row):
+	""" Returns a validated, unsaved user for a row of FIELDS. A string row
+	is the error message of an unreadable one.
+	"""
+	if isinstance(row, str):
+		raise ValidationError(row)
+	if not isinstance(row, dict):
+		raise ValidationError("Expected an object with %s" % ", ".join(FIELDS))
+	for name in FIELDS:
+		if row.get(name) and not isinstance(row[name], str):
+			raise ValidationError("%s must be a string" % name)
+	user = User(
+		username=(row.get("username") or "").strip(),
+		email=User.objects.normalize_email(row.get("email") or ""),
+		first_name=row.get("first_name") or "",
+		last_name=row.get("last_name") or "",
+		# What users.signals.user_creating applies
+		is_staff=True,
+	)
+	user.password = make_password(row.get("password") or None)
+	user.full_clean(exclude=["password"], validate_unique=False)
+	return user
+
+
+def provision_users(rows, batch_size=BATCH_SIZE, using="default"):
+	""" Creates users from an iterable of dicts with FIELDS.
+
+	Existing usernames are skipped, invalid rows (and rows that are not
+	dicts) reported as (row number, message). Returns a ProvisionResult.
+	"""
+	result = ProvisionResult()
+	batch = {}
+	for number, row in enumerate(rows, start=1):
+		try:
+			user = _build(row)
+		except ValidationError as error:
+			result.errors.append((number, "; ".join(error.messages)))
+			continue
+		if user.username in batch:
+			result.skipped.append(user.username)
+			continue
+		batch[user.username] = user
+		if len(batch) >= batch_size:
+			_create(batch, result, using)
+			batch = {}
+	if batch:
+		_create(batch, result, using)
+	return result
+
+
+def _create(batch, result, using):
+	with transaction.atomic(using=using):
+		existing = set(
+			User.objects.using(using).filter(username__in=batch).values_list("username", flat=True)
+		)
+		result.skipped.extend(sorted(existing))
+		users = [user for username, user in batch.items() if username not in existing]
+		if not users:
+			return
+		# What journal.signals.user_shard_place applies
+		shards.place_users(users, using=using)
+		User.objects.using(using).bulk_create(users)
+		# Usernames are unique: fetch the primary keys the insert did not return
+		pks = dict(
+			User.objects.using(using).filter(username__in=[user.username for user in users])
+			.values_list("username", "pk")
+		)
+		Token.objects.using(using).bulk_create(
+			[Token(key=Token.generate_key(), user_id=pks[user.username]) for user in users]
+		)
+		group_id = normal_user_group_id(using)
+		User.groups.through.objects.using(using).bulk_create(
+			[User.groups.through(user_id=pks[user.username], group_id=group_id) for user in users]
+		)
+		result.created.extend(user.username for user in users)
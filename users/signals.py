@@ -1,32 +1,97 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save, pre_delete
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.utils.translation import gettext_lazy as _
 
+from diary import caching
+from users.authentication import token_cache
+
 User = get_user_model()
 
+NORMAL_USER_GROUP = "Normal User"
+
+# Primary key of the normal user group per database alias, kept in the
+# shared cache settings.USERS_CACHE so a changed group reaches every process.
+# Looked up on every user creation with a local memory alias (diary.caching).
+GROUP_CACHE_ALIAS = getattr(settings, "USERS_CACHE", "shared")
+GROUP_KEY = "users:normal_group:%s"
+
+
+def normal_user_group_id(using="default"):
+	shared = caching.is_shared(GROUP_CACHE_ALIAS)
+	cache = caches[GROUP_CACHE_ALIAS]
+	pk = cache.get(GROUP_KEY % using) if shared else None
+	if pk is None:
+		pk = Group.objects.using(using).values_list("pk", flat=True).get(name=NORMAL_USER_GROUP)
+		if shared:
+			cache.set(GROUP_KEY % using, pk, None)
+	return pk
+
+def _forget_group_ids():
+	caches[GROUP_CACHE_ALIAS].delete_many([GROUP_KEY % alias for alias in settings.DATABASES])
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, using=None, **kwargs):
+	_forget_group_ids()
+	# Other processes may cache the old id again until the commit
+	if connections[using or DEFAULT_DB_ALIAS].in_atomic_block:
+		transaction.on_commit(_forget_group_ids, using=using)
+
+# TOKEN CACHE
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+	token_cache.discard(instance.key)
+	token_cache.invalidate()
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+	token_cache.discard_user(instance.pk)
+	token_cache.invalidate()
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created=False, update_fields=None, **kwargs):
+	# Cached users may keep other fields stale, until the token cache TTL
+	credentials = instance.credentials()
+	loaded = getattr(instance, "_loaded_credentials", None)
+	instance._loaded_credentials = credentials
+	if created:
+		return
+	if update_fields is not None and not set(update_fields) & set(User.CREDENTIAL_FIELDS):
+		return
+	if loaded is not None and None not in loaded and loaded == credentials:
+		return
+	token_cache.discard_user(instance.pk)
+	token_cache.invalidate()
+
 @receiver(post_save, sender=User)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
 	if created:
 		Token.objects.create(user=instance)
 
+# USER CREATION (pre save)
+@receiver(pre_save, sender=User)
+def user_creating(sender, instance, **kwargs):
+	if instance._state.adding:
+		# Add to is_staff to access admin. Set before the insert, saving
+		# again after it would run all post_save receivers a second time.
+		instance.is_staff = True
+
 # USER CREATION (post save)
 @receiver(post_save, sender=User)
 def user_created(sender, instance, created, **kwargs):
 	if created:
-		# Add to is_staff to access admin
-		instance.is_staff = True
 		# Add User to normal User group
-		normal_user_group = Group.objects.get(name='Normal User') 
-		normal_user_group.user_set.add(instance)
-		instance.save()
+		User.groups.through.objects.create(user_id=instance.pk, group_id=normal_user_group_id())
 
 # USER DELETION (post save)
 @receiver(pre_delete, sender=User)
 def user_before_delete(sender, instance, **kwargs):
-	# Cleanup Code 
+	# Cleanup Code
 	# Currently Stub
-    pass
\ No newline at end of file
+    pass
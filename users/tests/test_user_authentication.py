@@ -0,0 +1,121 @@
+import time
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from diary import metrics
+from users.authentication import TokenCache, token_cache
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+def rejected(response):
+    # SessionAuthentication comes first, DRF answers 403 instead of 401
+    return response.status_code == 403 and response.data["detail"].code == "authentication_failed"
+
+
+def token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token %s" % user.auth_token.key)
+    return client
+
+
+def test_cached_token_skips_lookup(user):
+    client = token_client(user)
+    metrics.reset()
+    assert client.get("/api/users/").status_code == 200
+    with CaptureQueriesContext(connection) as first:
+        client.get("/api/users/")
+    token_cache.clear()
+    with CaptureQueriesContext(connection) as uncached:
+        client.get("/api/users/")
+    assert len(first) == len(uncached) - 1
+    assert metrics.get("users.token_cache.hits") == 1
+    assert metrics.get("users.token_cache.misses") == 2
+
+
+def test_deleted_token_rejected(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    user.auth_token.delete()
+    assert rejected(client.get("/api/users/"))
+
+
+def test_rotated_token_rejected(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    Token.objects.filter(user=user).delete()
+    Token.objects.create(user=user)
+    assert rejected(client.get("/api/users/"))
+    user.refresh_from_db()
+    assert token_client(user).get("/api/users/").status_code == 200
+
+
+def test_deactivated_user_rejected(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    user.is_active = False
+    user.save()
+    assert rejected(client.get("/api/users/"))
+
+
+def test_changed_password_rejected(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    user = User.objects.get(pk=user.pk)
+    user.set_password("changed")
+    user.save()
+    Token.objects.filter(user=user).update(key="0" * 40)
+    assert rejected(client.get("/api/users/"))
+
+
+def test_other_changes_keep_the_cached_tokens(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    user = User.objects.get(pk=user.pk)
+    user.first_name = "Renamed"
+    user.save()
+    # Neither a user change nor clearing the journal cache drop the tokens
+    caches[settings.JOURNAL_CACHE].clear()
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get("/api/users/").status_code == 200
+    assert not any('"authtoken_token"' in query["sql"] for query in queries)
+
+
+def test_other_process_invalidation(user):
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    # What the signals of another process leave behind: only the stamp moves
+    Token.objects.filter(user=user).update(key="0" * 40)
+    token_cache.invalidate()
+    assert rejected(client.get("/api/users/"))
+
+
+def test_token_cache_lru_and_ttl(user, monkeypatch):
+    cache = TokenCache(max_size=2, ttl=10)
+    for key in "abc":
+        cache.set(key, user, None)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    now = time.monotonic()
+    monkeypatch.setattr("users.authentication.time.monotonic", lambda: now + 11)
+    assert cache.get("b") is None
+    assert len(cache) == 1
+
+
+def test_tokens_not_cached_in_local_memory(user, settings):
+    # Other processes would not see the revocation
+    settings.CACHES = {**settings.CACHES, "tokens": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    client = token_client(user)
+    assert client.get("/api/users/").status_code == 200
+    assert len(token_cache) == 0
+    Token.objects.filter(user=user).update(key="0" * 40)
+    assert rejected(client.get("/api/users/"))
@@ -1,5 +1,6 @@
 import pytest
 from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 from django.urls import resolve, reverse
 from django.contrib.auth import get_user_model
 
@@ -27,4 +28,23 @@ def test_user_list():
 
 # def test_user_me():
 #     assert reverse("api:user-me") == "/api/users/me/"
-#     assert resolve("/api/users/me/").view_name == "api:user-me"
\ No newline at end of file
+#     assert resolve("/api/users/me/").view_name == "api:user-me"
+
+def test_user_list_not_modified(user: User):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get("/api/users/")
+    etag = response["ETag"]
+    assert client.get("/api/users/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+    detail = client.get(f"/api/users/{user.username}/")
+    assert client.get(
+        f"/api/users/{user.username}/", HTTP_IF_MODIFIED_SINCE=detail["Last-Modified"]
+    ).status_code == 304
+
+    user.first_name = "Changed"
+    user.save()
+    response = client.get("/api/users/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    # The count of every page is part of the validator
+    User.objects.create_user("zz-last")
+    assert client.get("/api/users/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
@@ -0,0 +1,123 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.provisioning import provision_users
+from users.signals import GROUP_CACHE_ALIAS, GROUP_KEY, NORMAL_USER_GROUP, normal_user_group_id
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+def rows(count, start=0):
+    return [
+        {"username": "user%d" % n, "email": "user%d@example.com" % n, "first_name": "First", "last_name": "Last"}
+        for n in range(start, start + count)
+    ]
+
+
+def test_user_created_one_by_one():
+    normal_user_group_id()
+    with CaptureQueriesContext(connection) as queries:
+        user = User.objects.create_user("single", password="secret")
+    # user insert, token insert, group membership insert
+    assert len(queries) == 3
+    user.refresh_from_db()
+    assert user.is_staff
+    assert Token.objects.filter(user=user).exists()
+    assert list(user.groups.values_list("name", flat=True)) == [NORMAL_USER_GROUP]
+
+
+@pytest.mark.parametrize("count", [10, 50])
+def test_provision_users_constant_queries(count):
+    normal_user_group_id()
+    with CaptureQueriesContext(connection) as queries:
+        result = provision_users(rows(count))
+    assert len(result.created) == count
+    # savepoint, existing usernames, users, pks, tokens, groups, release
+    assert len(queries) <= 7
+    assert User.objects.filter(is_staff=True).count() == count
+    assert Token.objects.count() == count
+    assert User.objects.filter(groups__name=NORMAL_USER_GROUP).count() == count
+
+
+def test_provision_users_skips_existing_and_invalid():
+    provision_users(rows(2))
+    result = provision_users(rows(3) + [{"username": "not valid!"}], batch_size=2)
+    assert result.created == ["user2"]
+    assert result.skipped == ["user0", "user1"]
+    assert [number for number, error in result.errors] == [4]
+    assert User.objects.count() == 3
+
+
+def test_provision_users_passwords():
+    provision_users([{"username": "with", "password": "secret"}, {"username": "without"}])
+    assert User.objects.get(username="with").check_password("secret")
+    assert not User.objects.get(username="without").has_usable_password()
+
+
+def test_provision_users_command(tmp_path, capsys):
+    path = tmp_path / "users.csv"
+    path.write_text("username,email\nalice,alice@example.com\nbob,bob@example.com\n")
+    call_command("provision_users", str(path))
+    assert "Created 2 users" in capsys.readouterr().out
+    assert set(User.objects.values_list("username", flat=True)) == {"alice", "bob"}
+
+
+def test_provision_users_api(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = "/api/users/provision/"
+    assert client.post(url, rows(2), format="json").status_code == 403
+    user.is_superuser = True
+    user.save()
+    response = client.post(url, rows(2), format="json")
+    assert response.status_code == 201
+    assert response.data["created"] == ["user0", "user1"]
+    response = client.post(url, rows(2), format="json")
+    assert response.status_code == 200
+    assert response.data["skipped"] == ["user0", "user1"]
+
+
+def test_provision_users_rejects_malformed_rows():
+    result = provision_users([["alice"], {"username": 5}, None, {"username": "bob"}])
+    assert result.created == ["bob"]
+    assert [number for number, _ in result.errors] == [1, 2, 3]
+    assert result.errors[1][1] == "username must be a string"
+
+
+def test_provision_users_command_invalid_json(tmp_path, capsys):
+    path = tmp_path / "users.jsonl"
+    path.write_text('{"username": "alice"}\n\n{"username": \n{"username": "bob"}\n')
+    call_command("provision_users", str(path))
+    output = capsys.readouterr()
+    assert "Row 2: Invalid JSON" in output.err
+    assert set(User.objects.values_list("username", flat=True)) == {"alice", "bob"}
+
+
+def test_normal_user_group_id_follows_changes():
+    group = Group.objects.get(name=NORMAL_USER_GROUP)
+    assert normal_user_group_id() == group.pk
+    group.delete()
+    replacement = Group.objects.create(name=NORMAL_USER_GROUP)
+    assert normal_user_group_id() == replacement.pk
+    assert list(User.objects.create_user("after").groups.all()) == [replacement]
+
+
+def test_normal_user_group_id_is_shared_between_processes():
+    group = Group.objects.get(name=NORMAL_USER_GROUP)
+    normal_user_group_id()
+    assert caches[GROUP_CACHE_ALIAS].get(GROUP_KEY % "default") == group.pk
+    # The id stored by another process
+    caches[GROUP_CACHE_ALIAS].set(GROUP_KEY % "default", -1)
+    assert normal_user_group_id() == -1
+    group.save()
+    assert caches[GROUP_CACHE_ALIAS].get(GROUP_KEY % "default") is None
+    assert normal_user_group_id() == group.pk